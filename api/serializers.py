@@ -60,3 +60,25 @@ class AlertSerializer(serializers.ModelSerializer):
         model = Alert
         fields = ['id', 'alert_type', 'severity', 'message', 'is_resolved', 'created_at']
         read_only_fields = ['id', 'created_at']
+
+
+class ChatSearchResultSerializer(serializers.ModelSerializer):
+    """Chat search hit for clinicians."""
+    
+    patient = serializers.IntegerField(source='user_id', read_only=True)
+    
+    class Meta:
+        model = ChatInteraction
+        fields = ['id', 'patient', 'message_text', 'bot_response', 'sentiment_flag', 'timestamp']
+        read_only_fields = fields
+
+
+class SymptomSearchResultSerializer(serializers.ModelSerializer):
+    """Symptom search hit for clinicians."""
+    
+    patient = serializers.IntegerField(source='patient_id', read_only=True)
+    
+    class Meta:
+        model = SymptomReport
+        fields = ['id', 'patient', 'symptom_type', 'intensity', 'description', 'location', 'timestamp']
+        read_only_fields = fields
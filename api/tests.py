@@ -0,0 +1,128 @@
+"""
+Tests for the API module: search parameters, chat history pagination and
+the async chat endpoint.
+"""
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.test import TestCase, TransactionTestCase
+from django.utils.crypto import get_random_string
+from rest_framework.authtoken.models import Token
+
+from chatbot.models import ChatInteraction, ChatOutboxEntry
+from chatbot.services import chat_outbox_service
+from chatbot.tests import make_history
+from psychosocial.models import ConsentRecord
+from users.models import CustomUser, Profile
+
+
+class SearchLimitTests(TestCase):
+
+    def setUp(self):
+        self.doctor = CustomUser.objects.create_user('medico', password='x', role='DOCTOR')
+        patient = CustomUser.objects.create_user('paciente', password='x', role='PATIENT')
+        Profile.objects.create(user=patient, assigned_doctor=self.doctor)
+        ConsentRecord.objects.create(patient=patient, can_share_chat_with_doctor=True)
+        for i in range(3):
+            ChatInteraction.objects.create(user=patient, message_text=f'me duele la cabeza {i}', bot_response='ok')
+        self.client.force_login(self.doctor)
+
+    def search(self, limit):
+        return self.client.get('/api/search/', {'q': 'cabeza', 'type': 'chat', 'limit': limit})
+
+    def test_limit_is_applied(self):
+        response = self.search(2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['chats']), 2)
+
+    def test_zero_or_negative_limit_returns_one_result(self):
+        for limit in (0, -5):
+            response = self.search(limit)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['chats']), 1)
+
+    def test_non_numeric_limit_is_rejected(self):
+        self.assertEqual(self.search('muchos').status_code, 400)
+
+
+class ChatListPaginationTests(TestCase):
+
+    def setUp(self):
+        self.patient = CustomUser.objects.create_user('paciente', password='x', role='PATIENT')
+        self.client.force_login(self.patient)
+
+    def test_next_link_walks_the_history_on_timestamp_and_id(self):
+        # Chats 1-3 share a timestamp and straddle the first page boundary
+        chats = make_history(self.patient, 5, same_timestamp={1, 2, 3})
+
+        seen = []
+        url = '/api/chat/?page_size=3'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            self.assertIsNone(body['previous'])
+            seen += [chat['id'] for chat in body['results']]
+            url = body['next']
+            if url:
+                self.assertTrue(url.startswith('http://testserver/api/chat/?'))
+                self.assertIn('page_size=3', url)
+
+        self.assertEqual(seen, [chat.pk for chat in chats])
+
+    def test_page_size_is_capped(self):
+        make_history(self.patient, 3)
+        response = self.client.get('/api/chat/', {'page_size': 0})
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_malformed_cursor_returns_404(self):
+        self.assertEqual(self.client.get('/api/chat/', {'cursor': 'roto'}).status_code, 404)
+
+
+class AsyncChatCreateTests(TransactionTestCase):
+
+    def setUp(self):
+        self.patient = CustomUser.objects.create_user('paciente', password='x', role='PATIENT')
+        self.token = Token.objects.create(user=self.patient)
+
+    def post(self, message, **kwargs):
+        return self.async_client.post('/api/chat/async/', {'message_text': message},
+                                      content_type='application/json', **kwargs)
+
+    async def test_anonymous_request_is_rejected(self):
+        response = await self.post('quiero morir')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
+        self.assertFalse(await ChatInteraction.objects.aexists())
+
+    async def test_session_auth_still_checks_csrf(self):
+        self.async_client = self.async_client_class(enforce_csrf_checks=True)
+        await sync_to_async(self.async_client.force_login)(self.patient)
+
+        response = await self.post('hola')
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('CSRF', response.json()['detail'])
+
+        token = get_random_string(32)
+        self.async_client.cookies['csrftoken'] = token
+        response = await self.post('hola', headers={'X-CSRFToken': token})
+        self.assertEqual(response.status_code, 201)
+
+    async def test_token_auth_saves_the_interaction_and_dispatches_its_entry(self):
+        self.async_client = self.async_client_class(enforce_csrf_checks=True)
+
+        # Dispatched once the response is out, as in chatbot.tests.AsyncSendMessageTests
+        with mock.patch.object(chat_outbox_service, 'dispatch') as dispatch:
+            response = await self.post('quiero morir', headers={'Authorization': f'Token {self.token.key}'})
+
+        self.assertEqual(response.status_code, 201)
+        interaction = await ChatInteraction.objects.aget(pk=response.json()['id'])
+        self.assertEqual((interaction.user_id, interaction.sentiment_flag), (self.patient.pk, 'ALERT'))
+        entry = await ChatOutboxEntry.objects.aget(interaction=interaction)
+        dispatch.assert_called_once_with(entry)
+
+        await chat_outbox_service.dispatch(entry)
+
+        await entry.arefresh_from_db()
+        self.assertEqual(entry.status, 'DONE')
@@ -12,10 +12,13 @@ router.register(r'chat', views.ChatViewSet, basename='chat')
 router.register(r'symptoms', views.SymptomViewSet, basename='symptom')
 router.register(r'emotions', views.EmotionViewSet, basename='emotion')
 router.register(r'recommendations', views.RecommendationViewSet, basename='recommendation')
+router.register(r'search', views.SearchViewSet, basename='search')
 
 app_name = 'api'
 
 urlpatterns = [
+    # Before the router, whose chat/<pk>/ route would also match this path
+    path('chat/async/', views.chat_create_async, name='chat-create-async'),
     path('', include(router.urls)),
     path('auth/token/', obtain_auth_token, name='token_auth'),
 ]
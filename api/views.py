@@ -1,17 +1,26 @@
 """
 Views for REST API.
 """
-from rest_framework import viewsets, permissions, status
+from asgiref.sync import sync_to_async
+from rest_framework import exceptions, viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from django.db import transaction
+from django.http import JsonResponse
 
 from chatbot.models import ChatInteraction
 from clinical.models import SymptomReport
 from psychosocial.models import EmotionLog, Recommendation
-from chatbot.services import chat_service
+from chatbot.services import chat_service, chat_outbox_service
+from search.services import search_service
 
+from .pagination import ChatCursorPagination
 from .serializers import (
     ChatInteractionSerializer,
+    ChatSearchResultSerializer,
+    SymptomSearchResultSerializer,
     SymptomReportSerializer,
     EmotionLogSerializer,
     RecommendationSerializer
@@ -25,6 +34,7 @@ class ChatViewSet(viewsets.ModelViewSet):
     """
     serializer_class = ChatInteractionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ChatCursorPagination
     
     def get_queryset(self):
         return ChatInteraction.objects.filter(user=self.request.user)
@@ -32,15 +42,68 @@ class ChatViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         # Process message through chat service
         message = serializer.validated_data['message_text']
-        result = chat_service.process_message(message, self.request.user.first_name)
+        result = chat_service.process_message(message, user=self.request.user)
         
-        # Save with bot response
-        serializer.save(
-            user=self.request.user,
-            bot_response=result['response'],
-            sentiment_flag=result['sentiment'],
-            risk_keywords_detected=result['risk_keywords']
-        )
+        # Save with bot response; side effects go through the chat outbox
+        with transaction.atomic():
+            interaction = serializer.save(
+                user=self.request.user,
+                bot_response=result['response'],
+                sentiment_flag=result['sentiment'],
+                risk_keywords_detected=result['risk_keywords'],
+                lexicon_version=result['lexicon_version']
+            )
+            chat_outbox_service.enqueue(interaction, result)
+
+
+async def chat_create_async(request):
+    """
+    Async equivalent of POST /api/chat/ for ASGI deployments.
+    
+    DRF views are sync-only, so this is a plain Django view that reuses the
+    API authentication classes, parsers and ChatInteractionSerializer.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'},
+                            status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    
+    drf_request = Request(
+        request,
+        parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+        authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+    )
+    try:
+        # Token and session lookups query the DB; SessionAuthentication also checks CSRF
+        user = await sync_to_async(lambda: drf_request.user)()
+        if not user.is_authenticated:
+            raise exceptions.NotAuthenticated()
+        serializer = ChatInteractionSerializer(data=drf_request.data)
+        serializer.is_valid(raise_exception=True)
+    except exceptions.APIException as exc:
+        return _api_error(drf_request, exc)
+    
+    message = serializer.validated_data['message_text']
+    result = await chat_service.aprocess_message(message, user=user)
+    interaction = await chat_outbox_service.arecord_interaction(user, message, result)
+    
+    return JsonResponse(ChatInteractionSerializer(interaction).data, status=status.HTTP_201_CREATED)
+
+
+# Like DRF views: CSRF is only enforced by SessionAuthentication
+chat_create_async.csrf_exempt = True
+
+
+def _api_error(drf_request, exc):
+    """JSON error response with the status codes DRF would use."""
+    detail = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+    response = JsonResponse(detail, status=exc.status_code, safe=False)
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        header = drf_request.authenticators[0].authenticate_header(drf_request)
+        if header:
+            response['WWW-Authenticate'] = header
+        else:
+            response.status_code = status.HTTP_403_FORBIDDEN
+    return response
 
 
 class SymptomViewSet(viewsets.ModelViewSet):
@@ -91,3 +154,58 @@ class RecommendationViewSet(viewsets.ReadOnlyModelViewSet):
         recommendation.patient_completed = True
         recommendation.save()
         return Response({'status': 'completed'})
+
+
+class SearchViewSet(viewsets.ViewSet):
+    """
+    API endpoint for full-text search over chats and symptom descriptions.
+    Doctors only; limited to their assigned patients and to what each
+    patient consented to share.
+    
+    Query params: q (required), type (chat|symptom|all), patient, limit
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    DEFAULT_LIMIT = 50
+    MAX_LIMIT = 200
+    
+    def list(self, request):
+        doctor = request.user
+        if doctor.role != 'DOCTOR':
+            return Response({'error': 'Solo disponible para médicos.'}, status=status.HTTP_403_FORBIDDEN)
+        
+        text = request.query_params.get('q', '').strip()
+        result_type = request.query_params.get('type', 'all')
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', self.DEFAULT_LIMIT)), self.MAX_LIMIT))
+            patient_id = request.query_params.get('patient')
+            patient_id = int(patient_id) if patient_id else None
+        except ValueError:
+            return Response({'error': 'limit y patient deben ser números.'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if not text:
+            return Response({'error': 'El parámetro q es obligatorio.'}, status=status.HTTP_400_BAD_REQUEST)
+        if result_type not in ('chat', 'symptom', 'all'):
+            return Response({'error': 'type debe ser chat, symptom o all.'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        results = {}
+        
+        if result_type in ('chat', 'all'):
+            chats = ChatInteraction.objects.visible_to(doctor, 'chat').filter(
+                user__profile__assigned_doctor=doctor
+            )
+            if patient_id:
+                chats = chats.filter(user_id=patient_id)
+            chats = search_service.search_chats(chats, text).order_by('-timestamp', '-id')[:limit]
+            results['chats'] = ChatSearchResultSerializer(chats, many=True).data
+        
+        if result_type in ('symptom', 'all'):
+            symptoms = SymptomReport.objects.visible_to(doctor, 'clinical').filter(
+                patient__profile__assigned_doctor=doctor
+            )
+            if patient_id:
+                symptoms = symptoms.filter(patient_id=patient_id)
+            symptoms = search_service.search_symptoms(symptoms, text).order_by('-timestamp', '-id')[:limit]
+            results['symptoms'] = SymptomSearchResultSerializer(symptoms, many=True).data
+        
+        return Response(results)
@@ -2,19 +2,30 @@
 Admin configuration for chatbot app.
 """
 from django.contrib import admin
+from django.db.models import Q
 from simple_history.admin import SimpleHistoryAdmin
-from .models import ChatInteraction, VoiceMemo
+from .models import ChatInteraction, VoiceMemo, ChatOutboxEntry, LexiconVersion
 
 
 @admin.register(ChatInteraction)
 class ChatInteractionAdmin(SimpleHistoryAdmin):
     """Admin interface for chat interactions."""
     
-    list_display = ('user', 'timestamp', 'sentiment_flag', 'is_risky', 'message_preview')
-    list_filter = ('sentiment_flag', 'timestamp')
+    list_display = ('user', 'timestamp', 'sentiment_flag', 'is_risky', 'message_preview', 'lexicon_version')
+    list_filter = ('sentiment_flag', 'timestamp', 'lexicon_version')
     search_fields = ('user__username', 'message_text', 'bot_response')
     readonly_fields = ('timestamp',)
     
+    def get_search_results(self, request, queryset, search_term):
+        """Username match, or text match through the full-text index."""
+        if not search_term:
+            return queryset, False
+        from search.services import search_service
+        matches = search_service.search_chats(ChatInteraction.objects.all(), search_term)
+        return queryset.filter(
+            Q(user__username__icontains=search_term) | Q(pk__in=matches.values('pk'))
+        ), False
+    
     def message_preview(self, obj):
         """Show first 50 characters of message."""
         return obj.message_text[:50] + '...' if len(obj.message_text) > 50 else obj.message_text
@@ -41,3 +52,53 @@ class VoiceMemoAdmin(admin.ModelAdmin):
         return bool(obj.transcription)
     has_transcription.boolean = True
     has_transcription.short_description = 'Transcrito'
+
+
+@admin.register(ChatOutboxEntry)
+class ChatOutboxEntryAdmin(admin.ModelAdmin):
+    """Admin interface for pending chat side effects."""
+    
+    list_display = ('interaction', 'risk_level', 'create_alert', 'log_symptom', 'status', 'attempts', 'created_at')
+    list_filter = ('status', 'risk_level', 'created_at')
+    readonly_fields = ('created_at', 'processed_at')
+
+
+@admin.register(LexiconVersion)
+class LexiconVersionAdmin(admin.ModelAdmin):
+    """
+    Admin for chatbot lexicon versions.
+    Published versions are immutable: changes are made by adding a new version.
+    """
+    
+    list_display = ('version', 'is_active', 'created_at', 'created_by', 'notes')
+    list_filter = ('is_active',)
+    actions = ['activate_version']
+    
+    def get_readonly_fields(self, request, obj=None):
+        if obj is None:
+            return ('version', 'created_by', 'created_at')
+        return ('version', 'risk_keywords', 'intent_keywords', 'is_active', 'created_by', 'created_at')
+    
+    def save_model(self, request, obj, form, change):
+        if change:
+            obj.save(update_fields=['notes'])
+            return
+        from .services import lexicon_store
+        published = lexicon_store.publish(
+            obj.risk_keywords,
+            obj.intent_keywords,
+            notes=obj.notes,
+            created_by=request.user,
+            activate=obj.is_active
+        )
+        obj.pk, obj.version = published.pk, published.version
+    
+    @admin.action(description='Activar la versión seleccionada')
+    def activate_version(self, request, queryset):
+        if queryset.count() != 1:
+            self.message_user(request, 'Selecciona exactamente una versión.', level='error')
+            return
+        from .services import lexicon_store
+        version = queryset.get().version
+        lexicon_store.activate(version)
+        self.message_user(request, f'Léxico v{version} activado.')
@@ -0,0 +1,195 @@
+"""
+Benchmark harness for the chatbot pipeline.
+Builds a reproducible synthetic Spanish corpus and times ChatService
+stage by stage and end to end. Prometheus metrics are disabled while the
+live code paths run, so benchmark traffic never reaches /metrics/.
+"""
+import random
+import statistics
+import time
+from typing import Dict, List
+
+from metrics import collectors
+
+from .normalization import normalize
+
+# Message families weighted roughly like real traffic
+CORPUS_TEMPLATES = {
+    'greeting': (0.20, [
+        'Hola Lia', 'hola, buenos días', 'Buenas tardes Lia, ¿cómo estás?',
+        'hey', 'Buenas noches', 'Hola de nuevo',
+    ]),
+    'gratitude': (0.10, [
+        'Gracias por escucharme', 'muchas gracias, eres muy amable',
+        'Te agradezco mucho la ayuda',
+    ]),
+    'joy': (0.10, [
+        'Hoy me siento bien', 'Estoy feliz, dormí genial', 'Me siento mejor que ayer',
+        'Estoy contenta con el tratamiento',
+    ]),
+    'emotion': (0.15, [
+        'Estoy muy triste hoy', 'Siento mucha ansiedad y miedo', 'Me siento sola y vacía',
+        'Tengo PÁNICO por los resultados', 'Llevo toda la mañana llorando', 'Estoy deprimida',
+    ]),
+    'pain': (0.20, [
+        'Me duele mucho la cabeza', 'Tengo un dolor intenso en la espalda, como un 8',
+        'Dolor fuerte en el abdomen desde anoche', 'Siento ardor y una punzada al caminar',
+        'Estoy cansada y con náusea', 'Migraña otra vez, dolor 6 de 10',
+    ]),
+    'crisis': (0.05, [
+        'No aguanto más este dolor', 'Ya no puedo más, ayuda por favor',
+        'A veces quiero morir', 'Siento que no vale la pena vivir', 'Estoy desesperada',
+        'Pienso en cortarme',
+    ]),
+    'free_text': (0.20, None),
+}
+
+# Vocabulary for long free-text messages (mostly neutral filler)
+FREE_TEXT_WORDS = (
+    'hoy fui al hospital y el médico me explicó los resultados de los exámenes '
+    'mi familia vino a visitarme y hablamos de muchas cosas durante la tarde '
+    'la quimioterapia de esta semana fue más larga de lo normal pero estuve tranquila '
+    'comí poco porque no tenía hambre y luego dormí una siesta corta '
+    'mañana tengo cita con la psicóloga y quiero contarle cómo me he sentido'
+).split()
+
+
+def build_corpus(size: int, seed: int = 42) -> List[Dict]:
+    """
+    Reproducible list of {'family', 'text'} messages.
+    Free-text messages are 40-120 words long.
+    """
+    rng = random.Random(seed)
+    families = list(CORPUS_TEMPLATES)
+    weights = [CORPUS_TEMPLATES[family][0] for family in families]
+    
+    corpus = []
+    for family in rng.choices(families, weights=weights, k=size):
+        templates = CORPUS_TEMPLATES[family][1]
+        if templates is None:
+            text = ' '.join(rng.choice(FREE_TEXT_WORDS) for _ in range(rng.randint(40, 120)))
+        else:
+            text = rng.choice(templates)
+        corpus.append({'family': family, 'text': text})
+    return corpus
+
+
+def _summary(samples: List[float]) -> Dict:
+    """Latency summary in microseconds."""
+    ordered = sorted(samples)
+    
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+    
+    return {
+        'count': len(ordered),
+        'mean_us': statistics.fmean(ordered) * 1e6,
+        'p50_us': percentile(0.50) * 1e6,
+        'p95_us': percentile(0.95) * 1e6,
+        'p99_us': percentile(0.99) * 1e6,
+        'max_us': ordered[-1] * 1e6,
+    }
+
+
+def benchmark_stages(chat_service, lexicon, corpus: List[Dict], repeat: int = 3) -> Dict:
+    """
+    Time each pipeline stage per message.
+    'risk' includes the single keyword scan that 'intent' then reuses,
+    mirroring how process_message analyzes a message.
+    """
+    matcher = lexicon.matcher
+    clock = time.perf_counter
+    stages = {name: [] for name in ('normalize', 'risk', 'intent', 'response', 'suggestion')}
+    
+    for _ in range(repeat):
+        # Cold normalization cache each round, like fresh traffic
+        normalize.cache_clear()
+        for item in corpus:
+            t0 = clock()
+            text = normalize(item['text'])
+            t1 = clock()
+            risk_hits, intent_hits = matcher.scan(text.folded)
+            risk_level, _ = matcher.resolve_risk(risk_hits)
+            t2 = clock()
+            intent = matcher.resolve_intent(intent_hits)
+            t3 = clock()
+            chat_service._generate_response(intent, risk_level, 'amiga', text.folded)
+            t4 = clock()
+            chat_service._suggest_action(risk_level, text.folded)
+            t5 = clock()
+            
+            stages['normalize'].append(t1 - t0)
+            stages['risk'].append(t2 - t1)
+            stages['intent'].append(t3 - t2)
+            stages['response'].append(t4 - t3)
+            stages['suggestion'].append(t5 - t4)
+    
+    return {name: _summary(samples) for name, samples in stages.items()}
+
+
+def benchmark_throughput(chat_service, corpus: List[Dict], repeat: int = 3) -> Dict:
+    """messages/sec for process_message and for the batched process_messages."""
+    texts = [item['text'] for item in corpus]
+    
+    single = []
+    batched = []
+    with collectors.disabled():
+        for _ in range(repeat):
+            normalize.cache_clear()
+            start = time.perf_counter()
+            for text in texts:
+                chat_service.process_message(text)
+            single.append(len(texts) / (time.perf_counter() - start))
+            
+            normalize.cache_clear()
+            start = time.perf_counter()
+            chat_service.process_messages(texts)
+            batched.append(len(texts) / (time.perf_counter() - start))
+    
+    return {
+        'process_message_msgs_per_sec': max(single),
+        'process_messages_msgs_per_sec': max(batched),
+        'rounds': repeat,
+    }
+
+
+def benchmark_end_to_end(corpus: List[Dict], requests: int) -> Dict:
+    """
+    Latency of POST send_message through the Django test client.
+    Must run against a test database (see the benchmark_chat command).
+    """
+    with collectors.disabled():
+        return _end_to_end(corpus, requests)
+
+
+def _end_to_end(corpus: List[Dict], requests: int) -> Dict:
+    from django.test import Client
+    from django.urls import reverse
+    from users.models import CustomUser
+    
+    patient = CustomUser.objects.create_user(
+        username='benchmark_patient', password='benchmark', role='PATIENT', first_name='Ana'
+    )
+    client = Client()
+    client.force_login(patient)
+    url = reverse('chatbot:send_message')
+    
+    # Warm up URL resolution, sessions and the lexicon
+    client.post(url, {'message': 'hola'})
+    
+    samples = []
+    by_family = {}
+    for i in range(requests):
+        item = corpus[i % len(corpus)]
+        start = time.perf_counter()
+        response = client.post(url, {'message': item['text']})
+        elapsed = time.perf_counter() - start
+        if response.status_code != 200:
+            raise RuntimeError(f'send_message returned {response.status_code}')
+        samples.append(elapsed)
+        by_family.setdefault(item['family'], []).append(elapsed)
+    
+    return {
+        'send_message': _summary(samples),
+        'by_family': {family: _summary(values) for family, values in sorted(by_family.items())},
+    }
@@ -0,0 +1,151 @@
+"""
+Versioned keyword lexicon for the chatbot.
+Loads the active LexiconVersion, compiles it into a KeywordMatcher once per
+version and swaps it in atomically; every worker notices a newly activated
+version within LEXICON_RELOAD_SECONDS, without a restart.
+"""
+import logging
+import threading
+import time
+from typing import Dict, List, NamedTuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+from .matcher import KeywordMatcher
+
+logger = logging.getLogger('chatbot')
+
+# Version number of the built-in lexicon used when no version is active
+DEFAULT_VERSION = 0
+
+
+class Lexicon(NamedTuple):
+    """A compiled lexicon version."""
+    version: int
+    risk_keywords: Dict[str, List[str]]
+    intent_keywords: Dict[str, List[str]]
+    matcher: KeywordMatcher
+
+
+class LexiconStore:
+    """
+    Process-wide holder of the active compiled lexicon.
+    
+    current() costs one attribute read per message; the database is asked
+    for the active version at most once per LEXICON_RELOAD_SECONDS.
+    """
+    
+    # Compiled versions kept in memory (the active one plus recent ones)
+    MAX_COMPILED = 4
+    
+    def __init__(self, default_risk_keywords, default_intent_keywords):
+        self._defaults = (default_risk_keywords, default_intent_keywords)
+        self._lock = threading.RLock()
+        self._compiled = {}
+        self._current = None
+        self._next_check = 0.0
+    
+    def current(self) -> Lexicon:
+        """The active lexicon, re-checking the database when the interval elapsed."""
+        lexicon = self._current
+        if lexicon is None or time.monotonic() >= self._next_check:
+            lexicon = self.reload()
+        return lexicon
+    
+    async def acurrent(self) -> Lexicon:
+        """current() for async callers: the database check runs in a worker thread."""
+        lexicon = self._current
+        if lexicon is None or time.monotonic() >= self._next_check:
+            lexicon = await sync_to_async(self.reload)()
+        return lexicon
+    
+    def reload(self) -> Lexicon:
+        """Look up the active version and swap it in if it changed."""
+        with self._lock:
+            self._next_check = time.monotonic() + settings.LEXICON_RELOAD_SECONDS
+            try:
+                version = self._active_version()
+                lexicon = self.get(version)
+            except DatabaseError as e:
+                # Keep serving the last good lexicon (or the defaults) if the DB is
+                # unavailable; the next attempt waits for _next_check like any other
+                logger.warning("Could not load chat lexicon: %s", e)
+                if self._current is None:
+                    self._current = self.get(DEFAULT_VERSION)
+                return self._current
+            
+            if self._current is None or self._current.version != lexicon.version:
+                logger.info("Chat lexicon v%s loaded", lexicon.version)
+            self._current = lexicon
+            return lexicon
+    
+    def get(self, version: int) -> Lexicon:
+        """Compiled lexicon for a specific version (compiled once, then cached)."""
+        lexicon = self._compiled.get(version)
+        if lexicon is not None:
+            return lexicon
+        
+        with self._lock:
+            lexicon = self._compiled.get(version)
+            if lexicon is None:
+                lexicon = self._compile(version)
+                if len(self._compiled) >= self.MAX_COMPILED:
+                    current_version = self._current.version if self._current else None
+                    for stale in [v for v in self._compiled if v != current_version][:1]:
+                        del self._compiled[stale]
+                self._compiled[version] = lexicon
+            return lexicon
+    
+    def publish(self, risk_keywords, intent_keywords, notes='', created_by=None, activate=True):
+        """
+        Store a new lexicon version (validated) and optionally activate it.
+        intent_keywords may be an ordered dict or a list of [intent, words] pairs.
+        Returns the LexiconVersion.
+        """
+        if isinstance(intent_keywords, dict):
+            intent_keywords = [[intent, list(words)] for intent, words in intent_keywords.items()]
+        from .models import LexiconVersion
+        
+        with transaction.atomic():
+            last = LexiconVersion.objects.select_for_update().order_by('-version').first()
+            entry = LexiconVersion(
+                version=last.version + 1 if last else 1,
+                risk_keywords=risk_keywords,
+                intent_keywords=intent_keywords,
+                notes=notes,
+                created_by=created_by
+            )
+            entry.full_clean()
+            entry.save()
+            if activate:
+                self.activate(entry.version)
+        
+        logger.info("Chat lexicon v%s published", entry.version)
+        return entry
+    
+    def activate(self, version: int):
+        """Make a stored version the active one (also used to roll back)."""
+        from .models import LexiconVersion
+        
+        with transaction.atomic():
+            LexiconVersion.objects.filter(is_active=True).exclude(version=version).update(is_active=False)
+            if not LexiconVersion.objects.filter(version=version).update(is_active=True):
+                raise LexiconVersion.DoesNotExist(f"Lexicon version {version} does not exist")
+            # This process switches right away; others within LEXICON_RELOAD_SECONDS
+            transaction.on_commit(self.reload)
+    
+    def _active_version(self) -> int:
+        from .models import LexiconVersion
+        version = LexiconVersion.objects.filter(is_active=True).values_list('version', flat=True).first()
+        return DEFAULT_VERSION if version is None else version
+    
+    def _compile(self, version: int) -> Lexicon:
+        if version == DEFAULT_VERSION:
+            risk_keywords, intent_keywords = self._defaults
+        else:
+            from .models import LexiconVersion
+            row = LexiconVersion.objects.values('risk_keywords', 'intent_keywords').get(version=version)
+            risk_keywords, intent_keywords = row['risk_keywords'], dict(row['intent_keywords'])
+        return Lexicon(version, risk_keywords, intent_keywords, KeywordMatcher(risk_keywords, intent_keywords))
@@ -0,0 +1,93 @@
+"""
+Benchmark the chatbot pipeline and print the results as JSON.
+
+Runs against a throwaway test database; the configured database is not touched.
+
+Usage:
+    python manage.py benchmark_chat
+    python manage.py benchmark_chat --messages 20000 --repeat 5 --output bench.json
+    python manage.py benchmark_chat --skip-e2e
+"""
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from chatbot import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Measure ChatService throughput, per-stage timings and send_message latency; emits JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=5000,
+                            help='Synthetic corpus size (default: 5000).')
+        parser.add_argument('--seed', type=int, default=42,
+                            help='Corpus seed (default: 42).')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Rounds for the in-process benchmarks (default: 3).')
+        parser.add_argument('--e2e-requests', type=int, default=300,
+                            help='send_message requests through the test client (default: 300).')
+        parser.add_argument('--skip-e2e', action='store_true',
+                            help='Skip the end-to-end send_message benchmark.')
+        parser.add_argument('--output', default=None,
+                            help='Write JSON to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        if options['messages'] < 1 or options['repeat'] < 1 or options['e2e_requests'] < 1:
+            raise CommandError('--messages, --repeat and --e2e-requests must be positive.')
+
+        corpus = benchmark.build_corpus(options['messages'], options['seed'])
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            from chatbot.services import chat_service, lexicon_store
+
+            lexicon = lexicon_store.reload()
+            results = {
+                'meta': self._meta(options, lexicon.version),
+                'throughput': benchmark.benchmark_throughput(chat_service, corpus, options['repeat']),
+                'stages': benchmark.benchmark_stages(chat_service, lexicon, corpus, options['repeat']),
+            }
+            if not options['skip_e2e']:
+                results['end_to_end'] = benchmark.benchmark_end_to_end(corpus, options['e2e_requests'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Benchmark written to {options['output']}."))
+        else:
+            self.stdout.write(output)
+
+    def _meta(self, options, lexicon_version):
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'git_commit': self._git_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'lexicon_version': lexicon_version,
+            'corpus_size': options['messages'],
+            'seed': options['seed'],
+            'repeat': options['repeat'],
+        }
+
+    def _git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,44 @@
+"""
+Worker that performs chat side effects queued by send_message.
+
+Usage:
+    python manage.py process_chat_outbox            # drain once and exit
+    python manage.py process_chat_outbox --loop     # keep polling
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.services import chat_outbox_service
+
+
+class Command(BaseCommand):
+    help = 'Create alerts, symptoms and emails for pending chat outbox entries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Entries claimed per pass (default: 100).')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling instead of exiting when the queue is empty.')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to sleep between polls when idle (default: 1.0).')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        total = 0
+        try:
+            while True:
+                processed = chat_outbox_service.process_pending(limit=batch_size)
+                total += processed
+                if processed:
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f'{total} outbox entries processed.'))
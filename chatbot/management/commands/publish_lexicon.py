@@ -0,0 +1,76 @@
+"""
+Publish a new chatbot lexicon version from a JSON file, or export one.
+
+The file holds {"risk_keywords": {...}, "intent_keywords": [[intent, [words]], ...]}.
+
+Usage:
+    python manage.py publish_lexicon lexicon.json --notes "Add new crisis phrases"
+    python manage.py publish_lexicon lexicon.json --no-activate
+    python manage.py publish_lexicon --export lexicon.json             # active version
+    python manage.py publish_lexicon --export lexicon.json --lexicon-version 3
+    python manage.py publish_lexicon --activate 2                      # roll back
+"""
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.models import LexiconVersion
+from chatbot.services import lexicon_store
+
+
+class Command(BaseCommand):
+    help = 'Publish, export or activate versions of the chatbot risk/intent lexicon.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='JSON file to publish.')
+        parser.add_argument('--notes', default='', help='Change notes stored with the version.')
+        parser.add_argument('--no-activate', action='store_true',
+                            help='Store the version without making it active.')
+        parser.add_argument('--export', metavar='PATH',
+                            help='Write a version to PATH instead of publishing.')
+        parser.add_argument('--lexicon-version', type=int,
+                            help='Version to export (default: the active one).')
+        parser.add_argument('--activate', type=int, metavar='VERSION',
+                            help='Activate an existing version.')
+
+    def handle(self, *args, **options):
+        if options['activate'] is not None:
+            try:
+                lexicon_store.activate(options['activate'])
+            except LexiconVersion.DoesNotExist as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f"Lexicon v{options['activate']} activated."))
+            return
+
+        if options['export']:
+            version = options['lexicon_version']
+            lexicon = lexicon_store.get(lexicon_store.reload().version if version is None else version)
+            with open(options['export'], 'w', encoding='utf-8') as f:
+                json.dump({
+                    'version': lexicon.version,
+                    'risk_keywords': lexicon.risk_keywords,
+                    'intent_keywords': [[intent, words] for intent, words in lexicon.intent_keywords.items()],
+                }, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Lexicon v{lexicon.version} exported to {options['export']}."))
+            return
+
+        if not options['path']:
+            raise CommandError('Give a JSON file to publish, or use --export/--activate.')
+
+        try:
+            with open(options['path'], encoding='utf-8') as f:
+                data = json.load(f)
+            entry = lexicon_store.publish(
+                data['risk_keywords'],
+                data['intent_keywords'],
+                notes=options['notes'],
+                activate=not options['no_activate']
+            )
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f'Could not read lexicon file: {e}')
+        except ValidationError as e:
+            raise CommandError(f'Invalid lexicon: {e}')
+
+        state = 'published' if options['no_activate'] else 'published and activated'
+        self.stdout.write(self.style.SUCCESS(f'Lexicon v{entry.version} {state}.'))
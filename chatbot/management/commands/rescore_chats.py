@@ -0,0 +1,156 @@
+"""
+Re-score historical chat interactions with the active (or a given) lexicon version.
+
+Usage:
+    python manage.py rescore_chats
+    python manage.py rescore_chats --workers 4 --chunk-size 5000
+    python manage.py rescore_chats --since 2024-01-01 --dry-run
+    python manage.py rescore_chats --lexicon-version 3
+"""
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time
+from itertools import islice
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from chatbot.models import ChatInteraction, LexiconVersion
+from chatbot.services import lexicon_store
+
+
+def score_rows(rows, lexicon_version):
+    """
+    Score a chunk of (pk, message_text) pairs with a pinned lexicon version.
+    Module-level so it can run inside worker processes; each worker compiles
+    the version once and reuses it for every chunk.
+    """
+    from chatbot.services import chat_service
+
+    lexicon = lexicon_store.get(lexicon_version)
+    results = chat_service.process_messages([text for _, text in rows], lexicon=lexicon)
+    return [
+        (pk, result['sentiment'], result['risk_level'], result['risk_keywords'])
+        for (pk, _), result in zip(rows, results)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Re-run risk/sentiment detection over stored ChatInteraction rows and update changed ones.'
+
+    UPDATE_FIELDS = ['sentiment_flag', 'risk_keywords_detected', 'lexicon_version']
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows fetched from the database per round trip (default: 2000).')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Rows written per bulk_update (default: 500).')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Scoring processes; 1 scores in-process (default: 1).')
+        parser.add_argument('--since', type=str, default=None,
+                            help='Only re-score messages from the start of this local date on (YYYY-MM-DD).')
+        parser.add_argument('--lexicon-version', type=int, default=None,
+                            help='Lexicon version to score with (default: the active one).')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report changes without writing them.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        batch_size = options['batch_size']
+        workers = options['workers']
+        dry_run = options['dry_run']
+
+        if chunk_size < 1 or batch_size < 1 or workers < 1:
+            raise CommandError('--chunk-size, --batch-size and --workers must be positive.')
+
+        # Pin one version for the whole run, even if another is activated meanwhile
+        try:
+            if options['lexicon_version'] is None:
+                self.lexicon_version = lexicon_store.reload().version
+            else:
+                self.lexicon_version = lexicon_store.get(options['lexicon_version']).version
+        except LexiconVersion.DoesNotExist:
+            raise CommandError(f"Lexicon version {options['lexicon_version']} does not exist.")
+
+        queryset = ChatInteraction.objects.order_by('pk')
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError(f"Invalid --since date: {options['since']}")
+            # A plain range on timestamp keeps the index usable, unlike __date
+            since = timezone.make_aware(datetime.combine(since, time.min))
+            queryset = queryset.filter(timestamp__gte=since)
+
+        # Old values travel with each row so no second lookup is needed to diff
+        rows = queryset.values_list(
+            'pk', 'message_text', 'sentiment_flag', 'risk_keywords_detected'
+        ).iterator(chunk_size=chunk_size)
+
+        self.verbosity = options['verbosity']
+        self.scanned = 0
+        self.changed_by_level = Counter()
+        self.pending = []
+
+        if workers == 1:
+            for chunk in self._chunks(rows, chunk_size):
+                self._apply(chunk, score_rows([(pk, text) for pk, text, _, _ in chunk], self.lexicon_version),
+                            batch_size, dry_run)
+        else:
+            # Workers only read their lexicon version once; drop inherited connections before forking
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+                in_flight = deque()
+                for chunk in self._chunks(rows, chunk_size):
+                    in_flight.append((chunk, pool.submit(
+                        score_rows, [(pk, text) for pk, text, _, _ in chunk], self.lexicon_version
+                    )))
+                    # Bounded window keeps memory flat regardless of table size
+                    if len(in_flight) >= workers * 2:
+                        chunk, future = in_flight.popleft()
+                        self._apply(chunk, future.result(), batch_size, dry_run)
+                while in_flight:
+                    chunk, future = in_flight.popleft()
+                    self._apply(chunk, future.result(), batch_size, dry_run)
+
+        self._flush(dry_run)
+
+        changed = sum(self.changed_by_level.values())
+        verb = 'would be updated' if dry_run else 'updated'
+        self.stdout.write(self.style.SUCCESS(
+            f'{self.scanned} interactions scanned with lexicon v{self.lexicon_version}, {changed} {verb}.'
+        ))
+        for level, count in self.changed_by_level.most_common():
+            self.stdout.write(f'  {level}: {count}')
+
+    def _chunks(self, rows, size):
+        while True:
+            chunk = list(islice(rows, size))
+            if not chunk:
+                return
+            yield chunk
+
+    def _apply(self, chunk, scored, batch_size, dry_run):
+        """Queue rows whose stored scoring differs from the fresh one."""
+        self.scanned += len(chunk)
+        for (_, _, old_sentiment, old_keywords), (pk, sentiment, risk_level, keywords) in zip(chunk, scored):
+            if sentiment == old_sentiment and keywords == (old_keywords or []):
+                continue
+            self.changed_by_level[risk_level] += 1
+            self.pending.append(ChatInteraction(
+                pk=pk,
+                sentiment_flag=sentiment,
+                risk_keywords_detected=keywords,
+                lexicon_version=self.lexicon_version,
+            ))
+            if self.verbosity > 1:
+                self.stdout.write(f'  #{pk}: {old_sentiment} -> {sentiment} {keywords}')
+            if len(self.pending) >= batch_size:
+                self._flush(dry_run, batch_size)
+
+    def _flush(self, dry_run, batch_size=None):
+        if self.pending and not dry_run:
+            ChatInteraction.objects.bulk_update(self.pending, self.UPDATE_FIELDS, batch_size=batch_size)
+        self.pending = []
@@ -0,0 +1,149 @@
+"""
+Keyword matching engine for the chatbot.
+Compiles risk and intent lexicons into a single regex scanned once per message.
+"""
+import re
+from itertools import product
+from typing import Dict, List, Tuple
+
+from .normalization import fold
+
+# Only literal text and character classes like [áa] are supported in patterns
+_CHAR_CLASS = re.compile(r'\[([^\]]+)\]')
+_UNSUPPORTED = re.compile(r'[\\.^$*+?{}()|]')
+
+
+def expand_pattern(pattern: str) -> List[str]:
+    """
+    Expand a simple keyword pattern into every literal it can match.
+    e.g. 'no aguanto m[áa]s' -> ['no aguanto más', 'no aguanto mas']
+    """
+    pieces = []
+    position = 0
+    for match in _CHAR_CLASS.finditer(pattern):
+        pieces.append([pattern[position:match.start()]])
+        pieces.append(list(match.group(1)))
+        position = match.end()
+    pieces.append([pattern[position:]])
+
+    literals = [''.join(combo) for combo in product(*pieces)]
+    for literal in literals:
+        if _UNSUPPORTED.search(literal):
+            raise ValueError(f"Unsupported keyword pattern: {pattern!r}")
+    return literals
+
+
+def _trie_regex(literals: List[str]) -> str:
+    """Build a trie-shaped alternation that always prefers the longest literal."""
+    trie: Dict = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def render(node):
+        is_terminal = '' in node
+        branches = [re.escape(char) + render(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if is_terminal:
+            # Greedy optional suffix: longer literals win over their prefixes
+            return '(?:' + body + ')?'
+        return body
+
+    return render(trie)
+
+
+class KeywordMatcher:
+    """
+    Single-pass matcher for the risk and intent lexicons.
+
+    All keywords are expanded to literals and compiled into one trie regex
+    wrapped in a lookahead, so every start position is examined exactly once
+    and overlapping keywords ('muy triste' / 'triste') are all reported.
+    
+    Literals are folded (see normalization.fold), so scanned text must be
+    folded too: 'PÁNICO' and 'panico' match the same keyword.
+    """
+
+    RISK_PRECEDENCE = ('CRITICAL', 'HIGH', 'MEDIUM', 'LOW')
+
+    def __init__(self, risk_keywords: Dict[str, List[str]], intent_keywords: Dict[str, List[str]]):
+        self.risk_keywords = risk_keywords
+        self.intent_keywords = intent_keywords
+
+        # literal -> labels it stands for; a label is ('RISK'|'INTENT', category, keyword)
+        labels_by_literal: Dict[str, List[Tuple[str, str, str]]] = {}
+        for level in self.RISK_PRECEDENCE:
+            for pattern in risk_keywords.get(level, []):
+                for literal in {fold(literal) for literal in expand_pattern(pattern)} - {''}:
+                    labels_by_literal.setdefault(literal, []).append(('RISK', level, pattern))
+        for intent, words in intent_keywords.items():
+            for word in words:
+                if fold(word):
+                    labels_by_literal.setdefault(fold(word), []).append(('INTENT', intent, word))
+
+        # A longest match at a position implies every literal that is a prefix of it
+        self._labels_for_match: Dict[str, List[Tuple[str, str, str]]] = {}
+        for literal in labels_by_literal:
+            labels = []
+            for end in range(1, len(literal) + 1):
+                labels.extend(labels_by_literal.get(literal[:end], []))
+            self._labels_for_match[literal] = labels
+
+        if not labels_by_literal:
+            # Empty lexicon: a pattern that never matches
+            self._regex = re.compile('(?!)')
+            return
+        
+        # Cheap first-character test lets most positions fail before entering the trie
+        first_chars = ''.join(sorted({literal[0] for literal in labels_by_literal}))
+        self._regex = re.compile(
+            '(?=[' + re.escape(first_chars) + '])(?=(' + _trie_regex(list(labels_by_literal)) + '))'
+        )
+
+    def scan(self, text: str) -> Tuple[set, set]:
+        """Return the matched risk patterns and matched intents in one pass over folded text."""
+        risk_hits = set()
+        intent_hits = set()
+        for literal in set(self._regex.findall(text)):
+            for kind, category, keyword in self._labels_for_match[literal]:
+                if kind == 'RISK':
+                    risk_hits.add(keyword)
+                else:
+                    intent_hits.add(category)
+        return risk_hits, intent_hits
+
+    def analyze(self, text: str) -> Tuple[str, List[str], str]:
+        """
+        Classify text into (risk_level, risk_keywords, intent).
+        CRITICAL/HIGH return only their first keyword in lexicon order;
+        MEDIUM/LOW return every MEDIUM then LOW keyword found.
+        """
+        risk_hits, intent_hits = self.scan(text)
+        return self.resolve_risk(risk_hits) + (self.resolve_intent(intent_hits),)
+
+    def resolve_risk(self, risk_hits: set) -> Tuple[str, List[str]]:
+        if not risk_hits:
+            return 'NONE', []
+
+        for level in ('CRITICAL', 'HIGH'):
+            for pattern in self.risk_keywords.get(level, []):
+                if pattern in risk_hits:
+                    return level, [pattern]
+
+        detected = [pattern for level in ('MEDIUM', 'LOW')
+                    for pattern in self.risk_keywords.get(level, [])
+                    if pattern in risk_hits]
+        if any(pattern in risk_hits for pattern in self.risk_keywords.get('MEDIUM', [])):
+            return 'MEDIUM', detected
+        return 'LOW', detected
+
+    def resolve_intent(self, intent_hits: set) -> str:
+        for intent in self.intent_keywords:
+            if intent in intent_hits:
+                return intent
+        return 'UNKNOWN'
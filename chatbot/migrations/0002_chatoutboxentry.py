@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatOutboxEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('risk_level', models.CharField(max_length=10, verbose_name='Nivel de riesgo')),
+                ('suggested_action', models.TextField(blank=True, verbose_name='Acción sugerida')),
+                ('create_alert', models.BooleanField(default=False, verbose_name='Crear alerta')),
+                ('log_symptom', models.BooleanField(default=False, verbose_name='Registrar síntoma')),
+                ('status', models.CharField(choices=[('PENDING', 'Pendiente'), ('DONE', 'Procesada'), ('FAILED', 'Fallida')], default='PENDING', max_length=10, verbose_name='Estado')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')),
+                ('last_error', models.TextField(blank=True, verbose_name='Último error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de procesamiento')),
+                ('interaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outbox_entries', to='chatbot.chatinteraction', verbose_name='Interacción')),
+            ],
+            options={
+                'verbose_name': 'Tarea Pendiente de Chat',
+                'verbose_name_plural': 'Tareas Pendientes de Chat',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='chatbot_cha_status_b6bef9_idx')],
+            },
+        ),
+    ]
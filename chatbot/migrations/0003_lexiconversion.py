@@ -0,0 +1,84 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Lexicon as shipped in ChatService before it became versioned data
+INITIAL_RISK_KEYWORDS = {
+    'CRITICAL': [
+        'quiero morir', 'suicidar', 'acabar con todo', 'no vale la pena vivir',
+        'mejor muerta', 'matarme', 'pastillas para dormir', 'cortarme'
+    ],
+    'HIGH': [
+        'no aguanto m[áa]s', 'no puedo m[áa]s', 'dolor insoportable',
+        'no encuentro salida', 'desesperad[oa]', 'ayuda por favor'
+    ],
+    'MEDIUM': [
+        'muy triste', 'dolor intenso', 'dolor fuerte', 'muy mal',
+        'fatal', 'terrible', 'llorando', 'deprimid[oa]'
+    ],
+    'LOW': [
+        'triste', 'duele', 'cansada', 'agotada', 'molesta', 'aburrida'
+    ],
+}
+
+INITIAL_INTENT_KEYWORDS = [
+    ['GREETING', ['hola', 'buenos d', 'buenas t', 'buenas n', 'hi', 'hey']],
+    ['GRATITUDE', ['gracias', 'agradez', 'amable']],
+    ['JOY', ['bien', 'feliz', 'contenta', 'genial', 'mejor', 'alegr']],
+    ['EMOTION_SAD', ['triste', 'llora', 'pena', 'depre', 'sola', 'vacía']],
+    ['EMOTION_ANXIETY', ['ansiedad', 'miedo', 'nervios', 'angustia', 'panico', 'tiembla']],
+    ['PAIN', ['dolor', 'duele', 'ardor', 'punzada', 'migraña']],
+]
+
+
+def seed_lexicon(apps, schema_editor):
+    LexiconVersion = apps.get_model('chatbot', 'LexiconVersion')
+    if not LexiconVersion.objects.exists():
+        LexiconVersion.objects.create(
+            version=1,
+            risk_keywords=INITIAL_RISK_KEYWORDS,
+            intent_keywords=INITIAL_INTENT_KEYWORDS,
+            is_active=True,
+            notes='Léxico inicial'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('chatbot', '0002_chatoutboxentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatinteraction',
+            name='lexicon_version',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Versión del léxico'),
+        ),
+        migrations.CreateModel(
+            name='LexiconVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(unique=True, verbose_name='Versión')),
+                ('risk_keywords', models.JSONField(verbose_name='Palabras clave de riesgo')),
+                ('intent_keywords', models.JSONField(verbose_name='Palabras clave de intención')),
+                ('is_active', models.BooleanField(default=False, verbose_name='Activa')),
+                ('notes', models.TextField(blank=True, verbose_name='Notas de cambios')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lexicon_versions', to=settings.AUTH_USER_MODEL, verbose_name='Creada por')),
+            ],
+            options={
+                'verbose_name': 'Versión del Léxico',
+                'verbose_name_plural': 'Versiones del Léxico',
+                'ordering': ['-version'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='lexiconversion',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('is_active',), name='single_active_lexicon'),
+        ),
+        migrations.RunPython(seed_lexicon, migrations.RunPython.noop),
+    ]
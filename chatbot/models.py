@@ -6,6 +6,13 @@ from django.db import models
 from django.conf import settings
 # from simple_history.models import HistoricalRecords  # Temporarily disabled
 
+from psychosocial.models import ConsentQuerySet
+
+
+class ChatInteractionQuerySet(ConsentQuerySet):
+    patient_field = 'user'
+    default_data_type = 'chat'
+
 
 class ChatInteraction(models.Model):
     """
@@ -58,9 +65,19 @@ class ChatInteraction(models.Model):
         verbose_name='Puntuaciones de emoción (ML)'
     )
     
+    # LexiconVersion.version that produced sentiment_flag/risk_keywords_detected
+    # (0 = built-in defaults, null = scored before lexicons were versioned)
+    lexicon_version = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Versión del léxico'
+    )
+    
     # Audit trail
     # history = HistoricalRecords()  # Temporarily disabled
     
+    objects = ChatInteractionQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Interacción de Chat'
         verbose_name_plural = 'Interacciones de Chat'
@@ -129,3 +146,168 @@ class VoiceMemo(models.Model):
     
     def __str__(self):
         return f"Memo de {self.user.username} - {self.created_at.strftime('%Y-%m-%d')}"
+
+
+class ChatOutboxEntry(models.Model):
+    """
+    Durable queue of side effects triggered by a chat message.
+    Written in the same transaction as the ChatInteraction and
+    processed later by the process_chat_outbox worker.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Pendiente'),
+        ('DONE', 'Procesada'),
+        ('FAILED', 'Fallida'),
+    ]
+    
+    interaction = models.ForeignKey(
+        ChatInteraction,
+        on_delete=models.CASCADE,
+        related_name='outbox_entries',
+        verbose_name='Interacción'
+    )
+    
+    risk_level = models.CharField(
+        max_length=10,
+        verbose_name='Nivel de riesgo'
+    )
+    
+    suggested_action = models.TextField(
+        blank=True,
+        verbose_name='Acción sugerida'
+    )
+    
+    create_alert = models.BooleanField(
+        default=False,
+        verbose_name='Crear alerta'
+    )
+    
+    log_symptom = models.BooleanField(
+        default=False,
+        verbose_name='Registrar síntoma'
+    )
+    
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='PENDING',
+        verbose_name='Estado'
+    )
+    
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Intentos'
+    )
+    
+    last_error = models.TextField(
+        blank=True,
+        verbose_name='Último error'
+    )
+    
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Fecha de creación'
+    )
+    
+    processed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Fecha de procesamiento'
+    )
+    
+    class Meta:
+        verbose_name = 'Tarea Pendiente de Chat'
+        verbose_name_plural = 'Tareas Pendientes de Chat'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_status_display()} - Interacción #{self.interaction_id}"
+
+
+class LexiconVersion(models.Model):
+    """
+    Versioned risk/intent keyword lexicon used by the chatbot matcher.
+    Versions are immutable once published; exactly one is active and
+    workers pick up a newly activated one without a restart.
+    """
+    RISK_LEVELS = ('CRITICAL', 'HIGH', 'MEDIUM', 'LOW')
+    
+    version = models.PositiveIntegerField(
+        unique=True,
+        verbose_name='Versión'
+    )
+    
+    # {'CRITICAL': [...], 'HIGH': [...], 'MEDIUM': [...], 'LOW': [...]}
+    risk_keywords = models.JSONField(
+        verbose_name='Palabras clave de riesgo'
+    )
+    
+    # [['GREETING', [...]], ...] in priority order (a list, since jsonb
+    # does not keep object key order)
+    intent_keywords = models.JSONField(
+        verbose_name='Palabras clave de intención'
+    )
+    
+    is_active = models.BooleanField(
+        default=False,
+        verbose_name='Activa'
+    )
+    
+    notes = models.TextField(
+        blank=True,
+        verbose_name='Notas de cambios'
+    )
+    
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='lexicon_versions',
+        verbose_name='Creada por'
+    )
+    
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Fecha de creación'
+    )
+    
+    class Meta:
+        verbose_name = 'Versión del Léxico'
+        verbose_name_plural = 'Versiones del Léxico'
+        ordering = ['-version']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['is_active'],
+                condition=models.Q(is_active=True),
+                name='single_active_lexicon'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Léxico v{self.version}{' (activa)' if self.is_active else ''}"
+    
+    def clean(self):
+        """Validate structure and that every pattern compiles."""
+        from django.core.exceptions import ValidationError
+        from .matcher import KeywordMatcher
+        
+        if not isinstance(self.risk_keywords, dict) or not set(self.risk_keywords) <= set(self.RISK_LEVELS):
+            raise ValidationError({'risk_keywords': f'Debe ser un objeto con claves {", ".join(self.RISK_LEVELS)}.'})
+        if not isinstance(self.intent_keywords, list) or not all(
+            isinstance(entry, list) and len(entry) == 2 and isinstance(entry[0], str)
+            for entry in self.intent_keywords
+        ):
+            raise ValidationError({'intent_keywords': 'Debe ser una lista [[intención, [palabras]], ...].'})
+        for field, groups in (('risk_keywords', self.risk_keywords.values()),
+                              ('intent_keywords', [words for _, words in self.intent_keywords])):
+            for words in groups:
+                if not isinstance(words, list) or not all(isinstance(word, str) and word.strip() for word in words):
+                    raise ValidationError({field: 'Cada entrada debe ser una lista de textos no vacíos.'})
+        try:
+            KeywordMatcher(self.risk_keywords, dict(self.intent_keywords))
+        except ValueError as e:
+            raise ValidationError({'risk_keywords': str(e)})
@@ -0,0 +1,48 @@
+"""
+Text normalization for the chatbot NLP.
+Every message is normalized once and the result is shared by risk and
+intent detection, response selection and symptom extraction.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+from typing import FrozenSet, NamedTuple, Tuple
+
+_WHITESPACE = re.compile(r'\s+')
+_TOKEN = re.compile(r'\w+')
+_INTEGER = re.compile(r'[1-9][0-9]*')
+
+
+def fold(text: str) -> str:
+    """
+    Lowercase, strip accents (NFKD) and collapse whitespace.
+    e.g. '  Siento   PÁNICO ' -> 'siento panico'
+    """
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return _WHITESPACE.sub(' ', stripped).strip()
+
+
+class NormalizedText(NamedTuple):
+    """A message prepared for matching."""
+    raw: str
+    folded: str
+    tokens: Tuple[str, ...]
+    
+    @property
+    def token_set(self) -> FrozenSet[str]:
+        return frozenset(self.tokens)
+    
+    def first_number(self, low: int, high: int):
+        """First standalone integer token within [low, high], or None."""
+        for token in self.tokens:
+            if _INTEGER.fullmatch(token) and low <= int(token) <= high:
+                return int(token)
+        return None
+
+
+@lru_cache(maxsize=4096)
+def normalize(text: str) -> NormalizedText:
+    """Normalize a message; repeated texts (batches, outbox, symptoms) hit the cache."""
+    folded = fold(text)
+    return NormalizedText(text, folded, tuple(_TOKEN.findall(folded)))
@@ -0,0 +1,43 @@
+"""
+Keyset pagination for chat history.
+Pages walk (timestamp, id) in descending order, so each page is an index
+seek on (user, -timestamp) regardless of how deep the history goes.
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+def encode_cursor(interaction):
+    """Opaque cursor pointing just after the given interaction."""
+    raw = f'{interaction.timestamp.isoformat()}|{interaction.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return (timestamp, pk) from a cursor; raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Invalid cursor: {cursor!r}') from e
+
+
+def keyset_page(queryset, cursor=None, page_size=20):
+    """
+    Newest-first page of interactions strictly older than the cursor.
+    Returns (items, next_cursor); next_cursor is None on the last page.
+    """
+    queryset = queryset.order_by('-timestamp', '-id')
+    if cursor:
+        timestamp, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+    
+    # One extra row tells whether another page exists
+    items = list(queryset[:page_size + 1])
+    if len(items) > page_size:
+        items = items[:page_size]
+        return items, encode_cursor(items[-1])
+    return items, None
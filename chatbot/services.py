@@ -2,18 +2,23 @@
 NLP service for chatbot.
 Handles message processing, sentiment analysis, and risk detection.
 """
+import asyncio
+import contextvars
 import re
 import logging
+import random
+from time import perf_counter
 from typing import Dict, List, Tuple
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
 
-logger = logging.getLogger('chatbot')
-
+from metrics import collectors
 
-import re
-import logging
-import random
-from typing import Dict, List, Tuple
-from django.db.models import Q
+from .lexicon import LexiconStore
+from .normalization import NormalizedText, fold, normalize
+from .models import ChatInteraction, ChatOutboxEntry
 
 logger = logging.getLogger('chatbot')
 
@@ -23,6 +28,10 @@ class ChatService:
     Features: Context awareness, regex pattern matching, varied empathetic responses.
     """
     
+    # Léxicos por defecto (versión 0). El léxico en uso se administra en
+    # LexiconVersion y lo entrega lexicon_store; estos valores solo aplican
+    # cuando no hay ninguna versión activa.
+    
     # --- RIESGO Y SEGURIDAD ---
     RISK_KEYWORDS = {
         'CRITICAL': [
@@ -42,6 +51,16 @@ class ChatService:
         ]
     }
     
+    # --- INTENCIONES (en orden de prioridad) ---
+    INTENT_KEYWORDS = {
+        'GREETING': ['hola', 'buenos d', 'buenas t', 'buenas n', 'hi', 'hey'],
+        'GRATITUDE': ['gracias', 'agradez', 'amable'],
+        'JOY': ['bien', 'feliz', 'contenta', 'genial', 'mejor', 'alegr'],
+        'EMOTION_SAD': ['triste', 'llora', 'pena', 'depre', 'sola', 'vacía'],
+        'EMOTION_ANXIETY': ['ansiedad', 'miedo', 'nervios', 'angustia', 'panico', 'tiembla'],
+        'PAIN': ['dolor', 'duele', 'ardor', 'punzada', 'migraña'],  # Se refinará con el nivel de severidad luego
+    }
+    
     # --- BASES DE CONOCIMIENTO Y RESPUESTAS ---
     RESPONSES = {
         'GREETING': [
@@ -90,24 +109,98 @@ class ChatService:
         ]
     }
 
-    def process_message(self, message: str, user=None) -> Dict:
+    def process_message(self, message: str, user=None, lexicon=None) -> Dict:
         """
         Procesa el mensaje con lógica mejorada de Lia 2.0.
+        lexicon: Lexicon a usar (por defecto el activo).
         """
-        message_lower = message.lower().strip()
-        user_name = user.first_name if user and user.first_name else (user.username if user else "amiga")
+        started = perf_counter()
+        text = normalize(message)
+        normalized = perf_counter()
+        user_name = self._display_name(user)
+        lexicon = lexicon or lexicon_store.current()
         
-        # 1. Detección de Riesgo
-        risk_level, detected_keywords = self._detect_risk(message_lower)
+        # 1-2. Detección de Riesgo y Análisis de Tema (una sola pasada)
+        analysis_started = perf_counter()
+        analysis = lexicon.matcher.analyze(text.folded)
+        analyzed = perf_counter()
         
-        # 2. Análisis de Sentimiento y Tema
-        intent = self._detect_intent(message_lower)
+        result = self._build_result(text, user_name, analysis, lexicon.version)
+        
+        # Métricas de mensajes en vivo (los lotes de process_messages no cuentan)
+        collectors.NLP_STAGES['normalize'].observe(normalized - started)
+        collectors.NLP_STAGES['analysis'].observe(analyzed - analysis_started)
+        collectors.NLP_STAGES['response'].observe(perf_counter() - analyzed)
+        collectors.CHAT_MESSAGES_BY_RISK[result['risk_level']].inc()
+        
+        return result
+    
+    async def aprocess_message(self, message: str, user=None) -> Dict:
+        """
+        Versión asíncrona de process_message para vistas ASGI.
+        El análisis corre en el event loop (es CPU puro y breve); solo la
+        recarga periódica del léxico va a un hilo porque consulta la BD.
+        """
+        lexicon = await lexicon_store.acurrent()
+        return self.process_message(message, user=user, lexicon=lexicon)
+    
+    def process_messages(self, messages: List[str], users=None, lexicon=None) -> List[Dict]:
+        """
+        Procesa un lote de mensajes en una sola llamada.
+        
+        Args:
+            messages: Lista de textos
+            users: Lista de usuarios alineada con messages, o un solo usuario
+                   (o None) para todo el lote
+            lexicon: Lexicon a usar para todo el lote (por defecto el activo)
+        
+        Returns:
+            Lista de resultados en el mismo orden que messages, con el mismo
+            formato que process_message.
+        """
+        if users is None or not hasattr(users, '__iter__'):
+            users = [users] * len(messages)
+        else:
+            users = list(users)
+            if len(users) != len(messages):
+                raise ValueError("messages y users deben tener la misma longitud")
+        
+        # Estado compartido del lote: nombres por usuario y análisis por texto normalizado
+        names = {}
+        analyses = {}
+        lexicon = lexicon or lexicon_store.current()
+        analyze = lexicon.matcher.analyze
+        results = []
+        
+        for message, user in zip(messages, users):
+            text = normalize(message)
+            
+            user_key = getattr(user, 'pk', None) or id(user)
+            user_name = names.get(user_key)
+            if user_name is None:
+                user_name = names[user_key] = self._display_name(user)
+            
+            analysis = analyses.get(text.folded)
+            if analysis is None:
+                analysis = analyses[text.folded] = analyze(text.folded)
+            
+            results.append(self._build_result(text, user_name, analysis, lexicon.version))
+        
+        return results
+    
+    def _display_name(self, user) -> str:
+        return user.first_name if user and user.first_name else (user.username if user else "amiga")
+    
+    def _build_result(self, text: NormalizedText, user_name: str, analysis: Tuple[str, List[str], str],
+                      lexicon_version: int) -> Dict:
+        """Arma la respuesta completa a partir del análisis de riesgo e intención."""
+        risk_level, detected_keywords, intent = analysis
         
         # 3. Generación de Respuesta
-        response = self._generate_response(intent, risk_level, user_name, message_lower)
+        response = self._generate_response(intent, risk_level, user_name, text.folded)
         
         # 4. Acción Sugerida (si aplica)
-        suggested_action = self._suggest_action(risk_level, message_lower)
+        suggested_action = self._suggest_action(risk_level, text.folded)
         
         # Determinar flag de sentimiento para la DB
         sentiment_flag = self._map_risk_to_sentiment(risk_level, intent)
@@ -116,47 +209,25 @@ class ChatService:
             'response': response,
             'sentiment': sentiment_flag,
             'risk_level': risk_level,
-            'risk_keywords': detected_keywords,
-            'suggested_action': suggested_action
+            'risk_keywords': list(detected_keywords),
+            'suggested_action': suggested_action,
+            'lexicon_version': lexicon_version
         }
     
     def _detect_risk(self, message: str) -> Tuple[str, List[str]]:
-        """Detecta riesgo usando Expresiones Regulares."""
-        detected = []
-        
-        for level in ['CRITICAL', 'HIGH', 'MEDIUM', 'LOW']:
-            for pattern in self.RISK_KEYWORDS[level]:
-                if re.search(pattern, message):
-                    detected.append(pattern.replace(r'', '')) # Clean regex chars for display
-                    # Si es crítico o alto, retornamos inmediatamente
-                    if level in ['CRITICAL', 'HIGH']:
-                        return level, detected
-        
-        if detected:
-            # Retornar el nivel más alto encontrado (ya manejado por el orden del loop pero por seguridad)
-            return 'MEDIUM' if any(k in self.RISK_KEYWORDS['MEDIUM'] for k in detected) else 'LOW', detected
-            
-        return 'NONE', []
+        """Detecta riesgo con el matcher compilado (CRITICAL/HIGH tienen prioridad)."""
+        matcher = lexicon_store.current().matcher
+        risk_hits, _ = matcher.scan(fold(message))
+        return matcher.resolve_risk(risk_hits)
 
     def _detect_intent(self, message: str) -> str:
         """Clasifica la intención del mensaje."""
-        if any(g in message for g in ['hola', 'buenos d', 'buenas t', 'buenas n', 'hi', 'hey']):
-            return 'GREETING'
-        if any(w in message for w in ['gracias', 'agradez', 'amable']):
-            return 'GRATITUDE'
-        if any(w in message for w in ['bien', 'feliz', 'contenta', 'genial', 'mejor', 'alegr']):
-            return 'JOY'
-        if any(w in message for w in ['triste', 'llora', 'pena', 'depre', 'sola', 'vacía']):
-            return 'EMOTION_SAD'
-        if any(w in message for w in ['ansiedad', 'miedo', 'nervios', 'angustia', 'panico', 'tiembla']):
-            return 'EMOTION_ANXIETY'
-        if any(w in message for w in ['dolor', 'duele', 'ardor', 'punzada', 'migraña']):
-            return 'PAIN' # Se refinará con el nivel de severidad luego
-            
-        return 'UNKNOWN'
+        matcher = lexicon_store.current().matcher
+        _, intent_hits = matcher.scan(fold(message))
+        return matcher.resolve_intent(intent_hits)
 
     def _generate_response(self, intent: str, risk_level: str, name: str, message: str) -> str:
-        """Selecciona una respuesta empática y variada."""
+        """Selecciona una respuesta empática y variada (message ya normalizado)."""
         
         # Prioridad 1: Crisis
         if risk_level == 'CRITICAL':
@@ -210,4 +281,161 @@ class ChatService:
         if intent in ['EMOTION_SAD', 'EMOTION_ANXIETY']: return 'CONCERN'
         return 'NEUTRAL'
 
+
+class ChatOutboxService:
+    """
+    Write-behind for chat side effects (alerts, symptoms, emails).
+    The request thread only enqueues; a worker drains the queue.
+    """
+    
+    MAX_ATTEMPTS = 5
+    
+    def __init__(self):
+        # Strong references to in-flight dispatch() tasks
+        self._tasks = set()
+    
+    def record_interaction(self, user, message, result):
+        """
+        Save an interaction and its pending side effects atomically.
+        Returns (interaction, outbox entry or None).
+        """
+        with transaction.atomic():
+            interaction = ChatInteraction.objects.create(
+                user=user,
+                message_text=message,
+                bot_response=result['response'],
+                sentiment_flag=result['sentiment'],
+                risk_keywords_detected=result['risk_keywords'],
+                lexicon_version=result['lexicon_version']
+            )
+            entry = self.enqueue(interaction, result)
+        return interaction, entry
+    
+    async def arecord_interaction(self, user, message, result):
+        """
+        record_interaction() for async views, followed by dispatch().
+        
+        The async ORM cannot run a transaction, so the interaction and its
+        outbox entry are written together in one sync_to_async call.
+        """
+        interaction, entry = await sync_to_async(self.record_interaction)(user, message, result)
+        if entry is not None:
+            self.dispatch(entry)
+        return interaction
+    
+    def dispatch(self, entry):
+        """
+        Process a committed entry in the background on the running event loop
+        instead of waiting for the next process_chat_outbox poll.
+        
+        The worker stays the fallback: an entry left PENDING (error, process
+        exit) is picked up there, and skip_locked keeps both from applying it.
+        """
+        # Fresh context: the entry's queries are not charged to the request
+        task = contextvars.Context().run(
+            asyncio.get_running_loop().create_task,
+            sync_to_async(self.process, thread_sensitive=False)(entry.id)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+    
+    def process(self, entry_id):
+        """Process one entry outside a request; returns True if it was completed."""
+        try:
+            return self._process_entry(entry_id)
+        finally:
+            close_old_connections()
+    
+    def enqueue(self, interaction, result):
+        """
+        Record pending side effects for an interaction, if any.
+        Must run inside the transaction that created the interaction.
+        """
+        create_alert = result['risk_level'] in ['CRITICAL', 'HIGH']
+        log_symptom = 'dolor' in normalize(interaction.message_text).folded
+        
+        if not (create_alert or log_symptom):
+            return None
+        
+        return ChatOutboxEntry.objects.create(
+            interaction=interaction,
+            risk_level=result['risk_level'],
+            suggested_action=result['suggested_action'] or '',
+            create_alert=create_alert,
+            log_symptom=log_symptom
+        )
+    
+    def process_pending(self, limit=100):
+        """Process up to `limit` pending entries. Returns how many were completed."""
+        pending_ids = list(
+            ChatOutboxEntry.objects.filter(status='PENDING')
+            .order_by('created_at')
+            .values_list('id', flat=True)[:limit]
+        )
+        
+        processed = 0
+        for entry_id in pending_ids:
+            if self._process_entry(entry_id):
+                processed += 1
+        
+        return processed
+    
+    def _process_entry(self, entry_id):
+        try:
+            with transaction.atomic():
+                # skip_locked lets several workers drain the queue concurrently
+                entry = (
+                    ChatOutboxEntry.objects.select_for_update(skip_locked=True)
+                    .select_related('interaction__user')
+                    .filter(id=entry_id, status='PENDING')
+                    .first()
+                )
+                if entry is None:
+                    return False
+                
+                self._apply(entry)
+                
+                entry.status = 'DONE'
+                entry.attempts += 1
+                entry.processed_at = timezone.now()
+                entry.save(update_fields=['status', 'attempts', 'processed_at'])
+            return True
+        
+        except Exception as e:
+            logger.error("Error processing chat outbox entry %s: %s", entry_id, e)
+            ChatOutboxEntry.objects.filter(id=entry_id).update(
+                attempts=F('attempts') + 1,
+                last_error=str(e)
+            )
+            ChatOutboxEntry.objects.filter(
+                id=entry_id, attempts__gte=self.MAX_ATTEMPTS
+            ).update(status='FAILED')
+            return False
+    
+    def _apply(self, entry):
+        """Run the side effects recorded in an entry."""
+        interaction = entry.interaction
+        patient = interaction.user
+        
+        if entry.create_alert:
+            from clinical.services import alert_service
+            alert_service.create_chat_alert(
+                patient=patient,
+                interaction=interaction,
+                risk_level=entry.risk_level,
+                suggested_action=entry.suggested_action or None
+            )
+        
+        if entry.log_symptom:
+            from clinical.services import symptom_service
+            symptom_service.create_symptom_from_chat(
+                patient=patient,
+                message=interaction.message_text,
+                interaction=interaction
+            )
+
+
 chat_service = ChatService()
+lexicon_store = LexiconStore(ChatService.RISK_KEYWORDS, ChatService.INTENT_KEYWORDS)
+chat_outbox_service = ChatOutboxService()
@@ -0,0 +1,428 @@
+"""
+Tests for the chatbot module: keyword matching, the process_messages batch
+API, the versioned lexicon store, keyset pagination of the chat history, the async
+send view with its outbox dispatch and the rescore_chats command.
+"""
+import asyncio
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from clinical.models import Alert
+from users.models import CustomUser, Profile
+
+from .lexicon import DEFAULT_VERSION, LexiconStore
+from .matcher import KeywordMatcher, expand_pattern
+from .models import ChatInteraction, ChatOutboxEntry, LexiconVersion
+from .pagination import decode_cursor, encode_cursor, keyset_page
+from .normalization import fold
+from .services import ChatService, chat_outbox_service, chat_service, lexicon_store
+
+# Every key process_message returns except the randomly chosen response text
+SCORED_KEYS = ('sentiment', 'risk_level', 'risk_keywords', 'suggested_action', 'lexicon_version')
+
+ACCENTED = str.maketrans('aeiou', 'áéíóú')
+
+
+class KeywordMatcherTests(TestCase):
+
+    matcher = KeywordMatcher(ChatService.RISK_KEYWORDS, ChatService.INTENT_KEYWORDS)
+
+    def analyze(self, text):
+        return self.matcher.analyze(fold(text))
+
+    def test_every_critical_and_high_phrase_in_every_spelling(self):
+        for level in ('CRITICAL', 'HIGH'):
+            for pattern in ChatService.RISK_KEYWORDS[level]:
+                # [áa] and [oa] expand to every literal they stand for
+                for literal in expand_pattern(pattern):
+                    for text in (literal, literal.upper(), literal.capitalize(), literal.translate(ACCENTED)):
+                        with self.subTest(level=level, text=text):
+                            risk_level, keywords, _ = self.analyze(f'Hoy siento que {text}, de verdad.')
+                            self.assertEqual((risk_level, keywords), (level, [pattern]))
+
+    def test_character_classes_expand_to_each_variant(self):
+        self.assertEqual(expand_pattern('no aguanto m[áa]s'), ['no aguanto más', 'no aguanto mas'])
+        self.assertEqual(expand_pattern('desesperad[oa]'), ['desesperado', 'desesperada'])
+        for text in ('Desesperado', 'DESESPERADA', 'no aguanto más', 'NO AGUANTO MAS'):
+            with self.subTest(text=text):
+                self.assertEqual(self.analyze(text)[0], 'HIGH')
+
+    def test_unsupported_patterns_are_rejected(self):
+        for pattern in ('morir.*', 'a|b', r'\bfin'):
+            with self.subTest(pattern=pattern), self.assertRaises(ValueError):
+                expand_pattern(pattern)
+
+    def test_critical_wins_over_high_in_one_message(self):
+        for text in ('No aguanto más, quiero morir', 'Quiero morir, no aguanto más',
+                     'Ayuda por favor, estoy desesperada y quiero matarme'):
+            with self.subTest(text=text):
+                risk_level, keywords, _ = self.analyze(text)
+                self.assertEqual(risk_level, 'CRITICAL')
+                self.assertEqual(len(keywords), 1)
+
+    def test_first_keyword_in_lexicon_order_is_reported(self):
+        # 'suicidar' precedes 'cortarme' in the lexicon, whatever the text order
+        self.assertEqual(self.analyze('Pienso en cortarme o suicidarme')[:2], ('CRITICAL', ['suicidar']))
+
+    def test_overlapping_keywords_are_all_found(self):
+        cases = [
+            # 'muy triste' (MEDIUM) contains 'triste' (LOW) and the EMOTION_SAD intent
+            ('Estoy muy triste', ('MEDIUM', ['muy triste', 'triste'], 'EMOTION_SAD')),
+            # 'dolor insoportable' (HIGH) also triggers the PAIN intent through 'dolor'
+            ('Tengo un dolor insoportable', ('HIGH', ['dolor insoportable'], 'PAIN')),
+            ('Dolor intenso y dolor fuerte', ('MEDIUM', ['dolor intenso', 'dolor fuerte'], 'PAIN')),
+            ('Triste y cansada', ('LOW', ['triste', 'cansada'], 'EMOTION_SAD')),
+            ('Hola, gracias', ('NONE', [], 'GREETING')),
+        ]
+        for text, expected in cases:
+            with self.subTest(text=text):
+                self.assertEqual(self.analyze(text), expected)
+
+    def test_scan_reports_every_overlapping_match(self):
+        risk_hits, intent_hits = self.matcher.scan(fold('Muy triste, desesperada, no puedo más'))
+        self.assertEqual(risk_hits, {'muy triste', 'triste', r'desesperad[oa]', r'no puedo m[áa]s'})
+        self.assertEqual(intent_hits, {'EMOTION_SAD'})
+
+    def test_empty_lexicon_matches_nothing(self):
+        self.assertEqual(KeywordMatcher({}, {}).analyze('quiero morir'), ('NONE', [], 'UNKNOWN'))
+
+
+class ProcessMessagesTests(TestCase):
+
+    MESSAGES = [
+        'hola', 'quiero morir', 'No aguanto más', 'me duele la cabeza',
+        'Estoy muy triste', 'gracias', 'QUIERO MORIR', '',
+    ]
+
+    def scored(self, result):
+        return {key: result[key] for key in SCORED_KEYS}
+
+    def test_batch_matches_one_by_one_processing(self):
+        batch = chat_service.process_messages(self.MESSAGES)
+
+        self.assertEqual(len(batch), len(self.MESSAGES))
+        for message, result in zip(self.MESSAGES, batch):
+            with self.subTest(message=message):
+                self.assertEqual(self.scored(result), self.scored(chat_service.process_message(message)))
+
+    def test_empty_batch(self):
+        self.assertEqual(chat_service.process_messages([]), [])
+
+    def test_users_are_aligned_with_messages(self):
+        ana = CustomUser.objects.create_user('ana', password='x', role='PATIENT', first_name='Ana')
+        eva = CustomUser.objects.create_user('eva', password='x', role='PATIENT')
+
+        results = chat_service.process_messages(['hola', 'hola', 'hola'], users=[ana, eva, None])
+
+        self.assertIn('Ana', results[0]['response'])
+        self.assertIn('eva', results[1]['response'])
+        self.assertIn('amiga', results[2]['response'])
+
+    def test_single_user_applies_to_the_whole_batch(self):
+        ana = CustomUser.objects.create_user('ana', password='x', role='PATIENT', first_name='Ana')
+
+        results = chat_service.process_messages(['hola', 'buenas tardes'], users=ana)
+
+        self.assertTrue(all('Ana' in result['response'] for result in results))
+
+    def test_mismatched_users_are_rejected(self):
+        with self.assertRaises(ValueError):
+            chat_service.process_messages(['hola', 'gracias'], users=[None])
+
+    def test_pinned_lexicon_is_used_for_the_whole_batch(self):
+        risk_keywords = {**ChatService.RISK_KEYWORDS, 'CRITICAL': ['palabra de prueba']}
+        entry = lexicon_store.publish(risk_keywords, ChatService.INTENT_KEYWORDS, activate=False)
+        pinned = lexicon_store.get(entry.version)
+
+        default, = chat_service.process_messages(['palabra de prueba'])
+        results = chat_service.process_messages(['palabra de prueba', 'quiero morir'], lexicon=pinned)
+
+        self.assertEqual(default['risk_level'], 'NONE')
+        self.assertEqual([r['risk_level'] for r in results], ['CRITICAL', 'NONE'])
+        self.assertEqual({r['lexicon_version'] for r in results}, {entry.version})
+
+
+class LexiconStoreTests(TestCase):
+
+    def setUp(self):
+        # A store of its own, so the process-wide one is left untouched
+        self.store = LexiconStore(ChatService.RISK_KEYWORDS, ChatService.INTENT_KEYWORDS)
+        self.risk_keywords = {**ChatService.RISK_KEYWORDS, 'CRITICAL': ['palabra de prueba']}
+
+    def test_publish_switches_this_process_on_commit(self):
+        before = self.store.current().version
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            entry = self.store.publish(self.risk_keywords, ChatService.INTENT_KEYWORDS)
+        # Not before the transaction commits
+        self.assertEqual(self.store.current().version, before)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.store.current().version, entry.version)
+        self.assertEqual(self.store.current().matcher.analyze('palabra de prueba')[0], 'CRITICAL')
+
+    def test_activate_rolls_back_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.store.publish(self.risk_keywords, ChatService.INTENT_KEYWORDS)
+            second = self.store.publish(ChatService.RISK_KEYWORDS, ChatService.INTENT_KEYWORDS)
+        self.assertEqual(self.store.current().version, second.version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.store.activate(first.version)
+
+        self.assertEqual(self.store.current().version, first.version)
+        self.assertEqual(list(LexiconVersion.objects.filter(is_active=True)), [LexiconVersion.objects.get(version=first.version)])
+
+    def test_activating_an_unknown_version_changes_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            entry = self.store.publish(self.risk_keywords, ChatService.INTENT_KEYWORDS)
+
+        with self.assertRaises(LexiconVersion.DoesNotExist):
+            self.store.activate(entry.version + 1)
+
+        self.assertTrue(LexiconVersion.objects.get(version=entry.version).is_active)
+
+    def test_only_one_version_can_be_active(self):
+        self.store.publish(self.risk_keywords, ChatService.INTENT_KEYWORDS)
+        other = self.store.publish(ChatService.RISK_KEYWORDS, ChatService.INTENT_KEYWORDS, activate=False)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            LexiconVersion.objects.filter(version=other.version).update(is_active=True)
+
+    def test_get_pins_a_version(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.store.publish(self.risk_keywords, ChatService.INTENT_KEYWORDS)
+            self.store.publish(ChatService.RISK_KEYWORDS, ChatService.INTENT_KEYWORDS)
+
+        pinned = self.store.get(first.version)
+
+        self.assertEqual(pinned.version, first.version)
+        self.assertEqual(pinned.matcher.analyze('palabra de prueba')[0], 'CRITICAL')
+        self.assertNotEqual(self.store.current().version, first.version)
+        # Compiled once
+        with self.assertNumQueries(0):
+            self.assertIs(self.store.get(first.version), pinned)
+
+    def test_database_error_before_the_first_load_waits_for_the_interval(self):
+        with mock.patch.object(self.store, '_active_version', side_effect=DatabaseError('down')) as lookup:
+            self.assertEqual(self.store.current().version, DEFAULT_VERSION)
+            self.assertEqual(self.store.current().version, DEFAULT_VERSION)
+
+        self.assertEqual(lookup.call_count, 1)
+
+
+def make_history(patient, count, same_timestamp=None):
+    """
+    Store `count` chats one minute apart, newest last. Chats whose index is
+    in `same_timestamp` share the timestamp of the first of them.
+    Returns them newest first, the order the history shows.
+    """
+    start = timezone.now() - timedelta(days=1)
+    chats = []
+    for i in range(count):
+        chat = ChatInteraction.objects.create(user=patient, message_text=f'mensaje {i}', bot_response='ok')
+        chats.append(chat)
+    for i, chat in enumerate(chats):
+        index = min(same_timestamp) if same_timestamp and i in same_timestamp else i
+        chat.timestamp = start + timedelta(minutes=index)
+        ChatInteraction.objects.filter(pk=chat.pk).update(timestamp=chat.timestamp)
+    return sorted(chats, key=lambda chat: (chat.timestamp, chat.pk), reverse=True)
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        self.patient = CustomUser.objects.create_user('paciente', password='x', role='PATIENT')
+        self.queryset = ChatInteraction.objects.filter(user=self.patient)
+
+    def walk(self, page_size):
+        pages, cursor = [], None
+        while True:
+            items, cursor = keyset_page(self.queryset, cursor, page_size)
+            pages.append([chat.pk for chat in items])
+            if cursor is None:
+                return pages
+
+    def test_cursor_round_trip(self):
+        chat, = make_history(self.patient, 1)
+        self.assertEqual(decode_cursor(encode_cursor(chat)), (chat.timestamp, chat.pk))
+
+    def test_pages_cover_the_history_once_in_order(self):
+        chats = make_history(self.patient, 7)
+        pages = self.walk(3)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), [chat.pk for chat in chats])
+
+    def test_equal_timestamps_split_across_a_page_boundary(self):
+        # Chats 1-3 share a timestamp; with pages of 3 the run straddles pages 1 and 2
+        chats = make_history(self.patient, 5, same_timestamp={1, 2, 3})
+        pages = self.walk(3)
+        self.assertEqual(sum(pages, []), [chat.pk for chat in chats])
+        self.assertEqual(len(set(sum(pages, []))), 5)
+
+    def test_malformed_cursor_is_rejected(self):
+        for cursor in ('no-es-un-cursor', encode_cursor(ChatInteraction(pk=1, timestamp=timezone.now()))[:-4], '!!'):
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                keyset_page(self.queryset, cursor)
+
+
+class ChatHistoryViewTests(TestCase):
+
+    def setUp(self):
+        self.patient = CustomUser.objects.create_user('paciente', password='x', role='PATIENT')
+        self.client.force_login(self.patient)
+
+    def xhr(self, **params):
+        return self.client.get(reverse('chatbot:history'), params, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    @mock.patch('chatbot.views.CHAT_HISTORY_PAGE_SIZE', 2)
+    def test_xhr_pages_follow_next_cursor(self):
+        chats = make_history(self.patient, 3)
+
+        first = self.xhr().json()
+        second = self.xhr(cursor=first['next_cursor']).json()
+
+        self.assertTrue(first['success'])
+        self.assertEqual([c['id'] for c in first['chats']], [chats[0].pk, chats[1].pk])
+        self.assertEqual(first['chats'][0]['message'], chats[0].message_text)
+        self.assertEqual([c['id'] for c in second['chats']], [chats[2].pk])
+        self.assertIsNone(second['next_cursor'])
+
+    def test_xhr_with_malformed_cursor_returns_400(self):
+        response = self.xhr(cursor='roto')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+
+    @mock.patch('chatbot.views.CHAT_HISTORY_PAGE_SIZE', 2)
+    def test_html_with_malformed_cursor_shows_the_first_page(self):
+        chats = make_history(self.patient, 3)
+
+        response = self.client.get(reverse('chatbot:history'), {'cursor': 'roto'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c.pk for c in response.context['chats']], [chats[0].pk, chats[1].pk])
+        self.assertIsNotNone(response.context['next_cursor'])
+
+
+class AsyncSendMessageTests(TransactionTestCase):
+    """
+    dispatch() hands the entry to another thread, which only sees committed
+    rows, hence TransactionTestCase.
+    """
+
+    def setUp(self):
+        self.doctor = CustomUser.objects.create_user('medico', password='x', role='DOCTOR')
+        self.patient = CustomUser.objects.create_user('paciente', password='x', role='PATIENT')
+        Profile.objects.create(user=self.patient, assigned_doctor=self.doctor)
+        self.url = reverse('chatbot:send_message_async')
+
+    async def test_anonymous_request_is_redirected_to_login(self):
+        response = await self.async_client.post(self.url, {'message': 'quiero morir'})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('login', response['Location'])
+        self.assertFalse(await ChatInteraction.objects.aexists())
+
+    async def test_csrf_token_is_required(self):
+        self.async_client = self.async_client_class(enforce_csrf_checks=True)
+        await sync_to_async(self.async_client.force_login)(self.patient)
+
+        response = await self.async_client.post(self.url, {'message': 'quiero morir'})
+        self.assertEqual(response.status_code, 403)
+
+        token = get_random_string(32)
+        self.async_client.cookies['csrftoken'] = token
+        response = await self.async_client.post(self.url, {'message': 'hola'}, headers={'X-CSRFToken': token})
+        self.assertEqual(response.status_code, 200)
+
+    async def test_interaction_is_saved_and_its_entry_dispatched(self):
+        await sync_to_async(self.async_client.force_login)(self.patient)
+
+        # Held back until the response is out: on SQLite the dispatched thread
+        # and the session save would compete for the same table lock
+        with mock.patch.object(chat_outbox_service, 'dispatch') as dispatch:
+            response = await self.async_client.post(self.url, {'message': 'quiero morir'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['success'])
+        entry = await ChatOutboxEntry.objects.select_related('interaction').aget()
+        self.assertEqual((entry.interaction.user_id, entry.interaction.message_text), (self.patient.pk, 'quiero morir'))
+        self.assertTrue(entry.create_alert)
+        dispatch.assert_called_once_with(entry)
+
+        await chat_outbox_service.dispatch(entry)
+
+        await entry.arefresh_from_db()
+        self.assertEqual(entry.status, 'DONE')
+        alert = await Alert.objects.aget(patient=self.patient)
+        self.assertEqual((alert.alert_type, alert.severity), ('CHAT_RISK', 'CRITICAL'))
+
+    async def test_cancelled_dispatch_leaves_the_entry_for_the_worker(self):
+        result = await chat_service.aprocess_message('quiero morir', user=self.patient)
+        _, entry = await sync_to_async(chat_outbox_service.record_interaction)(self.patient, 'quiero morir', result)
+
+        task = chat_outbox_service.dispatch(entry)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        await entry.arefresh_from_db()
+        self.assertEqual(entry.status, 'PENDING')
+        self.assertEqual(await sync_to_async(chat_outbox_service.process_pending)(), 1)
+        await entry.arefresh_from_db()
+        self.assertEqual(entry.status, 'DONE')
+
+
+class RescoreChatsTests(TestCase):
+
+    def setUp(self):
+        self.patient = CustomUser.objects.create_user('paciente', password='x', role='PATIENT')
+
+    def stale_chat(self, timestamp):
+        """A crisis message stored as NEUTRAL, as an older lexicon would have scored it."""
+        chat = ChatInteraction.objects.create(
+            user=self.patient, message_text='quiero morir', bot_response='ok',
+            sentiment_flag='NEUTRAL', risk_keywords_detected=[],
+        )
+        ChatInteraction.objects.filter(pk=chat.pk).update(timestamp=timestamp)
+        return chat
+
+    def rescore(self, *args):
+        call_command('rescore_chats', *args, stdout=StringIO())
+
+    def test_since_starts_at_local_midnight(self):
+        day = date(2026, 3, 10)
+        midnight = timezone.make_aware(datetime.combine(day, time.min))
+        before = self.stale_chat(midnight - timedelta(minutes=1))
+        after = self.stale_chat(midnight)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.rescore('--since', day.isoformat())
+
+        # A range on the raw column, which the timestamp index can serve
+        scan = next(q['sql'] for q in queries if q['sql'].startswith('SELECT') and 'message_text' in q['sql'])
+        self.assertIn('"chatbot_chatinteraction"."timestamp" >= ', scan)
+        before.refresh_from_db()
+        after.refresh_from_db()
+        self.assertEqual(before.sentiment_flag, 'NEUTRAL')
+        self.assertNotEqual(after.sentiment_flag, 'NEUTRAL')
+        self.assertIn('quiero morir', after.risk_keywords_detected)
+
+    def test_dry_run_writes_nothing(self):
+        chat = self.stale_chat(timezone.now())
+
+        self.rescore('--dry-run')
+
+        chat.refresh_from_db()
+        self.assertEqual(chat.sentiment_flag, 'NEUTRAL')
@@ -9,6 +9,7 @@ app_name = 'chatbot'
 urlpatterns = [
     path('', views.chat_interface, name='interface'),
     path('send/', views.send_message, name='send_message'),
+    path('send/async/', views.send_message_async, name='send_message_async'),
     path('history/', views.chat_history, name='history'),
     path('voice/upload/', views.upload_voice_memo, name='upload_voice'),
 ]
@@ -2,20 +2,25 @@
 Views for chatbot interface.
 """
 import logging
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.contrib.auth.views import redirect_to_login
+from django.http import HttpResponseNotAllowed, JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views import View
 
 from .models import ChatInteraction, VoiceMemo
-from .services import chat_service
+from .pagination import keyset_page
+from .services import chat_service, chat_outbox_service
 from users.decorators import patient_only
 
 logger = logging.getLogger('chatbot')
 
+CHAT_HISTORY_PAGE_SIZE = 30
+
 
 @login_required
 @patient_only
@@ -53,38 +58,66 @@ def send_message(request):
         # Process message with chat service
         result = chat_service.process_message(
             message,
-            user_name=request.user.first_name
+            user=request.user
         )
         
-        # Save interaction to database
-        interaction = ChatInteraction.objects.create(
-            user=request.user,
-            message_text=message,
-            bot_response=result['response'],
-            sentiment_flag=result['sentiment'],
-            risk_keywords_detected=result['risk_keywords']
+        # Save interaction and its pending side effects atomically.
+        # Alerts, symptoms and emails are handled by the process_chat_outbox worker.
+        interaction, _ = chat_outbox_service.record_interaction(request.user, message, result)
+        
+        logger.info(
+            "Chat interaction saved - User: %s, Risk: %s", request.user.username, result['risk_level'],
+            extra={'patient_id': request.user.id, 'chat_id': interaction.id, 'risk_level': result['risk_level']}
         )
         
-        # If high risk, create alert
-        if result['risk_level'] in ['CRITICAL', 'HIGH']:
-            from clinical.services import alert_service
-            alert_service.create_chat_alert(
-                patient=request.user,
-                interaction=interaction,
-                risk_level=result['risk_level'],
-                suggested_action=result['suggested_action']
-            )
+        return JsonResponse({
+            'success': True,
+            'response': result['response'],
+            'sentiment': result['sentiment'],
+            'timestamp': interaction.timestamp.isoformat()
+        })
         
-        # Also log symptom if pain mentioned
-        if 'dolor' in message.lower():
-            from clinical.services import symptom_service
-            symptom_service.create_symptom_from_chat(
-                patient=request.user,
-                message=message,
-                interaction=interaction
-            )
+    except Exception as e:
+        logger.error("Error processing chat message: %s", e)
+        return JsonResponse({
+            'success': False,
+            'error': 'Error procesando el mensaje. Por favor intenta de nuevo.'
+        }, status=500)
+
+
+async def send_message_async(request):
+    """
+    send_message for ASGI deployments (same request and response).
+    
+    NLP runs on the event loop and the interaction is written without
+    holding a thread for the whole request; alerts and symptoms are
+    processed in the background right after the commit, with the
+    process_chat_outbox worker as fallback.
+    """
+    # login_required and require_http_methods only wrap sync views in Django 4.2
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    
+    # request.user is loaded from the session lazily, which queries the DB
+    if not await sync_to_async(lambda: request.user.is_authenticated)():
+        return redirect_to_login(request.get_full_path())
+    
+    message = request.POST.get('message', '').strip()
+    
+    if not message:
+        return JsonResponse({
+            'success': False,
+            'error': 'Mensaje vacío'
+        }, status=400)
+    
+    try:
+        result = await chat_service.aprocess_message(message, user=request.user)
+        interaction = await chat_outbox_service.arecord_interaction(request.user, message, result)
         
-        logger.info(f"Chat interaction saved - User: {request.user.username}, Risk: {result['risk_level']}")
+        logger.info(
+            "Chat interaction saved - User: %s, Risk: %s", request.user.username, result['risk_level'],
+            extra={'patient_id': request.user.id, 'chat_id': interaction.id, 'risk_level': result['risk_level']}
+        )
         
         return JsonResponse({
             'success': True,
@@ -94,7 +127,7 @@ def send_message(request):
         })
         
     except Exception as e:
-        logger.error(f"Error processing chat message: {str(e)}")
+        logger.error("Error processing chat message: %s", e)
         return JsonResponse({
             'success': False,
             'error': 'Error procesando el mensaje. Por favor intenta de nuevo.'
@@ -103,13 +136,40 @@ def send_message(request):
 
 @login_required
 def chat_history(request):
-    """View full chat history."""
-    chats = ChatInteraction.objects.filter(
-        user=request.user
-    ).order_by('-timestamp')
+    """
+    View full chat history, newest first, one keyset page at a time.
+    XHR requests (infinite scroll) get the next page as JSON.
+    """
+    queryset = ChatInteraction.objects.filter(user=request.user)
+    is_xhr = request.headers.get('x-requested-with') == 'XMLHttpRequest'
+    
+    try:
+        chats, next_cursor = keyset_page(
+            queryset, request.GET.get('cursor'), CHAT_HISTORY_PAGE_SIZE
+        )
+    except ValueError:
+        if is_xhr:
+            return JsonResponse({'success': False, 'error': 'Cursor inválido.'}, status=400)
+        chats, next_cursor = keyset_page(queryset, None, CHAT_HISTORY_PAGE_SIZE)
+    
+    if is_xhr:
+        return JsonResponse({
+            'success': True,
+            'chats': [
+                {
+                    'id': chat.id,
+                    'message': chat.message_text,
+                    'response': chat.bot_response,
+                    'timestamp': chat.timestamp.isoformat(),
+                }
+                for chat in chats
+            ],
+            'next_cursor': next_cursor,
+        })
     
     context = {
-        'chats': chats
+        'chats': chats,
+        'next_cursor': next_cursor,
     }
     
     return render(request, 'chatbot/chat_history.html', context)
@@ -136,7 +196,7 @@ def upload_voice_memo(request):
             audio_file=audio_file
         )
         
-        logger.info(f"Voice memo uploaded - User: {request.user.username}")
+        logger.info("Voice memo uploaded - User: %s", request.user.username)
         
         return JsonResponse({
             'success': True,
@@ -145,7 +205,7 @@ def upload_voice_memo(request):
         })
         
     except Exception as e:
-        logger.error(f"Error uploading voice memo: {str(e)}")
+        logger.error("Error uploading voice memo: %s", e)
         return JsonResponse({
             'success': False,
             'error': 'Error guardando el audio'
@@ -2,8 +2,9 @@
 Admin configuration for clinical app.
 """
 from django.contrib import admin
+from django.db.models import Q
 from simple_history.admin import SimpleHistoryAdmin
-from .models import SymptomReport, Alert, ClinicalTimeline
+from .models import SymptomReport, SymptomRollup, Alert, AlertEmail, PatientAlertCounter, ClinicalTimeline
 
 
 @admin.register(SymptomReport)
@@ -15,19 +16,79 @@ class SymptomReportAdmin(SimpleHistoryAdmin):
     search_fields = ('patient__username', 'description')
     readonly_fields = ('timestamp',)
     
+    def get_search_results(self, request, queryset, search_term):
+        """Username match, or description match through the full-text index."""
+        if not search_term:
+            return queryset, False
+        from search.services import search_service
+        matches = search_service.search_symptoms(SymptomReport.objects.all(), search_term)
+        return queryset.filter(
+            Q(patient__username__icontains=search_term) | Q(pk__in=matches.values('pk'))
+        ), False
+    
     def is_severe(self, obj):
         return obj.is_severe
     is_severe.boolean = True
 
 
+@admin.register(SymptomRollup)
+class SymptomRollupAdmin(admin.ModelAdmin):
+    """Admin for hourly/daily symptom rollups (derived data)."""
+    
+    list_display = ('patient', 'symptom_type', 'granularity', 'bucket_start', 'report_count', 'max_intensity')
+    list_filter = ('granularity', 'symptom_type', 'bucket_start')
+    search_fields = ('patient__username',)
+
+
 @admin.register(Alert)
 class AlertAdmin(admin.ModelAdmin):
-    """Admin for alerts."""
+    """
+    Admin for alerts.
+    Severity and resolution only change through AlertService, which keeps
+    PatientAlertCounter in sync: use the resolve action instead of editing.
+    Deletes are folded into the counters by clinical.signals.
+    """
     
-    list_display = ('patient', 'alert_type', 'severity', 'created_at', 'is_resolved', 'email_sent')
+    list_display = ('patient', 'alert_type', 'severity', 'occurrence_count', 'created_at', 'last_seen_at', 'is_resolved', 'email_sent')
     list_filter = ('alert_type', 'severity', 'is_resolved', 'created_at')
     search_fields = ('patient__username', 'message')
-    readonly_fields = ('created_at',)
+    readonly_fields = (
+        'patient', 'alert_type', 'severity', 'occurrence_count', 'created_at', 'last_seen_at',
+        'is_resolved', 'resolved_at', 'resolved_by', 'email_sent'
+    )
+    actions = ['resolve_alerts']
+    
+    def has_add_permission(self, request):
+        # Alerts are raised by the chat and symptom pipelines
+        return False
+    
+    @admin.action(description='Resolver las alertas seleccionadas')
+    def resolve_alerts(self, request, queryset):
+        from .services import alert_service
+        resolved = 0
+        for alert in queryset.filter(is_resolved=False):
+            alert_service.resolve_alert(alert, request.user, 'Resuelta desde el panel de administración')
+            resolved += 1
+        self.message_user(request, f'{resolved} alertas resueltas.')
+
+
+@admin.register(PatientAlertCounter)
+class PatientAlertCounterAdmin(admin.ModelAdmin):
+    """Admin for materialized alert counters (read-only)."""
+    
+    list_display = ('patient', 'active_count', 'critical_count', 'high_count', 'updated_at')
+    search_fields = ('patient__username',)
+    readonly_fields = ('patient', 'active_count', 'critical_count', 'high_count', 'updated_at')
+
+
+@admin.register(AlertEmail)
+class AlertEmailAdmin(admin.ModelAdmin):
+    """Admin for the alert email outbox."""
+    
+    list_display = ('alert', 'recipient', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('recipient',)
+    readonly_fields = ('created_at', 'sent_at')
 
 
 @admin.register(ClinicalTimeline)
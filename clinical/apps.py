@@ -5,3 +5,6 @@ class ClinicalConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'clinical'
     verbose_name = 'Módulo Clínico'
+
+    def ready(self):
+        from . import signals  # noqa: F401
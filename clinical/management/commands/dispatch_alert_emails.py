@@ -0,0 +1,47 @@
+"""
+Deliver queued alert emails.
+
+Usage:
+    python manage.py dispatch_alert_emails            # drain once and exit
+    python manage.py dispatch_alert_emails --loop     # keep polling
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from clinical.services import alert_email_dispatcher
+
+
+class Command(BaseCommand):
+    help = 'Send pending alert emails in batches, grouped by doctor.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Emails claimed per pass (default: 100).')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling instead of exiting when nothing is due.')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep between polls when idle (default: 5.0).')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        total_sent = total_failed = 0
+        try:
+            while True:
+                sent, failed = alert_email_dispatcher.dispatch_pending(batch_size=batch_size)
+                total_sent += sent
+                total_failed += failed
+                if sent:
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total_sent} alert emails sent, {total_failed} failed attempts.'
+        ))
@@ -0,0 +1,17 @@
+"""
+Recompute the materialized per-patient alert counters.
+
+Usage:
+    python manage.py rebuild_alert_counters
+"""
+from django.core.management.base import BaseCommand
+
+from clinical.services import alert_service
+
+
+class Command(BaseCommand):
+    help = 'Rebuild PatientAlertCounter rows from unresolved alerts.'
+
+    def handle(self, *args, **options):
+        patients = alert_service.rebuild_counters()
+        self.stdout.write(self.style.SUCCESS(f'Alert counters rebuilt for {patients} patients.'))
@@ -0,0 +1,22 @@
+"""
+Recompute hourly and daily symptom rollups from SymptomReport.
+
+Usage:
+    python manage.py rebuild_symptom_rollups
+    python manage.py rebuild_symptom_rollups --patient 42 --patient 43
+"""
+from django.core.management.base import BaseCommand
+
+from clinical.services import symptom_rollup_service
+
+
+class Command(BaseCommand):
+    help = 'Rebuild SymptomRollup rows from raw SymptomReport data.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patient', type=int, action='append', dest='patients',
+                            help='Only rebuild this patient id (repeatable).')
+
+    def handle(self, *args, **options):
+        rows = symptom_rollup_service.rebuild(patient_ids=options['patients'])
+        self.stdout.write(self.style.SUCCESS(f'{rows} symptom rollups rebuilt.'))
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:11
+
+from django.db import migrations, models
+
+
+SEVERITY_RANK = {'LOW': 1, 'MEDIUM': 2, 'HIGH': 3, 'CRITICAL': 4}
+
+
+def populate_severity_rank(apps, schema_editor):
+    Alert = apps.get_model('clinical', 'Alert')
+    for severity, rank in SEVERITY_RANK.items():
+        Alert.objects.filter(severity=severity).update(severity_rank=rank)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinical', '0003_alert_last_seen_at_alert_occurrence_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alert',
+            name='severity_rank',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Rango de severidad'),
+        ),
+        migrations.RunPython(populate_severity_rank, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['patient', 'is_resolved', '-severity_rank', '-created_at'], name='clinical_alert_triage_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Q
+
+
+def populate_counters(apps, schema_editor):
+    Alert = apps.get_model('clinical', 'Alert')
+    PatientAlertCounter = apps.get_model('clinical', 'PatientAlertCounter')
+    rows = (
+        Alert.objects.filter(is_resolved=False)
+        .order_by()
+        .values('patient_id')
+        .annotate(
+            active=Count('id'),
+            critical=Count('id', filter=Q(severity='CRITICAL')),
+            high=Count('id', filter=Q(severity='HIGH'))
+        )
+    )
+    PatientAlertCounter.objects.bulk_create([
+        PatientAlertCounter(
+            patient_id=row['patient_id'],
+            active_count=row['active'],
+            critical_count=row['critical'],
+            high_count=row['high']
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+        ('clinical', '0004_alert_severity_rank'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientAlertCounter',
+            fields=[
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='alert_counter', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Paciente')),
+                ('active_count', models.IntegerField(default=0, verbose_name='Alertas activas')),
+                ('critical_count', models.IntegerField(default=0, verbose_name='Alertas críticas activas')),
+                ('high_count', models.IntegerField(default=0, verbose_name='Alertas altas activas')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Última actualización')),
+            ],
+            options={
+                'verbose_name': 'Contador de Alertas',
+                'verbose_name_plural': 'Contadores de Alertas',
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+
+def populate_rollups(apps, schema_editor):
+    SymptomReport = apps.get_model('clinical', 'SymptomReport')
+    SymptomRollup = apps.get_model('clinical', 'SymptomRollup')
+    histogram = {
+        f'intensity_{level}': Count('id', filter=Q(intensity=level))
+        for level in range(2, 10)
+    }
+    histogram['intensity_1'] = Count('id', filter=Q(intensity__lte=1))
+    histogram['intensity_10'] = Count('id', filter=Q(intensity__gte=10))
+    tz = timezone.get_current_timezone()
+    for granularity, trunc in (('HOUR', TruncHour), ('DAY', TruncDay)):
+        rows = (
+            SymptomReport.objects.order_by()
+            .annotate(bucket_start=trunc('timestamp', tzinfo=tz))
+            .values('patient_id', 'symptom_type', 'bucket_start')
+            .annotate(
+                report_count=Count('id'),
+                sum_intensity=Sum('intensity'),
+                max_intensity=Max('intensity'),
+                **histogram
+            )
+        )
+        SymptomRollup.objects.bulk_create(
+            [SymptomRollup(granularity=granularity, **row) for row in rows.iterator(chunk_size=2000)],
+            batch_size=1000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('clinical', '0005_patientalertcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SymptomRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symptom_type', models.CharField(choices=[('PAIN', 'Dolor'), ('FATIGUE', 'Fatiga'), ('NAUSEA', 'Náusea'), ('VOMITING', 'Vómito'), ('FEVER', 'Fiebre'), ('INSOMNIA', 'Insomnio'), ('APPETITE_LOSS', 'Pérdida de apetito'), ('OTHER', 'Otro')], max_length=20, verbose_name='Tipo de síntoma')),
+                ('granularity', models.CharField(choices=[('HOUR', 'Hora'), ('DAY', 'Día')], max_length=4, verbose_name='Granularidad')),
+                ('bucket_start', models.DateTimeField(verbose_name='Inicio del periodo')),
+                ('report_count', models.IntegerField(default=0, verbose_name='Reportes')),
+                ('sum_intensity', models.IntegerField(default=0, verbose_name='Suma de intensidad')),
+                ('max_intensity', models.IntegerField(default=0, verbose_name='Intensidad máxima')),
+                ('intensity_1', models.IntegerField(default=0)),
+                ('intensity_2', models.IntegerField(default=0)),
+                ('intensity_3', models.IntegerField(default=0)),
+                ('intensity_4', models.IntegerField(default=0)),
+                ('intensity_5', models.IntegerField(default=0)),
+                ('intensity_6', models.IntegerField(default=0)),
+                ('intensity_7', models.IntegerField(default=0)),
+                ('intensity_8', models.IntegerField(default=0)),
+                ('intensity_9', models.IntegerField(default=0)),
+                ('intensity_10', models.IntegerField(default=0)),
+                ('patient', models.ForeignKey(limit_choices_to={'role': 'PATIENT'}, on_delete=django.db.models.deletion.CASCADE, related_name='symptom_rollups', to=settings.AUTH_USER_MODEL, verbose_name='Paciente')),
+            ],
+            options={
+                'verbose_name': 'Resumen de Síntomas',
+                'verbose_name_plural': 'Resúmenes de Síntomas',
+                'ordering': ['-bucket_start'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='symptomrollup',
+            constraint=models.UniqueConstraint(fields=('patient', 'granularity', 'bucket_start', 'symptom_type'), name='unique_symptom_rollup_bucket'),
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
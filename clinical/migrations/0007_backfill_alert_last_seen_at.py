@@ -0,0 +1,20 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def backfill_last_seen_at(apps, schema_editor):
+    # Alerts created before coalescing have no last_seen_at and would never
+    # fall inside the coalescing window; their last occurrence is their creation
+    Alert = apps.get_model('clinical', 'Alert')
+    Alert.objects.filter(last_seen_at__isnull=True).update(last_seen_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinical', '0006_symptomrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_last_seen_at, migrations.RunPython.noop),
+    ]
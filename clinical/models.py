@@ -4,8 +4,15 @@ Tracks symptoms, alerts, and clinical timeline.
 """
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 # # from simple_history.models import HistoricalRecords  # Temporarily disabled  # Temporarily disabled
 
+from psychosocial.models import ConsentQuerySet
+
+
+class SymptomReportQuerySet(ConsentQuerySet):
+    default_data_type = 'clinical'
+
 
 class SymptomReport(models.Model):
     """
@@ -106,6 +113,8 @@ class SymptomReport(models.Model):
     # Audit trail
     # history = HistoricalRecords()
     
+    objects = SymptomReportQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Reporte de Síntoma'
         verbose_name_plural = 'Reportes de Síntomas'
@@ -124,6 +133,106 @@ class SymptomReport(models.Model):
         return self.intensity >= 8
 
 
+class SymptomRollup(models.Model):
+    """
+    Hourly and daily aggregates of SymptomReport per patient and symptom type.
+    Maintained on every SymptomReport write (see clinical.signals);
+    rebuild with `python manage.py rebuild_symptom_rollups`.
+    """
+    GRANULARITY_CHOICES = [
+        ('HOUR', 'Hora'),
+        ('DAY', 'Día'),
+    ]
+    
+    INTENSITY_LEVELS = range(1, 11)
+    
+    patient = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='symptom_rollups',
+        limit_choices_to={'role': 'PATIENT'},
+        verbose_name='Paciente'
+    )
+    
+    symptom_type = models.CharField(
+        max_length=20,
+        choices=SymptomReport.SYMPTOM_TYPE_CHOICES,
+        verbose_name='Tipo de síntoma'
+    )
+    
+    granularity = models.CharField(
+        max_length=4,
+        choices=GRANULARITY_CHOICES,
+        verbose_name='Granularidad'
+    )
+    
+    # Local-time start of the hour or day
+    bucket_start = models.DateTimeField(
+        verbose_name='Inicio del periodo'
+    )
+    
+    report_count = models.IntegerField(default=0, verbose_name='Reportes')
+    sum_intensity = models.IntegerField(default=0, verbose_name='Suma de intensidad')
+    max_intensity = models.IntegerField(default=0, verbose_name='Intensidad máxima')
+    
+    # Histogram: reports per intensity (out-of-range values clamp to 1 or 10)
+    intensity_1 = models.IntegerField(default=0)
+    intensity_2 = models.IntegerField(default=0)
+    intensity_3 = models.IntegerField(default=0)
+    intensity_4 = models.IntegerField(default=0)
+    intensity_5 = models.IntegerField(default=0)
+    intensity_6 = models.IntegerField(default=0)
+    intensity_7 = models.IntegerField(default=0)
+    intensity_8 = models.IntegerField(default=0)
+    intensity_9 = models.IntegerField(default=0)
+    intensity_10 = models.IntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Resumen de Síntomas'
+        verbose_name_plural = 'Resúmenes de Síntomas'
+        ordering = ['-bucket_start']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['patient', 'granularity', 'bucket_start', 'symptom_type'],
+                name='unique_symptom_rollup_bucket'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.patient.username} - {self.get_symptom_type_display()} {self.bucket_start:%Y-%m-%d %H:%M} ({self.report_count})"
+    
+    @property
+    def mean_intensity(self):
+        return self.sum_intensity / self.report_count if self.report_count else None
+    
+    @property
+    def histogram(self):
+        return [getattr(self, f'intensity_{level}') for level in self.INTENSITY_LEVELS]
+
+
+class AlertQuerySet(models.QuerySet):
+    """Keeps Alert.severity_rank in sync on bulk write paths."""
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for alert in objs:
+            alert.severity_rank = Alert.SEVERITY_RANK.get(alert.severity, 0)
+        return super().bulk_create(objs, *args, **kwargs)
+    
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        if 'severity' in fields:
+            for alert in objs:
+                alert.severity_rank = Alert.SEVERITY_RANK.get(alert.severity, 0)
+            fields = list(fields) + ['severity_rank']
+        return super().bulk_update(objs, fields, *args, **kwargs)
+    
+    def update(self, **kwargs):
+        if 'severity' in kwargs and isinstance(kwargs['severity'], str):
+            kwargs['severity_rank'] = Alert.SEVERITY_RANK.get(kwargs['severity'], 0)
+        return super().update(**kwargs)
+
+
 class Alert(models.Model):
     """
     System-generated alerts for medical team.
@@ -144,6 +253,13 @@ class Alert(models.Model):
         ('CRITICAL', 'Crítica'),
     ]
     
+    SEVERITY_RANK = {
+        'LOW': 1,
+        'MEDIUM': 2,
+        'HIGH': 3,
+        'CRITICAL': 4,
+    }
+    
     patient = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -164,6 +280,13 @@ class Alert(models.Model):
         verbose_name='Severidad'
     )
     
+    # Denormalized from severity so queues can sort by urgency (CRITICAL first)
+    severity_rank = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Rango de severidad'
+    )
+    
     message = models.TextField(
         verbose_name='Mensaje'
     )
@@ -226,6 +349,20 @@ class Alert(models.Model):
         verbose_name='Email enviado'
     )
     
+    # Coalescing of repeated alerts (see AlertService.record_alert)
+    occurrence_count = models.PositiveIntegerField(
+        default=1,
+        verbose_name='Ocurrencias'
+    )
+    
+    last_seen_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Última ocurrencia'
+    )
+    
+    objects = AlertQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Alerta'
         verbose_name_plural = 'Alertas'
@@ -233,11 +370,132 @@ class Alert(models.Model):
         indexes = [
             models.Index(fields=['patient', 'is_resolved', '-created_at']),
             models.Index(fields=['severity', 'is_resolved']),
+            # Triage queue: unresolved alerts of a doctor's patients, most severe first
+            models.Index(
+                fields=['patient', 'is_resolved', '-severity_rank', '-created_at'],
+                name='clinical_alert_triage_idx'
+            ),
         ]
     
     def __str__(self):
         status = "✓" if self.is_resolved else "⚠"
         return f"{status} {self.patient.username} - {self.get_alert_type_display()} ({self.get_severity_display()})"
+    
+    def save(self, *args, **kwargs):
+        self.severity_rank = self.SEVERITY_RANK.get(self.severity, 0)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'severity' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'severity_rank'}
+        super().save(*args, **kwargs)
+
+
+class PatientAlertCounter(models.Model):
+    """
+    Materialized counts of unresolved alerts per patient.
+    Maintained incrementally by AlertService; rebuild with
+    `python manage.py rebuild_alert_counters`.
+    """
+    patient = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='alert_counter',
+        verbose_name='Paciente'
+    )
+    
+    active_count = models.IntegerField(
+        default=0,
+        verbose_name='Alertas activas'
+    )
+    
+    critical_count = models.IntegerField(
+        default=0,
+        verbose_name='Alertas críticas activas'
+    )
+    
+    high_count = models.IntegerField(
+        default=0,
+        verbose_name='Alertas altas activas'
+    )
+    
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Última actualización'
+    )
+    
+    class Meta:
+        verbose_name = 'Contador de Alertas'
+        verbose_name_plural = 'Contadores de Alertas'
+    
+    def __str__(self):
+        return f"{self.patient.username}: {self.active_count} activas ({self.critical_count} críticas)"
+
+
+class AlertEmail(models.Model):
+    """
+    Outbox of alert notification emails.
+    Queued by AlertService and delivered in batches by the dispatcher.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Pendiente'),
+        ('SENT', 'Enviado'),
+        ('FAILED', 'Fallido'),
+    ]
+    
+    alert = models.ForeignKey(
+        Alert,
+        on_delete=models.CASCADE,
+        related_name='emails',
+        verbose_name='Alerta'
+    )
+    
+    recipient = models.EmailField(
+        verbose_name='Destinatario'
+    )
+    
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='PENDING',
+        verbose_name='Estado'
+    )
+    
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Intentos'
+    )
+    
+    next_attempt_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Próximo intento'
+    )
+    
+    last_error = models.TextField(
+        blank=True,
+        verbose_name='Último error'
+    )
+    
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Fecha de creación'
+    )
+    
+    sent_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Fecha de envío'
+    )
+    
+    class Meta:
+        verbose_name = 'Email de Alerta'
+        verbose_name_plural = 'Emails de Alerta'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_status_display()} - {self.recipient} (Alerta #{self.alert_id})"
 
 
 class ClinicalTimeline(models.Model):
@@ -3,12 +3,19 @@ Services for clinical module.
 Handles symptom processing and alert creation.
 """
 import logging
-from datetime import datetime
-from django.core.mail import send_mail
+from datetime import date, datetime, time, timedelta
+from time import perf_counter
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, TruncDay, TruncHour
 from django.utils import timezone
 
-from .models import SymptomReport, Alert, ClinicalTimeline
+from metrics import collectors
+from users.models import Profile
+
+from .models import SymptomReport, SymptomRollup, Alert, AlertEmail, PatientAlertCounter, ClinicalTimeline
 
 logger = logging.getLogger('clinical')
 
@@ -21,20 +28,18 @@ class SymptomService:
         Create symptom report from chat message.
         Extracts pain intensity if mentioned.
         """
-        # Simple intensity extraction (can be enhanced with NLP)
-        intensity = 5  # default
+        # Normalized once (and usually cached) by the chat NLP
+        from chatbot.normalization import normalize
+        text = normalize(message)
         
-        # Look for numbers in message
-        import re
-        numbers = re.findall(r'\b([1-9]|10)\b', message)
-        if numbers:
-            intensity = int(numbers[0])
+        # Simple intensity extraction (can be enhanced with NLP)
+        intensity = text.first_number(1, 10) or 5  # default 5
         
         # Determine symptom type
         symptom_type = 'PAIN'  # default
-        if 'cansada' in message.lower() or 'fatigada' in message.lower():
+        if 'cansada' in text.folded or 'fatigada' in text.folded:
             symptom_type = 'FATIGUE'
-        elif 'náusea' in message.lower() or 'nausea' in message.lower():
+        elif 'nausea' in text.folded:
             symptom_type = 'NAUSEA'
         
         symptom = SymptomReport.objects.create(
@@ -46,7 +51,10 @@ class SymptomService:
             related_chat=interaction
         )
         
-        logger.info(f"Symptom created from chat - Patient: {patient.username}, Type: {symptom_type}")
+        logger.info(
+            "Symptom created from chat - Patient: %s, Type: %s", patient.username, symptom_type,
+            extra={'patient_id': patient.id, 'symptom_id': symptom.id, 'chat_id': symptom.related_chat_id}
+        )
         
         # Check if alert needed
         self.check_symptom_alerts(symptom)
@@ -62,11 +70,83 @@ class SymptomService:
 class AlertService:
     """Service for managing alerts."""
     
+    def record_alert(self, patient, alert_type, severity, message, suggested_action='',
+                     related_symptom=None, related_chat=None):
+        """
+        Create an alert, or coalesce it into an open alert of the same
+        patient and type seen within ALERT_COALESCE_WINDOW_MINUTES.
+        
+        Coalescing bumps occurrence_count/last_seen_at and escalates severity
+        if needed; message, action and related objects are replaced only by
+        an occurrence at least as severe as the alert.
+        
+        Returns (alert, is_news): is_news is True when the alert is new or
+        its severity was escalated, i.e. when the doctor should be notified.
+        """
+        now = timezone.now()
+        window = settings.ALERT_COALESCE_WINDOW_MINUTES
+        
+        with transaction.atomic():
+            existing = None
+            if window > 0:
+                existing = (
+                    Alert.objects.select_for_update()
+                    .filter(
+                        patient=patient,
+                        alert_type=alert_type,
+                        is_resolved=False,
+                        last_seen_at__gte=now - timedelta(minutes=window)
+                    )
+                    .order_by('-last_seen_at')
+                    .first()
+                )
+            
+            if existing is None:
+                alert = Alert.objects.create(
+                    patient=patient,
+                    alert_type=alert_type,
+                    severity=severity,
+                    message=message,
+                    suggested_action=suggested_action,
+                    related_symptom=related_symptom,
+                    related_chat=related_chat,
+                    last_seen_at=now
+                )
+                self._adjust_counters(patient.pk, active=1, **self._severity_buckets(severity, 1))
+                transaction.on_commit(collectors.ALERTS_CREATED.labels(alert_type, severity).inc)
+                return alert, True
+            
+            incoming_rank = Alert.SEVERITY_RANK[severity]
+            existing_rank = Alert.SEVERITY_RANK[existing.severity]
+            escalated = incoming_rank > existing_rank
+            if escalated:
+                buckets = self._severity_buckets(existing.severity, -1)
+                for bucket, delta in self._severity_buckets(severity, 1).items():
+                    buckets[bucket] = buckets.get(bucket, 0) + delta
+                self._adjust_counters(patient.pk, **buckets)
+                existing.severity = severity
+            existing.occurrence_count += 1
+            existing.last_seen_at = now
+            update_fields = ['severity', 'occurrence_count', 'last_seen_at']
+            # A milder occurrence must not replace the text and links of a graver one
+            if incoming_rank >= existing_rank:
+                existing.message = message
+                existing.suggested_action = suggested_action
+                existing.related_symptom = related_symptom or existing.related_symptom
+                existing.related_chat = related_chat or existing.related_chat
+                update_fields += ['message', 'suggested_action', 'related_symptom', 'related_chat']
+            transaction.on_commit(collectors.ALERTS_COALESCED.labels(alert_type).inc)
+            existing.save(update_fields=update_fields)
+        
+        logger.info("Alert coalesced - ID: %s, Occurrences: %s", existing.id, existing.occurrence_count)
+        
+        return existing, escalated
+    
     def create_symptom_alert(self, symptom):
-        """Create alert for severe symptom."""
+        """Create (or coalesce) alert for severe symptom."""
         severity = 'CRITICAL' if symptom.intensity >= 9 else 'HIGH'
         
-        alert = Alert.objects.create(
+        alert, is_news = self.record_alert(
             patient=symptom.patient,
             alert_type='SYMPTOM_SEVERE',
             severity=severity,
@@ -75,14 +155,15 @@ class AlertService:
             related_symptom=symptom
         )
         
-        self._send_alert_email(alert)
+        if is_news:
+            self._send_alert_email(alert)
         
-        logger.warning(f"Symptom alert created - Patient: {symptom.patient.username}, Severity: {severity}")
+        logger.warning("Symptom alert created - Patient: %s, Severity: %s", symptom.patient.username, severity)
         
         return alert
     
     def create_chat_alert(self, patient, interaction, risk_level, suggested_action):
-        """Create alert from chat risk detection."""
+        """Create (or coalesce) alert from chat risk detection."""
         severity_mapping = {
             'CRITICAL': 'CRITICAL',
             'HIGH': 'HIGH',
@@ -90,7 +171,7 @@ class AlertService:
             'LOW': 'LOW'
         }
         
-        alert = Alert.objects.create(
+        alert, is_news = self.record_alert(
             patient=patient,
             alert_type='CHAT_RISK',
             severity=severity_mapping.get(risk_level, 'MEDIUM'),
@@ -99,35 +180,250 @@ class AlertService:
             related_chat=interaction
         )
         
-        if risk_level in ['CRITICAL', 'HIGH']:
+        if is_news and risk_level in ['CRITICAL', 'HIGH']:
             self._send_alert_email(alert)
         
-        logger.warning(f"Chat alert created - Patient: {patient.username}, Risk: {risk_level}")
+        logger.warning(
+            "Chat alert created - Patient: %s, Risk: %s", patient.username, risk_level,
+            extra={'patient_id': patient.id, 'alert_id': alert.id, 'risk_level': risk_level}
+        )
         
         return alert
     
     def resolve_alert(self, alert, resolved_by, notes):
-        """Mark alert as resolved."""
-        alert.is_resolved = True
-        alert.resolved_at = timezone.now()
-        alert.resolved_by = resolved_by
-        alert.resolution_notes = notes
-        alert.save()
+        """
+        Mark alert as resolved.
+        
+        Works on a locked copy of the row: `alert` may be stale if
+        record_alert coalesced into it since it was loaded, and only the
+        resolution fields are written back.
+        """
+        resolution_fields = ['is_resolved', 'resolved_at', 'resolved_by', 'resolution_notes']
+        with transaction.atomic():
+            locked = Alert.objects.select_for_update().get(id=alert.id)
+            was_open = not locked.is_resolved
+            
+            locked.is_resolved = True
+            locked.resolved_at = timezone.now()
+            locked.resolved_by = resolved_by
+            locked.resolution_notes = notes
+            locked.save(update_fields=resolution_fields)
+            
+            # Only the request that actually closed the alert updates the counters,
+            # from the severity the row has now
+            if was_open:
+                self._adjust_counters(locked.patient_id, active=-1, **self._severity_buckets(locked.severity, -1))
+                transaction.on_commit(collectors.ALERTS_RESOLVED.labels(locked.severity).inc)
+        
+        for field in resolution_fields + ['severity', 'severity_rank', 'occurrence_count', 'last_seen_at']:
+            setattr(alert, field, getattr(locked, field))
+        
+        logger.info("Alert resolved - ID: %s, By: %s", alert.id, resolved_by.username)
+    
+    def discard_alert(self, alert):
+        """
+        Take a deleted alert out of its patient's counters (post_delete).
+        Never creates a counter row: when the patient itself is being
+        deleted, the row may already be gone.
+        """
+        if not alert.is_resolved:
+            PatientAlertCounter.objects.filter(patient_id=alert.patient_id).update(
+                active_count=F('active_count') - 1,
+                critical_count=F('critical_count') - (alert.severity == 'CRITICAL'),
+                high_count=F('high_count') - (alert.severity == 'HIGH'),
+                updated_at=timezone.now()
+            )
+    
+    def _severity_buckets(self, severity, delta):
+        """Counter columns affected by an alert of this severity."""
+        if severity == 'CRITICAL':
+            return {'critical': delta}
+        if severity == 'HIGH':
+            return {'high': delta}
+        return {}
+    
+    def _adjust_counters(self, patient_id, active=0, critical=0, high=0):
+        """Apply deltas to the patient's PatientAlertCounter row, creating it if needed."""
+        if not (active or critical or high):
+            return
         
-        logger.info(f"Alert resolved - ID: {alert.id}, By: {resolved_by.username}")
+        updated = PatientAlertCounter.objects.filter(patient_id=patient_id).update(
+            active_count=F('active_count') + active,
+            critical_count=F('critical_count') + critical,
+            high_count=F('high_count') + high,
+            updated_at=timezone.now()
+        )
+        if updated:
+            return
+        
+        try:
+            with transaction.atomic():
+                PatientAlertCounter.objects.create(
+                    patient_id=patient_id,
+                    active_count=max(active, 0),
+                    critical_count=max(critical, 0),
+                    high_count=max(high, 0)
+                )
+        except IntegrityError:
+            # Created concurrently; apply the deltas to that row instead
+            self._adjust_counters(patient_id, active, critical, high)
+    
+    def rebuild_counters(self):
+        """Recompute every PatientAlertCounter from the Alert table."""
+        rows = (
+            Alert.objects.filter(is_resolved=False)
+            .order_by()
+            .values('patient_id')
+            .annotate(
+                active=Count('id'),
+                critical=Count('id', filter=Q(severity='CRITICAL')),
+                high=Count('id', filter=Q(severity='HIGH'))
+            )
+        )
+        counters = [
+            PatientAlertCounter(
+                patient_id=row['patient_id'],
+                active_count=row['active'],
+                critical_count=row['critical'],
+                high_count=row['high']
+            )
+            for row in rows
+        ]
+        
+        with transaction.atomic():
+            PatientAlertCounter.objects.all().delete()
+            PatientAlertCounter.objects.bulk_create(counters, batch_size=1000)
+        
+        logger.info("Alert counters rebuilt - %d patients", len(counters))
+        
+        return len(counters)
     
     def _send_alert_email(self, alert):
-        """Send email notification for alert."""
+        """
+        Queue email notification for alert; delivered by alert_email_dispatcher.
+        A patient without profile or doctor only skips the email: the alert
+        itself must still be committed.
+        """
+        # Get assigned doctor
         try:
-            # Get assigned doctor
             doctor = alert.patient.profile.assigned_doctor
-            if not doctor or not doctor.email:
-                logger.warning(f"No doctor assigned or no email for patient {alert.patient.username}")
-                return
+        except Profile.DoesNotExist:
+            doctor = None
+        if not doctor or not doctor.email:
+            logger.warning("No doctor assigned or no email for patient %s", alert.patient.username)
+            return None
+        
+        email = AlertEmail.objects.create(alert=alert, recipient=doctor.email)
+        
+        logger.info("Alert email queued for %s", doctor.email)
+        
+        return email
+
+
+class AlertEmailDispatcher:
+    """
+    Delivers queued alert emails.
+    Groups pending emails by doctor, sends them over one SMTP connection
+    and retries failed groups with exponential backoff.
+    """
+    
+    def dispatch_pending(self, batch_size=100):
+        """
+        Send up to `batch_size` due emails.
+        Returns (sent, failed) counts of AlertEmail rows.
+        """
+        now = timezone.now()
+        
+        with transaction.atomic():
+            emails = list(
+                AlertEmail.objects.select_for_update(skip_locked=True, of=('self',))
+                .select_related('alert__patient')
+                .filter(status='PENDING', next_attempt_at__lte=now)
+                .order_by('next_attempt_at')[:batch_size]
+            )
+            if not emails:
+                return 0, 0
+            
+            by_recipient = {}
+            for email in emails:
+                by_recipient.setdefault(email.recipient, []).append(email)
             
+            sent, failed = [], []
+            connection = None
+            try:
+                connection = get_connection(fail_silently=False)
+                connection.open()
+                for recipient, group in by_recipient.items():
+                    started = perf_counter()
+                    try:
+                        connection.send_messages([self._build_message(recipient, group, connection)])
+                        sent.extend(group)
+                    except Exception as e:
+                        logger.error("Error sending alert email to %s: %s", recipient, e)
+                        self._mark_failed(group, str(e), now)
+                        failed.extend(group)
+                    finally:
+                        collectors.ALERT_EMAIL_SEND_SECONDS.observe(perf_counter() - started)
+            except Exception as e:
+                # Could not even open the connection: retry everything later
+                logger.error("Error opening email connection: %s", e)
+                unsent = [email for email in emails if email not in sent and email not in failed]
+                self._mark_failed(unsent, str(e), now)
+                failed.extend(unsent)
+            finally:
+                if connection is not None:
+                    connection.close()
+            
+            if sent:
+                AlertEmail.objects.filter(id__in=[email.id for email in sent]).update(
+                    status='SENT',
+                    sent_at=now,
+                    attempts=F('attempts') + 1
+                )
+                Alert.objects.filter(id__in={email.alert_id for email in sent}).update(email_sent=True)
+        
+        collectors.ALERT_EMAILS.labels('sent').inc(len(sent))
+        collectors.ALERT_EMAILS.labels('failed').inc(len(failed))
+        if sent:
+            logger.info("Alert emails sent - %d alerts to %d doctors", len(sent), len(by_recipient))
+        
+        return len(sent), len(failed)
+    
+    def _mark_failed(self, emails, error, now):
+        for email in emails:
+            email.attempts += 1
+            email.last_error = error
+            if email.attempts >= settings.ALERT_EMAIL_MAX_ATTEMPTS:
+                email.status = 'FAILED'
+            else:
+                email.next_attempt_at = now + timedelta(
+                    seconds=settings.ALERT_EMAIL_RETRY_BASE_SECONDS * 2 ** (email.attempts - 1)
+                )
+        AlertEmail.objects.bulk_update(emails, ['attempts', 'last_error', 'status', 'next_attempt_at'])
+    
+    def _build_message(self, recipient, emails, connection):
+        """One email per doctor: the alert itself, or a digest if several are pending."""
+        alerts = [email.alert for email in emails]
+        
+        if len(alerts) == 1:
+            alert = alerts[0]
             subject = f"⚠ Alerta {alert.get_severity_display()} - {alert.patient.get_full_name()}"
-            message = f"""
-Alerta: {alert.get_alert_type_display()}
+        else:
+            subject = f"⚠ {len(alerts)} alertas nuevas - Lia for a Woman"
+        
+        body = "\n\n".join(self._format_alert(alert) for alert in alerts)
+        body += "\n\n---\nSistema Lia for a Woman\n"
+        
+        return EmailMessage(
+            subject,
+            body,
+            settings.DEFAULT_FROM_EMAIL,
+            [recipient],
+            connection=connection,
+        )
+    
+    def _format_alert(self, alert):
+        return f"""Alerta: {alert.get_alert_type_display()}
 Paciente: {alert.patient.get_full_name()}
 Severidad: {alert.get_severity_display()}
 
@@ -135,27 +431,185 @@ Mensaje:
 {alert.message}
 
 Acción sugerida:
-{alert.suggested_action}
+{alert.suggested_action}"""
 
----
-Sistema Lia for a Woman
-            """
-            
-            send_mail(
-                subject,
-                message,
-                settings.DEFAULT_FROM_EMAIL,
-                [doctor.email],
-                fail_silently=False,
+
+class SymptomRollupService:
+    """
+    Maintains hourly/daily SymptomRollup rows from SymptomReport writes
+    and answers windowed statistics from them.
+    """
+    
+    GRANULARITIES = {
+        'HOUR': TruncHour,
+        'DAY': TruncDay,
+    }
+    
+    @staticmethod
+    def intensity_bucket(intensity):
+        """Histogram column for an intensity, clamped to 1..10."""
+        return f'intensity_{min(max(intensity, 1), 10)}'
+    
+    @staticmethod
+    def bucket_starts(timestamp):
+        """Local-time start of the hour and day a timestamp falls in."""
+        local = timezone.localtime(timestamp)
+        hour = local.replace(minute=0, second=0, microsecond=0)
+        return {'HOUR': hour, 'DAY': hour.replace(hour=0)}
+    
+    def record_report(self, symptom):
+        """Fold a newly created SymptomReport into its hour and day rollups."""
+        column = self.intensity_bucket(symptom.intensity)
+        changes = {
+            'report_count': F('report_count') + 1,
+            'sum_intensity': F('sum_intensity') + symptom.intensity,
+            'max_intensity': Greatest('max_intensity', Value(symptom.intensity)),
+            column: F(column) + 1,
+        }
+        
+        for granularity, bucket_start in self.bucket_starts(symptom.timestamp).items():
+            rollups = SymptomRollup.objects.filter(
+                patient_id=symptom.patient_id,
+                symptom_type=symptom.symptom_type,
+                granularity=granularity,
+                bucket_start=bucket_start
             )
+            if rollups.update(**changes):
+                continue
             
-            alert.email_sent = True
-            alert.save()
-            
-            logger.info(f"Alert email sent to {doctor.email}")
-            
-        except Exception as e:
-            logger.error(f"Error sending alert email: {str(e)}")
+            try:
+                with transaction.atomic():
+                    SymptomRollup.objects.create(
+                        patient_id=symptom.patient_id,
+                        symptom_type=symptom.symptom_type,
+                        granularity=granularity,
+                        bucket_start=bucket_start,
+                        report_count=1,
+                        sum_intensity=symptom.intensity,
+                        max_intensity=symptom.intensity,
+                        **{column: 1}
+                    )
+            except IntegrityError:
+                # Created concurrently; fold into that row instead
+                rollups.update(**changes)
+    
+    def recompute(self, patient_id, timestamp):
+        """Rebuild the hour and day containing timestamp (after edits or deletes)."""
+        starts = self.bucket_starts(timestamp)
+        self.rebuild(patient_ids=[patient_id], start=starts['DAY'], end=starts['DAY'] + timedelta(days=1))
+    
+    def rebuild(self, patient_ids=None, start=None, end=None):
+        """
+        Recompute rollups from SymptomReport, optionally limited to some
+        patients and to whole days in [start, end).
+        Returns the number of rollup rows written.
+        """
+        reports = SymptomReport.objects.order_by()
+        rollups = SymptomRollup.objects.all()
+        if patient_ids is not None:
+            reports = reports.filter(patient_id__in=patient_ids)
+            rollups = rollups.filter(patient_id__in=patient_ids)
+        if start is not None:
+            reports = reports.filter(timestamp__gte=start)
+            rollups = rollups.filter(bucket_start__gte=start)
+        if end is not None:
+            reports = reports.filter(timestamp__lt=end)
+            rollups = rollups.filter(bucket_start__lt=end)
+        
+        histogram = {
+            f'intensity_{level}': Count('id', filter=Q(intensity=level))
+            for level in SymptomRollup.INTENSITY_LEVELS
+        }
+        histogram['intensity_1'] = Count('id', filter=Q(intensity__lte=1))
+        histogram['intensity_10'] = Count('id', filter=Q(intensity__gte=10))
+        
+        tz = timezone.get_current_timezone()
+        objects = []
+        for granularity, trunc in self.GRANULARITIES.items():
+            rows = reports.annotate(
+                bucket_start=trunc('timestamp', tzinfo=tz)
+            ).values('patient_id', 'symptom_type', 'bucket_start').annotate(
+                report_count=Count('id'),
+                sum_intensity=Sum('intensity'),
+                max_intensity=Max('intensity'),
+                **histogram
+            )
+            objects.extend(
+                SymptomRollup(granularity=granularity, **row)
+                for row in rows.iterator(chunk_size=2000)
+            )
+        
+        with transaction.atomic():
+            rollups.delete()
+            created = SymptomRollup.objects.bulk_create(objects, batch_size=1000)
+        
+        return len(created)
+    
+    def window_filter(self, start, end=None):
+        """
+        Q selecting the rollup rows that exactly tile [start, end).
+        Whole local days use daily rows, partial days use hourly rows;
+        start and end are resolved to the hour (start rounds up, end down).
+        An open end includes everything from start on.
+        """
+        start = timezone.localtime(start)
+        start_hour = start.replace(minute=0, second=0, microsecond=0)
+        if start_hour < start:
+            start_hour += timedelta(hours=1)
+        first_day = start_hour.replace(hour=0)
+        if first_day < start_hour:
+            first_day += timedelta(days=1)
+        
+        if end is None:
+            return (
+                Q(granularity='HOUR', bucket_start__gte=start_hour, bucket_start__lt=first_day) |
+                Q(granularity='DAY', bucket_start__gte=first_day)
+            )
+        
+        end_hour = timezone.localtime(end).replace(minute=0, second=0, microsecond=0)
+        last_day = end_hour.replace(hour=0)
+        if last_day <= first_day:
+            # No whole day inside the window
+            return Q(granularity='HOUR', bucket_start__gte=start_hour, bucket_start__lt=end_hour)
+        
+        return (
+            Q(granularity='HOUR', bucket_start__gte=start_hour, bucket_start__lt=first_day) |
+            Q(granularity='DAY', bucket_start__gte=first_day, bucket_start__lt=last_day) |
+            Q(granularity='HOUR', bucket_start__gte=last_day, bucket_start__lt=end_hour)
+        )
+    
+    def window_stats(self, patient, start, end=None, symptom_type=None):
+        """
+        Aggregate statistics for a patient's reports in [start, end).
+        
+        Returns dict with count, mean, max, histogram (list for intensities
+        1..10) and severe_count (intensity >= 8).
+        """
+        rollups = SymptomRollup.objects.filter(self.window_filter(start, end), patient=patient)
+        if symptom_type:
+            rollups = rollups.filter(symptom_type=symptom_type)
+        
+        columns = [f'intensity_{level}' for level in SymptomRollup.INTENSITY_LEVELS]
+        totals = rollups.aggregate(
+            count=Coalesce(Sum('report_count'), 0),
+            total=Coalesce(Sum('sum_intensity'), 0),
+            max=Max('max_intensity'),
+            **{column: Coalesce(Sum(column), 0) for column in columns}
+        )
+        histogram = [totals[column] for column in columns]
+        
+        return {
+            'count': totals['count'],
+            'mean': totals['total'] / totals['count'] if totals['count'] else None,
+            'max': totals['max'],
+            'histogram': histogram,
+            'severe_count': sum(histogram[7:]),
+        }
+    
+    def days_window_stats(self, patient, days, symptom_type=None):
+        """Statistics since local midnight `days` days ago, like the raw date filters."""
+        start = timezone.make_aware(datetime.combine(date.today() - timedelta(days=days), time.min))
+        return self.window_stats(patient, start, symptom_type=symptom_type)
 
 
 class TimelineService:
@@ -171,12 +625,14 @@ class TimelineService:
             created_by=created_by
         )
         
-        logger.info(f"Timeline event added - Patient: {patient.username}, Type: {event_type}")
+        logger.info("Timeline event added - Patient: %s, Type: %s", patient.username, event_type)
         
         return event
 
 
 # Singleton instances
 symptom_service = SymptomService()
+symptom_rollup_service = SymptomRollupService()
 alert_service = AlertService()
 timeline_service = TimelineService()
+alert_email_dispatcher = AlertEmailDispatcher()
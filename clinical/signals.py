@@ -0,0 +1,32 @@
+"""
+Signal handlers for clinical module.
+Keep derived tables in sync with SymptomReport writes and Alert deletes.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Alert, SymptomReport
+from .services import alert_service, symptom_rollup_service
+
+
+@receiver(post_save, sender=SymptomReport)
+def update_symptom_rollup(sender, instance, created, raw=False, **kwargs):
+    """Fold new reports into their rollups; recompute the day on edits."""
+    if raw:
+        return
+    if created:
+        symptom_rollup_service.record_report(instance)
+    else:
+        symptom_rollup_service.recompute(instance.patient_id, instance.timestamp)
+
+
+@receiver(post_delete, sender=SymptomReport)
+def remove_from_symptom_rollup(sender, instance, **kwargs):
+    """Recompute the day a deleted report belonged to."""
+    symptom_rollup_service.recompute(instance.patient_id, instance.timestamp)
+
+
+@receiver(post_delete, sender=Alert)
+def remove_from_alert_counters(sender, instance, **kwargs):
+    """Deleted open alerts stop counting towards PatientAlertCounter."""
+    alert_service.discard_alert(instance)
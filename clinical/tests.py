@@ -0,0 +1,482 @@
+"""
+Tests for the clinical module: alert creation, the alert email outbox,
+coalescing, the per-patient alert counters and the symptom rollups.
+"""
+from datetime import date, datetime, time, timedelta
+from unittest import mock
+
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db.models import Avg, Count, Max
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from chatbot.models import ChatInteraction, ChatOutboxEntry
+from chatbot.services import chat_outbox_service, chat_service
+from users.models import CustomUser, Profile
+
+from .models import Alert, AlertEmail, PatientAlertCounter, SymptomReport, SymptomRollup
+from .services import alert_email_dispatcher, alert_service, symptom_rollup_service
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    """Email backend whose sends always fail."""
+
+    def send_messages(self, email_messages):
+        raise ConnectionError('SMTP down')
+
+
+def make_patient(username='paciente', doctor=None, with_profile=True):
+    patient = CustomUser.objects.create_user(username, password='x', role='PATIENT')
+    if with_profile:
+        Profile.objects.create(user=patient, assigned_doctor=doctor)
+    return patient
+
+
+def make_doctor(username='medico', email='medico@example.com'):
+    return CustomUser.objects.create_user(username, password='x', role='DOCTOR', email=email)
+
+
+def send_chat(patient, message):
+    """Save a chat message the way send_message does, then drain the chat outbox."""
+    result = chat_service.process_message(message, user=patient)
+    interaction, _ = chat_outbox_service.record_interaction(patient, message, result)
+    chat_outbox_service.process_pending()
+    return interaction
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class AlertEmailOutboxTests(TestCase):
+
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patient = make_patient(doctor=self.doctor)
+
+    def test_crisis_alert_without_profile_is_still_created(self):
+        patient = make_patient('sin_perfil', with_profile=False)
+
+        send_chat(patient, 'quiero morir')
+
+        alert = Alert.objects.get(patient=patient)
+        self.assertEqual(alert.severity, 'CRITICAL')
+        self.assertFalse(AlertEmail.objects.exists())
+        self.assertEqual(ChatOutboxEntry.objects.get().status, 'DONE')
+
+    def test_crisis_alert_without_assigned_doctor_is_still_created(self):
+        patient = make_patient('sin_medico')
+
+        send_chat(patient, 'quiero morir')
+
+        self.assertTrue(Alert.objects.filter(patient=patient).exists())
+        self.assertFalse(AlertEmail.objects.exists())
+
+    def test_alert_email_is_queued_and_sent(self):
+        send_chat(self.patient, 'quiero morir')
+
+        email = AlertEmail.objects.get()
+        self.assertEqual((email.status, email.recipient), ('PENDING', self.doctor.email))
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(alert_email_dispatcher.dispatch_pending(), (1, 0))
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('SENT', 1))
+        self.assertTrue(email.alert.email_sent)
+        self.assertEqual(mail.outbox[0].to, [self.doctor.email])
+
+    def test_pending_emails_for_one_doctor_go_out_as_one_digest(self):
+        other = make_patient('otra', doctor=self.doctor)
+        send_chat(self.patient, 'quiero morir')
+        send_chat(other, 'no aguanto más')
+
+        self.assertEqual(alert_email_dispatcher.dispatch_pending(), (2, 0))
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('2 alertas', mail.outbox[0].subject)
+
+    @override_settings(
+        EMAIL_BACKEND='clinical.tests.FailingEmailBackend',
+        ALERT_EMAIL_MAX_ATTEMPTS=2,
+        ALERT_EMAIL_RETRY_BASE_SECONDS=30,
+    )
+    def test_failed_send_is_retried_with_backoff_then_marked_failed(self):
+        send_chat(self.patient, 'quiero morir')
+        email = AlertEmail.objects.get()
+
+        self.assertEqual(alert_email_dispatcher.dispatch_pending(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('PENDING', 1))
+        self.assertIn('SMTP down', email.last_error)
+        self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=20))
+
+        # Not due yet: nothing is picked up
+        self.assertEqual(alert_email_dispatcher.dispatch_pending(), (0, 0))
+
+        AlertEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(alert_email_dispatcher.dispatch_pending(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('FAILED', 2))
+        self.assertFalse(email.alert.email_sent)
+
+
+class ChatOutboxTests(TestCase):
+
+    def setUp(self):
+        self.patient = make_patient(doctor=make_doctor())
+
+    def test_failing_entry_is_retried_then_marked_failed(self):
+        result = chat_service.process_message('quiero morir', user=self.patient)
+        chat_outbox_service.record_interaction(self.patient, 'quiero morir', result)
+        entry = ChatOutboxEntry.objects.get()
+
+        with mock.patch.object(alert_service, 'create_chat_alert', side_effect=RuntimeError('boom')):
+            for attempt in range(1, chat_outbox_service.MAX_ATTEMPTS + 1):
+                self.assertEqual(chat_outbox_service.process_pending(), 0)
+                entry.refresh_from_db()
+                self.assertEqual(entry.attempts, attempt)
+
+        self.assertEqual(entry.status, 'FAILED')
+        self.assertEqual(entry.last_error, 'boom')
+        self.assertFalse(Alert.objects.exists())
+
+        # Failed entries are not picked up again
+        self.assertEqual(chat_outbox_service.process_pending(), 0)
+
+    def test_messages_without_side_effects_enqueue_nothing(self):
+        result = chat_service.process_message('hola', user=self.patient)
+        interaction, entry = chat_outbox_service.record_interaction(self.patient, 'hola', result)
+
+        self.assertIsNone(entry)
+        self.assertTrue(ChatInteraction.objects.filter(pk=interaction.pk).exists())
+
+
+@override_settings(ALERT_COALESCE_WINDOW_MINUTES=30)
+class AlertCoalescingTests(TestCase):
+
+    def setUp(self):
+        self.patient = make_patient(doctor=make_doctor())
+
+    def test_repeats_within_window_coalesce_into_one_alert(self):
+        send_chat(self.patient, 'quiero morir')
+        send_chat(self.patient, 'quiero morir')
+
+        alert = Alert.objects.get()
+        self.assertEqual(alert.occurrence_count, 2)
+        self.assertEqual(AlertEmail.objects.count(), 1)
+
+    def test_milder_occurrence_keeps_the_graver_message_and_links(self):
+        critical_chat = send_chat(self.patient, 'quiero morir')
+        send_chat(self.patient, 'no aguanto más')
+
+        alert = Alert.objects.get()
+        self.assertEqual((alert.severity, alert.occurrence_count), ('CRITICAL', 2))
+        self.assertEqual(alert.message, 'Riesgo CRITICAL detectado en conversación con Lia')
+        self.assertEqual(alert.suggested_action, 'URGENTE: Activar protocolo de crisis/suicidio.')
+        self.assertEqual(alert.related_chat_id, critical_chat.id)
+
+    def test_escalation_replaces_message_and_notifies_again(self):
+        send_chat(self.patient, 'no aguanto más')
+        critical_chat = send_chat(self.patient, 'quiero morir')
+
+        alert = Alert.objects.get()
+        self.assertEqual((alert.severity, alert.severity_rank), ('CRITICAL', Alert.SEVERITY_RANK['CRITICAL']))
+        self.assertEqual(alert.related_chat_id, critical_chat.id)
+        self.assertEqual(AlertEmail.objects.count(), 2)
+
+    def test_alert_outside_window_is_not_coalesced(self):
+        send_chat(self.patient, 'quiero morir')
+        Alert.objects.update(last_seen_at=timezone.now() - timedelta(minutes=31))
+
+        send_chat(self.patient, 'quiero morir')
+
+        self.assertEqual(Alert.objects.count(), 2)
+
+    def test_resolved_alert_is_not_coalesced(self):
+        doctor = CustomUser.objects.get(role='DOCTOR')
+        send_chat(self.patient, 'quiero morir')
+        alert_service.resolve_alert(Alert.objects.get(), doctor, 'Contactada')
+
+        send_chat(self.patient, 'quiero morir')
+
+        self.assertEqual(Alert.objects.filter(is_resolved=False).count(), 1)
+
+    @override_settings(ALERT_COALESCE_WINDOW_MINUTES=0)
+    def test_zero_window_disables_coalescing(self):
+        send_chat(self.patient, 'quiero morir')
+        send_chat(self.patient, 'quiero morir')
+
+        self.assertEqual(Alert.objects.count(), 2)
+
+
+class PatientAlertCounterTests(TestCase):
+
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patient = make_patient(doctor=self.doctor)
+
+    def counts(self, patient=None):
+        counter = PatientAlertCounter.objects.get(patient=patient or self.patient)
+        return counter.active_count, counter.critical_count, counter.high_count
+
+    def assertMatchesRebuild(self):
+        incremental = sorted(PatientAlertCounter.objects.values_list(
+            'patient_id', 'active_count', 'critical_count', 'high_count'))
+        alert_service.rebuild_counters()
+        rebuilt = sorted(PatientAlertCounter.objects.values_list(
+            'patient_id', 'active_count', 'critical_count', 'high_count'))
+        # Rebuild drops patients without open alerts instead of keeping zero rows
+        self.assertEqual([row for row in incremental if row[1:] != (0, 0, 0)], rebuilt)
+
+    @override_settings(ALERT_COALESCE_WINDOW_MINUTES=0)
+    def test_new_alerts_increment_their_severity_bucket(self):
+        send_chat(self.patient, 'quiero morir')
+        send_chat(self.patient, 'no aguanto más')
+
+        self.assertEqual(self.counts(), (2, 1, 1))
+        self.assertMatchesRebuild()
+
+    @override_settings(ALERT_COALESCE_WINDOW_MINUTES=30)
+    def test_coalescing_counts_once_and_escalation_moves_bucket(self):
+        send_chat(self.patient, 'no aguanto más')
+        send_chat(self.patient, 'no aguanto más')
+        self.assertEqual(self.counts(), (1, 0, 1))
+
+        send_chat(self.patient, 'quiero morir')
+        self.assertEqual(self.counts(), (1, 1, 0))
+        self.assertMatchesRebuild()
+
+    def test_resolving_decrements_once(self):
+        send_chat(self.patient, 'quiero morir')
+        alert = Alert.objects.get()
+
+        alert_service.resolve_alert(alert, self.doctor, 'Contactada')
+        alert_service.resolve_alert(Alert.objects.get(), self.doctor, 'Otra vez')
+
+        self.assertEqual(self.counts(), (0, 0, 0))
+        self.assertMatchesRebuild()
+
+    @override_settings(ALERT_COALESCE_WINDOW_MINUTES=30)
+    def test_resolving_a_stale_instance_keeps_coalesced_changes(self):
+        send_chat(self.patient, 'no aguanto más')
+        stale = Alert.objects.get()
+        send_chat(self.patient, 'quiero morir')
+
+        alert_service.resolve_alert(stale, self.doctor, 'Contactada')
+
+        alert = Alert.objects.get()
+        self.assertTrue(alert.is_resolved)
+        self.assertEqual((alert.severity, alert.occurrence_count), ('CRITICAL', 2))
+        self.assertEqual(alert.message, 'Riesgo CRITICAL detectado en conversación con Lia')
+        self.assertEqual(stale.severity, 'CRITICAL')
+        self.assertEqual(self.counts(), (0, 0, 0))
+        self.assertMatchesRebuild()
+
+    def test_admin_resolve_action_goes_through_the_service(self):
+        admin_user = CustomUser.objects.create_superuser('admin', 'admin@example.com', 'x')
+        send_chat(self.patient, 'quiero morir')
+        alert = Alert.objects.get()
+        self.client.force_login(admin_user)
+
+        response = self.client.post('/admin/clinical/alert/', {
+            'action': 'resolve_alerts',
+            '_selected_action': [alert.pk],
+        })
+
+        self.assertEqual(response.status_code, 302)
+        alert.refresh_from_db()
+        self.assertTrue(alert.is_resolved)
+        self.assertEqual(alert.resolved_by, admin_user)
+        self.assertEqual(self.counts(), (0, 0, 0))
+
+    def test_admin_cannot_edit_severity_or_resolution(self):
+        admin_user = CustomUser.objects.create_superuser('admin', 'admin@example.com', 'x')
+        send_chat(self.patient, 'quiero morir')
+        alert = Alert.objects.get()
+        self.client.force_login(admin_user)
+
+        response = self.client.get(f'/admin/clinical/alert/{alert.pk}/change/')
+
+        editable = response.context['adminform'].form.fields
+        for field in ('severity', 'is_resolved', 'resolved_at', 'resolved_by', 'patient'):
+            self.assertNotIn(field, editable)
+        self.assertEqual(self.client.get('/admin/clinical/alert/add/').status_code, 403)
+
+    @override_settings(ALERT_COALESCE_WINDOW_MINUTES=0)
+    def test_admin_deletes_update_the_counters(self):
+        admin_user = CustomUser.objects.create_superuser('admin', 'admin@example.com', 'x')
+        send_chat(self.patient, 'quiero morir')
+        send_chat(self.patient, 'no aguanto más')
+        send_chat(self.patient, 'quiero morir')
+        critical, high, other = Alert.objects.order_by('id')
+        alert_service.resolve_alert(other, self.doctor, 'Contactada')
+        self.client.force_login(admin_user)
+
+        response = self.client.post(f'/admin/clinical/alert/{critical.pk}/delete/', {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.counts(), (1, 0, 1))
+
+        # Bulk "delete selected", including an already resolved alert
+        response = self.client.post('/admin/clinical/alert/', {
+            'action': 'delete_selected',
+            '_selected_action': [high.pk, other.pk],
+            'post': 'yes',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Alert.objects.exists())
+        self.assertEqual(self.counts(), (0, 0, 0))
+        self.assertMatchesRebuild()
+
+    def test_deleting_the_patient_removes_alerts_and_counters(self):
+        send_chat(self.patient, 'quiero morir')
+
+        self.patient.delete()
+
+        self.assertFalse(PatientAlertCounter.objects.exists())
+
+
+class SymptomRollupTests(TestCase):
+
+    def setUp(self):
+        self.patient = CustomUser.objects.create_user('paciente', password='x', role='PATIENT')
+        self.today = timezone.localdate()
+
+    def report(self, intensity, symptom_type='PAIN', days_ago=0, hour=12, minute=0, patient=None):
+        at = timezone.make_aware(datetime.combine(self.today - timedelta(days=days_ago), time(hour, minute)))
+        with mock.patch('django.utils.timezone.now', return_value=at):
+            return SymptomReport.objects.create(
+                patient=patient or self.patient, symptom_type=symptom_type, intensity=intensity
+            )
+
+    def rollups(self):
+        columns = [f'intensity_{level}' for level in SymptomRollup.INTENSITY_LEVELS]
+        return sorted(
+            SymptomRollup.objects.values_list(
+                'patient_id', 'symptom_type', 'granularity', 'bucket_start',
+                'report_count', 'sum_intensity', 'max_intensity', *columns,
+            )
+        )
+
+    def assertMatchesRebuild(self):
+        incremental = self.rollups()
+        symptom_rollup_service.rebuild()
+        self.assertEqual(incremental, self.rollups())
+
+    def raw_stats(self, reports):
+        """What window_stats should return, aggregated straight from SymptomReport."""
+        totals = reports.aggregate(count=Count('id'), mean=Avg('intensity'), max=Max('intensity'))
+        histogram = [reports.filter(intensity=level).count() for level in SymptomRollup.INTENSITY_LEVELS]
+        return {**totals, 'histogram': histogram, 'severe_count': reports.filter(intensity__gte=8).count()}
+
+    def assertStatsMatch(self, stats, reports):
+        expected = self.raw_stats(reports)
+        self.assertEqual({**stats, 'mean': None}, {**expected, 'mean': None})
+        if expected['mean'] is None:
+            self.assertIsNone(stats['mean'])
+        else:
+            self.assertAlmostEqual(stats['mean'], expected['mean'])
+
+    def test_new_reports_fold_into_their_hour_and_day(self):
+        self.report(4, hour=8, minute=5)
+        self.report(9, hour=8, minute=50)
+        self.report(6, hour=20)
+        self.report(3, symptom_type='NAUSEA', hour=8)
+
+        hour = SymptomRollup.objects.get(granularity='HOUR', symptom_type='PAIN', report_count=2)
+        self.assertEqual(timezone.localtime(hour.bucket_start).hour, 8)
+        self.assertEqual((hour.sum_intensity, hour.max_intensity, hour.intensity_4, hour.intensity_9), (13, 9, 1, 1))
+        day = SymptomRollup.objects.get(granularity='DAY', symptom_type='PAIN')
+        self.assertEqual((day.report_count, day.sum_intensity, day.max_intensity), (3, 19, 9))
+        self.assertEqual(timezone.localtime(day.bucket_start).date(), self.today)
+        self.assertEqual(SymptomRollup.objects.count(), 5)
+        self.assertMatchesRebuild()
+
+    def test_out_of_range_intensities_are_clamped_into_the_histogram(self):
+        self.report(0)
+        self.report(12)
+
+        day = SymptomRollup.objects.get(granularity='DAY')
+        self.assertEqual((day.intensity_1, day.intensity_10, day.sum_intensity), (1, 1, 12))
+        self.assertMatchesRebuild()
+
+    def test_editing_a_report_recomputes_its_day(self):
+        report = self.report(4)
+        self.report(5, hour=13)
+
+        report.intensity = 10
+        report.save()
+
+        day = SymptomRollup.objects.get(granularity='DAY')
+        self.assertEqual((day.sum_intensity, day.max_intensity, day.intensity_4, day.intensity_10), (15, 10, 0, 1))
+        self.assertMatchesRebuild()
+
+    def test_deleting_a_report_recomputes_its_day(self):
+        self.report(5)
+        kept = self.report(3, hour=9)
+        lone = self.report(8, hour=15)
+        old = self.report(7, days_ago=2)
+
+        lone.delete()
+        old.delete()
+
+        self.assertEqual(
+            sorted(SymptomRollup.objects.values_list('granularity', 'report_count')),
+            [('DAY', 2), ('HOUR', 1), ('HOUR', 1)]
+        )
+        kept.delete()
+        self.assertEqual(SymptomRollup.objects.get(granularity='DAY').max_intensity, 5)
+        self.assertMatchesRebuild()
+
+    def test_rebuild_can_be_limited_to_some_patients_and_days(self):
+        other = CustomUser.objects.create_user('otra', password='x', role='PATIENT')
+        self.report(5)
+        self.report(6, days_ago=3)
+        self.report(7, patient=other)
+        SymptomRollup.objects.update(report_count=0)
+
+        start = timezone.make_aware(datetime.combine(self.today, time.min))
+        symptom_rollup_service.rebuild(patient_ids=[self.patient.pk], start=start)
+
+        days = SymptomRollup.objects.filter(granularity='DAY')
+        self.assertEqual(days.get(patient=self.patient, bucket_start__gte=start).report_count, 1)
+        # Outside the rebuilt range the (deliberately broken) rows are left alone
+        self.assertEqual(days.get(patient=self.patient, bucket_start__lt=start).report_count, 0)
+        self.assertEqual(days.get(patient=other).report_count, 0)
+
+    def test_days_window_stats_match_raw_reports(self):
+        for intensity, symptom_type, days_ago, hour in [
+            (9, 'PAIN', 0, 1), (2, 'PAIN', 0, 23), (8, 'NAUSEA', 3, 12),
+            (5, 'PAIN', 7, 0), (10, 'PAIN', 8, 23), (1, 'FATIGUE', 30, 6),
+        ]:
+            self.report(intensity, symptom_type, days_ago=days_ago, hour=hour)
+
+        for days in (0, 1, 7, 8, 60):
+            # The raw filter the doctor dashboard used before the rollups
+            reports = SymptomReport.objects.filter(
+                patient=self.patient,
+                timestamp__gte=timezone.make_aware(datetime.combine(date.today() - timedelta(days=days), time.min))
+            )
+            with self.subTest(days=days):
+                self.assertStatsMatch(symptom_rollup_service.days_window_stats(self.patient, days), reports)
+            with self.subTest(days=days, symptom_type='PAIN'):
+                self.assertStatsMatch(
+                    symptom_rollup_service.days_window_stats(self.patient, days, symptom_type='PAIN'),
+                    reports.filter(symptom_type='PAIN')
+                )
+
+    def test_window_stats_tile_partial_days_with_hours(self):
+        for days_ago in range(3):
+            for hour in (0, 6, 11, 17, 23):
+                self.report(hour % 10 + 1, days_ago=days_ago, hour=hour, minute=30)
+
+        midnight = timezone.make_aware(datetime.combine(self.today, time.min))
+        for start, end in [
+            (midnight - timedelta(days=2, hours=-6), midnight - timedelta(hours=6)),
+            (midnight - timedelta(days=1), midnight + timedelta(hours=12)),
+            (midnight - timedelta(hours=13), midnight - timedelta(hours=1)),
+            (midnight - timedelta(days=2), None),
+        ]:
+            reports = SymptomReport.objects.filter(patient=self.patient, timestamp__gte=start)
+            if end is not None:
+                reports = reports.filter(timestamp__lt=end)
+            with self.subTest(start=start, end=end):
+                self.assertStatsMatch(symptom_rollup_service.window_stats(self.patient, start, end), reports)
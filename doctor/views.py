@@ -3,12 +3,12 @@ Views for doctor dashboard.
 """
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Q
-from datetime import date, timedelta
+from django.db.models.functions import Coalesce
 
 from users.decorators import doctor_only
 from users.models import CustomUser
 from clinical.models import SymptomReport, Alert, ClinicalTimeline
+from clinical.services import symptom_rollup_service
 from psychosocial.services import consent_service
 
 
@@ -20,39 +20,29 @@ def dashboard(request):
     """
     doctor = request.user
     
-    # Get assigned patients
-    assigned_patients = CustomUser.objects.filter(
-        profile__assigned_doctor=doctor,
-        role='PATIENT'
-    ).annotate(
-        active_alerts_count=Count(
-            'alerts',
-            filter=Q(alerts__is_resolved=False)
-        ),
-        critical_alerts_count=Count(
-            'alerts',
-            filter=Q(alerts__is_resolved=False, alerts__severity='CRITICAL')
-        ),
-        high_alerts_count=Count(
-            'alerts',
-            filter=Q(alerts__is_resolved=False, alerts__severity='HIGH')
-        )
-    ).order_by('-critical_alerts_count', '-high_alerts_count')
+    # Get assigned patients with their materialized alert counters
+    # (clinical.PatientAlertCounter, maintained by AlertService)
+    assigned_patients = list(
+        CustomUser.objects.filter(
+            profile__assigned_doctor=doctor,
+            role='PATIENT'
+        ).annotate(
+            active_alerts_count=Coalesce('alert_counter__active_count', 0),
+            critical_alerts_count=Coalesce('alert_counter__critical_count', 0),
+            high_alerts_count=Coalesce('alert_counter__high_count', 0)
+        ).order_by('-critical_alerts_count', '-high_alerts_count')
+    )
     
     # Recent alerts across all patients
     recent_alerts = Alert.objects.filter(
         patient__profile__assigned_doctor=doctor,
         is_resolved=False
-    ).order_by('-severity', '-created_at')[:10]
+    ).select_related('patient').order_by('-severity_rank', '-created_at')[:10]
     
     # Statistics
-    total_patients = assigned_patients.count()
-    patients_with_alerts = assigned_patients.filter(active_alerts_count__gt=0).count()
-    critical_alerts = Alert.objects.filter(
-        patient__profile__assigned_doctor=doctor,
-        is_resolved=False,
-        severity='CRITICAL'
-    ).count()
+    total_patients = len(assigned_patients)
+    patients_with_alerts = sum(1 for p in assigned_patients if p.active_alerts_count > 0)
+    critical_alerts = sum(p.critical_alerts_count for p in assigned_patients)
     
     context = {
         'doctor': doctor,
@@ -92,19 +82,14 @@ def patient_detail(request, patient_id):
     active_alerts = Alert.objects.filter(
         patient=patient,
         is_resolved=False
-    ).order_by('-severity', '-created_at')
+    ).order_by('-severity_rank', '-created_at')
     
     timeline_events = ClinicalTimeline.objects.filter(
         patient=patient
     ).order_by('-event_date')[:15]
     
     # Statistics
-    avg_symptom_intensity = SymptomReport.objects.filter(
-        patient=patient,
-        timestamp__gte=date.today() - timedelta(days=7)
-    ).aggregate(
-        avg_intensity=models.Avg('intensity')
-    )['avg_intensity']
+    avg_symptom_intensity = symptom_rollup_service.days_window_stats(patient, days=7)['mean']
     
     context = {
         'patient': patient,
@@ -117,5 +102,3 @@ def patient_detail(request, patient_id):
     
     return render(request, 'doctor/patient_detail.html', context)
 
-
-from django.db import models  # Import needed for aggregate
@@ -0,0 +1,44 @@
+"""
+Gunicorn configuration for Lia for a Woman.
+
+    gunicorn -c gunicorn.conf.py lia_project.wsgi
+
+For the async chat endpoints (chatbot:send_message_async,
+api:chat-create-async) serve the ASGI application with uvicorn workers, so
+each worker keeps many slow connections open on one event loop:
+
+    GUNICORN_WORKER_CLASS=uvicorn_worker.UvicornWorker \
+        gunicorn -c gunicorn.conf.py lia_project.asgi:application
+
+With PROMETHEUS_MULTIPROC_DIR set (environment or .env), each worker writes
+its metrics to mmap-backed files in that directory and /metrics/ aggregates
+them. The directory is emptied when the master starts.
+"""
+import os
+import shutil
+
+# Aliased: gunicorn reads every module-level name, and `config` is one of its settings
+from decouple import config as env
+
+bind = env('GUNICORN_BIND', default='0.0.0.0:8000')
+workers = env('GUNICORN_WORKERS', default=3, cast=int)
+worker_class = env('GUNICORN_WORKER_CLASS', default='sync')
+
+PROMETHEUS_MULTIPROC_DIR = env('PROMETHEUS_MULTIPROC_DIR', default='')
+if PROMETHEUS_MULTIPROC_DIR:
+    # Inherited by the workers before they import prometheus_client
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = PROMETHEUS_MULTIPROC_DIR
+
+
+def on_starting(server):
+    """Drop samples left by a previous run."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+        os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Counters and histograms of a dead worker are kept; its live gauges are removed."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,22 @@
+"""
+Helpers for data cached in the shared `default` cache.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_process_local(alias='default'):
+    """True if the cache lives in this process only, so other workers never see its deletes."""
+    return isinstance(caches[alias], LocMemCache)
+
+
+def shared_timeout(timeout, alias='default'):
+    """
+    Timeout for an entry that is invalidated on writes.
+    A per-process backend keeps stale entries in the other workers until they
+    expire, so there it is capped at LOCAL_CACHE_MAX_SECONDS.
+    """
+    if is_process_local(alias):
+        return min(timeout, settings.LOCAL_CACHE_MAX_SECONDS)
+    return timeout
@@ -0,0 +1,105 @@
+"""
+Logging handlers and formatters referenced from settings.LOGGING.
+
+Request workers only put records on an in-memory queue; a single listener
+thread formats them as JSON lines and appends them to the log file.
+
+Several processes (gunicorn workers, the outbox workers) share LOG_FILE, so
+rotation is left to logrotate: appends are safe from many processes, and
+WatchedFileHandler reopens the file once logrotate has moved it away.
+"""
+import atexit
+import json
+import logging
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, source and any `extra=` fields."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'func': record.funcName,
+            'line': record.lineno,
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        if record.stack_info:
+            entry['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class QueuedFileHandler(QueueHandler):
+    """
+    Non-blocking front for a WatchedFileHandler.
+
+    emit() only enqueues; a QueueListener thread owns the file, so disk I/O
+    never runs on a request worker. The queue is bounded: when the
+    writer falls behind, records are dropped and counted instead of blocking
+    or growing memory, and the count is logged once the queue has room again.
+    The formatter configured for this handler is applied by the file sink.
+    """
+
+    def __init__(self, filename, queue_size=10000):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.sink = WatchedFileHandler(filename, encoding='utf-8', delay=True)
+        self.sink.setFormatter(JsonFormatter())
+        self.dropped = 0
+        self.listener = QueueListener(self.queue, self.sink)
+        self.listener.start()
+        self._stopped = False
+        atexit.register(self.close)
+
+    def setFormatter(self, fmt):
+        self.sink.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Resolve %-args and tracebacks here: they may reference objects that
+        # change or go away before the listener thread gets to the record
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self.sink.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            if self.dropped:
+                self.queue.put_nowait(logging.makeLogRecord({
+                    'name': __name__,
+                    'levelno': logging.WARNING,
+                    'levelname': 'WARNING',
+                    'msg': '%d log records dropped: queue full',
+                    'args': (self.dropped,),
+                }))
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        # Drain what is queued before the process exits; safe to call twice
+        if not self._stopped:
+            self._stopped = True
+            self.listener.stop()
+            self.sink.close()
+        super().close()
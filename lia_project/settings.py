@@ -43,9 +43,12 @@ INSTALLED_APPS = [
     'doctor.apps.DoctorConfig',
     'psychologist.apps.PsychologistConfig',
     'api.apps.ApiConfig',
+    'search.apps.SearchConfig',
+    'metrics.apps.MetricsConfig',
 ]
 
 MIDDLEWARE = [
+    'metrics.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -61,7 +64,7 @@ ROOT_URLCONF = 'lia_project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'metrics.instrumentation.InstrumentedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -168,6 +171,83 @@ EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='lia@liaforwoman.com')
 
+# Alert email outbox (clinical.services.AlertEmailDispatcher)
+ALERT_EMAIL_MAX_ATTEMPTS = config('ALERT_EMAIL_MAX_ATTEMPTS', default=5, cast=int)
+ALERT_EMAIL_RETRY_BASE_SECONDS = config('ALERT_EMAIL_RETRY_BASE_SECONDS', default=30, cast=int)
+
+# Repeated alerts of the same patient/type within this window are merged (0 disables)
+ALERT_COALESCE_WINDOW_MINUTES = config('ALERT_COALESCE_WINDOW_MINUTES', default=30, cast=int)
+
+# Cache shared by every worker process. Consent flags and the wellness light
+# are invalidated by signals in whichever process made the change, so the
+# backend must be shared: Redis when REDIS_URL is set, otherwise the database
+# (create its table with `python manage.py createcachetable`).
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'lia_cache',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+
+# Timeout cap for entries in a per-process cache (e.g. LocMemCache), where
+# invalidation cannot reach the other workers (see lia_project.cache)
+LOCAL_CACHE_MAX_SECONDS = config('LOCAL_CACHE_MAX_SECONDS', default=5, cast=int)
+
+# Upper bound for the cached patient wellness status (entries also expire at midnight)
+WELLNESS_CACHE_SECONDS = config('WELLNESS_CACHE_SECONDS', default=3600, cast=int)
+# Entries kept in each process's local layer (kept for LOCAL_CACHE_MAX_SECONDS)
+WELLNESS_LOCAL_CACHE_SIZE = config('WELLNESS_LOCAL_CACHE_SIZE', default=10000, cast=int)
+
+# Consent flags cache: shared cache lifetime, and how long each process may
+# trust its local copy after another process changes consent
+CONSENT_CACHE_SECONDS = config('CONSENT_CACHE_SECONDS', default=300, cast=int)
+CONSENT_LOCAL_CACHE_SECONDS = config('CONSENT_LOCAL_CACHE_SECONDS', default=5, cast=int)
+CONSENT_LOCAL_CACHE_SIZE = config('CONSENT_LOCAL_CACHE_SIZE', default=10000, cast=int)
+
+# How often each worker checks for a newly activated chat lexicon version
+LEXICON_RELOAD_SECONDS = config('LEXICON_RELOAD_SECONDS', default=10, cast=int)
+
+# Request instrumentation (metrics app): measured URL namespaces, whether the
+# numbers are sent as response headers, and SQL query budgets per view name
+REQUEST_METRICS_NAMESPACES = [
+    'doctor', 'psychologist', 'patient', 'chatbot', 'clinical', 'psychosocial', 'api',
+]
+REQUEST_METRICS_HEADERS = config('REQUEST_METRICS_HEADERS', default=DEBUG, cast=bool)
+# Max SQL statements per request, checked by metrics/tests.py. Includes the
+# session read, the auth user and the session save (SESSION_SAVE_EVERY_REQUEST,
+# 3 statements inside a test transaction); DatabaseCache SQL is not counted.
+QUERY_BUDGETS = {
+    'doctor:dashboard': 7,
+    'psychologist:dashboard': 8,
+    'patient:dashboard': 11,
+    'chatbot:interface': 6,
+    'chatbot:history': 6,
+    'api:chat-list': 6,
+}
+
+# Clients allowed to read the local metrics endpoints without a staff login.
+# Only localhost in development: behind a reverse proxy on the same host every
+# request arrives from 127.0.0.1, so production lists the scraper explicitly.
+INTERNAL_IPS = config('INTERNAL_IPS', default='127.0.0.1' if DEBUG else '', cast=Csv())
+
+# Shared directory for Prometheus samples when several processes serve /metrics/
+# (gunicorn workers, outbox and email workers); empty = single-process registry.
+# Must be exported before prometheus_client is imported, hence set here.
+PROMETHEUS_MULTIPROC_DIR = config('PROMETHEUS_MULTIPROC_DIR', default='')
+if PROMETHEUS_MULTIPROC_DIR:
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', PROMETHEUS_MULTIPROC_DIR)
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
 # Security settings (uncomment in production)
 # SECURE_SSL_REDIRECT = True
 # SESSION_COOKIE_SECURE = True
@@ -180,17 +260,35 @@ SESSION_COOKIE_AGE = 86400  # 24 hours
 SESSION_SAVE_EVERY_REQUEST = True
 
 # Logging configuration
+# Records are queued in-process and appended by a background thread as JSON
+# lines to LOG_FILE (see lia_project/log.py). Every worker process appends to
+# the same file; rotate it with logrotate, not from Python.
+LOGS_DIR = BASE_DIR / 'logs'
+LOGS_DIR.mkdir(exist_ok=True)
+
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+LOG_FILE = config('LOG_FILE', default=str(LOGS_DIR / 'lia.log'))
+LOG_QUEUE_SIZE = config('LOG_QUEUE_SIZE', default=10000, cast=int)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'lia_project.log.JsonFormatter',
+        },
+    },
     'handlers': {
         'file': {
-            'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': BASE_DIR / 'logs' / 'lia.log',
+            'level': LOG_LEVEL,
+            '()': 'lia_project.log.QueuedFileHandler',
+            'formatter': 'json',
+            'filename': LOG_FILE,
+            'queue_size': LOG_QUEUE_SIZE,
         },
         'console': {
-            'level': 'DEBUG',
+            # Console writes are synchronous: keep them for development only
+            'level': 'DEBUG' if DEBUG else 'ERROR',
             'class': 'logging.StreamHandler',
         },
     },
@@ -202,17 +300,23 @@ LOGGING = {
         },
         'chatbot': {
             'handlers': ['file', 'console'],
-            'level': 'DEBUG',
+            'level': LOG_LEVEL,
             'propagate': False,
         },
         'clinical': {
             'handlers': ['file', 'console'],
-            'level': 'INFO',
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+        'psychosocial': {
+            'handlers': ['file', 'console'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+        'metrics': {
+            'handlers': ['file', 'console'],
+            'level': LOG_LEVEL,
             'propagate': False,
         },
     },
 }
-
-# Create logs directory if it doesn't exist
-LOGS_DIR = BASE_DIR / 'logs'
-LOGS_DIR.mkdir(exist_ok=True)
@@ -36,6 +36,9 @@ urlpatterns = [
     
     # REST API
     path('api/', include('api.urls')),
+    
+    # Local request metrics
+    path('metrics/', include('metrics.urls')),
 ]
 
 # Serve media files in development
@@ -0,0 +1,106 @@
+"""
+Prometheus metrics for chat, alerts, alert emails, check-ins and requests.
+
+Metrics are cheap prometheus_client counters/histograms updated in-process.
+Under gunicorn (and for the outbox/email workers) set PROMETHEUS_MULTIPROC_DIR:
+every process then writes its samples to mmap-backed files in that shared
+directory and /metrics/ aggregates them (see gunicorn.conf.py).
+
+Callers look metrics up on this module at call time (collectors.X), so
+disabled() can swap them out for code that must not be reported, such as
+the chat benchmark.
+"""
+import sys
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Histogram
+
+from .registry import QUERY_BUCKETS
+
+# NLP stages run in microseconds; requests and SMTP sends in milliseconds to seconds
+NLP_BUCKETS = (5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 5e-3, 0.025)
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+CHAT_MESSAGES = Counter(
+    'lia_chat_messages', 'Live chat messages processed, by detected risk level', ['risk_level']
+)
+NLP_STAGE_SECONDS = Histogram(
+    'lia_chat_nlp_stage_seconds', 'Chat NLP latency per stage', ['stage'], buckets=NLP_BUCKETS
+)
+# Children bound up front: the chat hot path skips the labels() lookup
+NLP_STAGES = {stage: NLP_STAGE_SECONDS.labels(stage) for stage in ('normalize', 'analysis', 'response')}
+CHAT_MESSAGES_BY_RISK = {
+    level: CHAT_MESSAGES.labels(level) for level in ('NONE', 'LOW', 'MEDIUM', 'HIGH', 'CRITICAL')
+}
+
+ALERTS_CREATED = Counter(
+    'lia_alerts_created', 'New alerts, by type and severity', ['alert_type', 'severity']
+)
+ALERTS_COALESCED = Counter(
+    'lia_alerts_coalesced', 'Repeated alerts folded into an open one', ['alert_type']
+)
+ALERTS_RESOLVED = Counter(
+    'lia_alerts_resolved', 'Alerts resolved, by severity', ['severity']
+)
+
+ALERT_EMAILS = Counter(
+    'lia_alert_emails', 'Alert emails by delivery outcome (failed = will be retried or gave up)', ['status']
+)
+ALERT_EMAIL_SEND_SECONDS = Histogram(
+    'lia_alert_email_send_seconds', 'SMTP send time per doctor email', buckets=SECONDS_BUCKETS
+)
+
+CHECKINS_COMPLETED = Counter(
+    'lia_checkins_completed', 'Check-ins completed, by type', ['checkin_type']
+)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'lia_http_request_seconds', 'Request latency per view', ['view'], buckets=SECONDS_BUCKETS
+)
+HTTP_REQUEST_QUERIES = Histogram(
+    'lia_http_request_queries', 'SQL queries per request, per view', ['view'], buckets=QUERY_BUCKETS
+)
+QUERY_BUDGET_EXCEEDED = Counter(
+    'lia_query_budget_exceeded', 'Requests over their QUERY_BUDGETS entry', ['view']
+)
+
+
+class NullMetric:
+    """Accepts the metric calls the app makes and records nothing."""
+    
+    def labels(self, *labelvalues, **labelkwargs):
+        return self
+    
+    def inc(self, amount=1):
+        pass
+    
+    def observe(self, amount):
+        pass
+
+
+@contextmanager
+def disabled():
+    """
+    Replace every metric of this module with a NullMetric for the duration.
+    
+    A separate CollectorRegistry is not enough: with PROMETHEUS_MULTIPROC_DIR
+    set, any metric writes its samples to the shared directory /metrics/
+    aggregates. Not thread-safe; meant for single-purpose processes.
+    """
+    module = sys.modules[__name__]
+    saved = {}
+    for name, value in vars(module).items():
+        if isinstance(value, (Counter, Histogram)):
+            saved[name] = value
+        elif isinstance(value, dict) and value and all(
+            isinstance(child, (Counter, Histogram)) for child in value.values()
+        ):
+            saved[name] = value
+    null = NullMetric()
+    try:
+        for name, value in saved.items():
+            setattr(module, name, {key: null for key in value} if isinstance(value, dict) else null)
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
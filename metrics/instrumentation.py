@@ -0,0 +1,176 @@
+"""
+Per-request performance counters.
+Collects SQL query count/time, template render time and cache hits for the
+request being served; see metrics.middleware.RequestMetricsMiddleware.
+
+SQL run by a database-backed cache (DatabaseCache) is counted in
+cache_queries, not query_count: budgets measure the view's own queries and
+must not depend on which CACHES backend is deployed.
+"""
+import time
+from contextvars import ContextVar
+
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template import TemplateDoesNotExist
+
+# SQL statements kept per request for budget failure messages
+MAX_RECORDED_QUERIES = 200
+
+# Cache methods whose SQL, if any, is attributed to the cache
+CACHE_METHODS = (
+    'add', 'set', 'set_many', 'touch', 'delete', 'delete_many',
+    'has_key', 'incr', 'decr', 'clear',
+)
+
+_current = ContextVar('request_stats', default=None)
+_MISSING = object()
+
+
+class RequestStats:
+    """Counters for a single request."""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_name = None
+        self.duration = 0.0
+        self.query_count = 0
+        self.db_time = 0.0
+        self.queries = []
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_queries = 0
+        self._template_depth = 0
+        self._cache_depth = 0
+    
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+    
+    def as_dict(self):
+        return {
+            'queries': self.query_count,
+            'db_ms': self.db_time * 1000,
+            'template_ms': self.template_time * 1000,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache_queries': self.cache_queries,
+            'total_ms': self.duration * 1000,
+        }
+
+
+def current_stats():
+    """Stats of the request being served in this context, or None."""
+    return _current.get()
+
+
+def start_request():
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def query_wrapper(execute, sql, params, many, context):
+    """
+    Execute wrapper counting queries and their time for the current request.
+    Costs one ContextVar read when no request is being measured.
+    """
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    if stats._cache_depth:
+        stats.cache_queries += 1
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.query_count += 1
+        stats.db_time += time.perf_counter() - start
+        if len(stats.queries) < MAX_RECORDED_QUERIES:
+            stats.queries.append(sql)
+
+
+def _cache_call(method):
+    """Wrap a cache method so the SQL it runs is counted as cache_queries."""
+    
+    def wrapper(*args, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            return method(*args, **kwargs)
+        stats._cache_depth += 1
+        try:
+            return method(*args, **kwargs)
+        finally:
+            stats._cache_depth -= 1
+    
+    return wrapper
+
+
+def instrument_cache(backend):
+    """
+    Count hits/misses of get()/get_many() on a cache backend instance and
+    attribute the SQL of every cache call to cache_queries.
+    Backends are per thread, so this patches only the calling thread's instance.
+    """
+    if getattr(backend, '_metrics_instrumented', False):
+        return
+    get = _cache_call(backend.get)
+    get_many = _cache_call(backend.get_many)
+    
+    def counted_get(key, default=None, version=None):
+        value = get(key, _MISSING, version=version)
+        stats = _current.get()
+        if stats is not None:
+            if value is _MISSING:
+                stats.cache_misses += 1
+            else:
+                stats.cache_hits += 1
+        return default if value is _MISSING else value
+    
+    def counted_get_many(keys, version=None):
+        keys = list(keys)
+        found = get_many(keys, version=version)
+        stats = _current.get()
+        if stats is not None:
+            stats.cache_hits += len(found)
+            stats.cache_misses += len(keys) - len(found)
+        return found
+    
+    backend.get = counted_get
+    backend.get_many = counted_get_many
+    for name in CACHE_METHODS:
+        setattr(backend, name, _cache_call(getattr(backend, name)))
+    backend._metrics_instrumented = True
+
+
+class TimedTemplate(Template):
+    """Template whose top-level renders are added to the request's template time."""
+    
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return super().render(context, request)
+        stats._template_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats._template_depth -= 1
+            if not stats._template_depth:
+                stats.template_time += time.perf_counter() - start
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend that times renders (TEMPLATES['BACKEND'])."""
+    
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+    
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,108 @@
+"""
+Request instrumentation middleware.
+"""
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+
+from . import collectors, instrumentation
+from .registry import request_metrics
+
+logger = logging.getLogger('metrics')
+
+
+class RequestMetricsMiddleware:
+    """
+    Measures SQL queries, DB time, template time and cache hits per request.
+
+    Requests to views in REQUEST_METRICS_NAMESPACES are aggregated per view
+    name (metrics.registry and the Prometheus histograms in
+    metrics.collectors), checked against QUERY_BUDGETS and, with
+    REQUEST_METRICS_HEADERS on, reported as X-* and Server-Timing headers.
+    Goes first in MIDDLEWARE so session and auth queries are counted too;
+    SQL run by a database cache backend is reported apart (cache_queries).
+    
+    Works in sync and async chains; queries are counted by the wrapper
+    metrics.signals installs on every connection.
+    """
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.namespaces = set(settings.REQUEST_METRICS_NAMESPACES)
+        self.headers = settings.REQUEST_METRICS_HEADERS
+        self.budgets = settings.QUERY_BUDGETS
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            instrumentation.end_request(token)
+        return self._finish(request, response, stats)
+    
+    async def __acall__(self, request):
+        stats, token = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            instrumentation.end_request(token)
+        return self._finish(request, response, stats)
+    
+    def _start(self):
+        for alias in settings.CACHES:
+            instrumentation.instrument_cache(caches[alias])
+        return instrumentation.start_request()
+    
+    def _finish(self, request, response, stats):
+        stats.finish()
+        
+        # Kept on the response for metrics.testing budget assertions
+        response.request_stats = stats
+        
+        match = request.resolver_match
+        if match is not None:
+            stats.view_name = match.view_name
+        if match is None or not match.namespaces or match.namespaces[0] not in self.namespaces:
+            return response
+        
+        view_name = match.view_name
+        budget = self.budgets.get(view_name)
+        over_budget = budget is not None and stats.query_count > budget
+        if over_budget:
+            logger.warning(
+                "Query budget exceeded - View: %s, Queries: %d/%d, Path: %s",
+                view_name, stats.query_count, budget, request.path
+            )
+            collectors.QUERY_BUDGET_EXCEEDED.labels(view_name).inc()
+        request_metrics.record(view_name, stats, over_budget)
+        collectors.HTTP_REQUEST_SECONDS.labels(view_name).observe(stats.duration)
+        collectors.HTTP_REQUEST_QUERIES.labels(view_name).observe(stats.query_count)
+        
+        if self.headers:
+            self._add_headers(response, stats, budget)
+        
+        return response
+    
+    def _add_headers(self, response, stats, budget):
+        response['X-DB-Queries'] = str(stats.query_count)
+        response['X-DB-Time-Ms'] = f'{stats.db_time * 1000:.1f}'
+        response['X-Template-Time-Ms'] = f'{stats.template_time * 1000:.1f}'
+        response['X-Cache-Hits'] = str(stats.cache_hits)
+        response['X-Cache-Misses'] = str(stats.cache_misses)
+        response['X-Cache-Queries'] = str(stats.cache_queries)
+        if budget is not None:
+            response['X-Query-Budget'] = str(budget)
+        response['Server-Timing'] = (
+            f'db;dur={stats.db_time * 1000:.1f};desc="{stats.query_count} queries", '
+            f'tpl;dur={stats.template_time * 1000:.1f}, '
+            f'total;dur={stats.duration * 1000:.1f}'
+        )
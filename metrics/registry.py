@@ -0,0 +1,97 @@
+"""
+In-process aggregation of request metrics into per-view histograms.
+"""
+import threading
+from bisect import bisect_left
+
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+MS_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus style: value <= bound)."""
+    
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+    
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+    
+    def as_dict(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'max': self.max,
+            'buckets': buckets,
+        }
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_ms = Histogram(MS_BUCKETS)
+        self.template_ms = Histogram(MS_BUCKETS)
+        self.total_ms = Histogram(MS_BUCKETS)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_queries = 0
+        self.over_budget = 0
+    
+    def as_dict(self):
+        return {
+            'requests': self.total_ms.count,
+            'queries': self.queries.as_dict(),
+            'db_ms': self.db_ms.as_dict(),
+            'template_ms': self.template_ms.as_dict(),
+            'total_ms': self.total_ms.as_dict(),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache_queries': self.cache_queries,
+            'over_budget': self.over_budget,
+        }
+
+
+class RequestMetricsRegistry:
+    """Thread-safe per-view aggregation for this process."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+    
+    def record(self, view_name, stats, over_budget=False):
+        with self._lock:
+            metrics = self._views.get(view_name)
+            if metrics is None:
+                metrics = self._views[view_name] = ViewMetrics()
+            metrics.queries.observe(stats.query_count)
+            metrics.db_ms.observe(stats.db_time * 1000)
+            metrics.template_ms.observe(stats.template_time * 1000)
+            metrics.total_ms.observe(stats.duration * 1000)
+            metrics.cache_hits += stats.cache_hits
+            metrics.cache_misses += stats.cache_misses
+            metrics.cache_queries += stats.cache_queries
+            metrics.over_budget += int(over_budget)
+    
+    def snapshot(self):
+        with self._lock:
+            return {view: metrics.as_dict() for view, metrics in sorted(self._views.items())}
+    
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+request_metrics = RequestMetricsRegistry()
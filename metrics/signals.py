@@ -0,0 +1,20 @@
+"""
+Signal handlers for the metrics app.
+"""
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .instrumentation import query_wrapper
+
+
+@receiver(connection_created)
+def install_query_wrapper(sender, connection, **kwargs):
+    """
+    Keep the query counter on every database connection.
+
+    Installed per connection rather than per request: under ASGI an async
+    view's queries run on sync_to_async threads with their own connections,
+    and the request's stats reach them through the copied context.
+    """
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
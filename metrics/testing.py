@@ -0,0 +1,47 @@
+"""
+Test helpers for per-view query budgets.
+
+Responses served through RequestMetricsMiddleware carry their counters in
+`response.request_stats`, so budgets can be asserted on test client responses:
+
+    from django.test import TestCase
+    from metrics.testing import QueryBudgetMixin
+
+    class DashboardBudgetTests(QueryBudgetMixin, TestCase):
+        def test_doctor_dashboard(self):
+            self.client.force_login(self.doctor)
+            response = self.client.get(reverse('doctor:dashboard'))
+            self.assertQueryBudget(response)      # settings.QUERY_BUDGETS['doctor:dashboard']
+            self.assertQueryBudget(response, 3)   # explicit budget
+"""
+from django.conf import settings
+
+
+def check_query_budget(response, max_queries=None):
+    """
+    Raise AssertionError if the request behind `response` ran more than
+    `max_queries` SQL queries (default: its view's QUERY_BUDGETS entry).
+    Returns the number of queries.
+    """
+    stats = getattr(response, 'request_stats', None)
+    if stats is None:
+        raise AssertionError('Response has no request_stats; is RequestMetricsMiddleware installed?')
+    
+    if max_queries is None:
+        if stats.view_name not in settings.QUERY_BUDGETS:
+            raise AssertionError(f'No QUERY_BUDGETS entry for view {stats.view_name!r}')
+        max_queries = settings.QUERY_BUDGETS[stats.view_name]
+    
+    if stats.query_count > max_queries:
+        listing = '\n'.join(f'{i}. {sql}' for i, sql in enumerate(stats.queries, start=1))
+        raise AssertionError(
+            f'{stats.query_count} queries executed, budget is {max_queries}:\n{listing}'
+        )
+    return stats.query_count
+
+
+class QueryBudgetMixin:
+    """TestCase mixin providing assertQueryBudget()."""
+    
+    def assertQueryBudget(self, response, max_queries=None):
+        return check_query_budget(response, max_queries)
@@ -0,0 +1,173 @@
+"""
+Tests for the metrics module: per-view query budgets, access to the metrics
+endpoints and keeping benchmark traffic out of the Prometheus metrics.
+
+Budgets count every query of the request, session and auth lookups
+included; SQL run by the DatabaseCache is reported apart. Each view is
+checked on a cold cache and again once its cached data is warm.
+"""
+from prometheus_client import REGISTRY
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from chatbot import benchmark
+from chatbot.services import chat_outbox_service, chat_service
+from patient.services import wellness_service
+from psychosocial.models import ConsentRecord, EmotionLog
+from users.models import CustomUser, Profile
+
+from . import collectors
+from .testing import QueryBudgetMixin
+
+# The doctor and psychologist dashboards ship without templates; these touch
+# the same context the real pages would, lazy querysets included
+DASHBOARD_TEMPLATES = {
+    'doctor/dashboard.html': (
+        '{% for p in assigned_patients %}{{ p.username }} {{ p.active_alerts_count }}{% endfor %}'
+        '{% for a in recent_alerts %}{{ a.patient.username }} {{ a.severity }}{% endfor %}'
+        '{{ total_patients }} {{ critical_alerts }}'
+    ),
+    'psychologist/dashboard.html': (
+        '{% for row in patient_data %}{{ row.patient.username }} {{ row.avg_mood }} {{ row.trend }}{% endfor %}'
+        '{{ total_patients }} {{ patients_declining }}'
+    ),
+}
+TEMPLATES = [{
+    **settings.TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **settings.TEMPLATES[0]['OPTIONS'],
+        'loaders': [
+            ('django.template.loaders.locmem.Loader', DASHBOARD_TEMPLATES),
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ],
+    },
+}]
+
+
+@override_settings(TEMPLATES=TEMPLATES)
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = CustomUser.objects.create_user('medico', password='x', role='DOCTOR')
+        cls.psychologist = CustomUser.objects.create_user('psicologa', password='x', role='PSYCHOLOGIST')
+        cls.patients = []
+        for i in range(3):
+            patient = CustomUser.objects.create_user(f'paciente{i}', password='x', role='PATIENT')
+            Profile.objects.create(
+                user=patient, assigned_doctor=cls.doctor, assigned_psychologist=cls.psychologist
+            )
+            ConsentRecord.objects.create(
+                patient=patient, can_share_with_doctor=True, can_share_with_psychologist=True
+            )
+            for mood in (3, 5, 7):
+                EmotionLog.objects.create(
+                    patient=patient, mood_score=mood, anxiety_score=5,
+                    energy_score=5, pain_emotional_impact=2,
+                )
+            for message in ('hola', 'quiero morir', 'me duele la cabeza'):
+                result = chat_service.process_message(message, user=patient)
+                chat_outbox_service.record_interaction(patient, message, result)
+            cls.patients.append(patient)
+        chat_outbox_service.process_pending()
+        cls.patient = cls.patients[0]
+
+    def setUp(self):
+        cache.clear()
+        wellness_service._local.clear()
+
+    def get_twice(self, user, view_name):
+        """Request a view on a cold cache and again on a warm one."""
+        self.client.force_login(user)
+        url = reverse(view_name)
+        cold = self.client.get(url)
+        warm = self.client.get(url)
+        self.assertEqual((cold.status_code, warm.status_code), (200, 200))
+        return cold, warm
+
+    def assertWithinBudget(self, user, view_name):
+        for response in self.get_twice(user, view_name):
+            self.assertQueryBudget(response)
+
+    def test_doctor_dashboard(self):
+        self.assertWithinBudget(self.doctor, 'doctor:dashboard')
+
+    def test_psychologist_dashboard(self):
+        self.assertWithinBudget(self.psychologist, 'psychologist:dashboard')
+
+    def test_patient_dashboard(self):
+        self.assertWithinBudget(self.patient, 'patient:dashboard')
+
+    def test_cache_sql_is_kept_out_of_the_budget(self):
+        cold, warm = self.get_twice(self.patient, 'patient:dashboard')
+
+        # Cold: wellness status read and written; warm: served by the process-local copy
+        self.assertGreater(cold.request_stats.cache_queries, warm.request_stats.cache_queries)
+        for response in (cold, warm):
+            self.assertFalse([sql for sql in response.request_stats.queries if 'lia_cache' in sql])
+
+    def test_chat_interface(self):
+        self.assertWithinBudget(self.patient, 'chatbot:interface')
+
+    def test_chat_history(self):
+        self.assertWithinBudget(self.patient, 'chatbot:history')
+
+    def test_api_chat_list(self):
+        self.assertWithinBudget(self.patient, 'api:chat-list')
+
+
+class MetricsAccessTests(TestCase):
+
+    URLS = ('metrics:prometheus', 'metrics:requests')
+
+    def assertStatus(self, status, **extra):
+        for name in self.URLS:
+            with self.subTest(url=name):
+                self.assertEqual(self.client.get(reverse(name), **extra).status_code, status)
+
+    @override_settings(INTERNAL_IPS=[])
+    def test_proxied_requests_from_localhost_are_refused(self):
+        # A reverse proxy on the same host makes every client 127.0.0.1
+        self.assertStatus(403, REMOTE_ADDR='127.0.0.1')
+
+    @override_settings(INTERNAL_IPS=['10.0.0.5'])
+    def test_listed_scraper_is_allowed(self):
+        self.assertStatus(200, REMOTE_ADDR='10.0.0.5')
+        self.assertStatus(403, REMOTE_ADDR='127.0.0.1')
+
+    @override_settings(INTERNAL_IPS=[])
+    def test_staff_is_allowed(self):
+        self.client.force_login(CustomUser.objects.create_user('admin', password='x', is_staff=True))
+        self.assertStatus(200)
+
+    @override_settings(INTERNAL_IPS=[])
+    def test_other_users_are_refused(self):
+        self.client.force_login(CustomUser.objects.create_user('medico', password='x', role='DOCTOR'))
+        self.assertStatus(403)
+
+
+class DisabledCollectorsTests(TestCase):
+
+    def chat_messages(self, risk_level):
+        return REGISTRY.get_sample_value('lia_chat_messages_total', {'risk_level': risk_level}) or 0
+
+    def test_live_chat_is_counted(self):
+        before = self.chat_messages('CRITICAL')
+        chat_service.process_message('quiero morir')
+        self.assertEqual(self.chat_messages('CRITICAL'), before + 1)
+
+    def test_benchmark_leaves_metrics_untouched(self):
+        corpus = [{'family': 'crisis', 'text': 'quiero morir'}] * 5
+        before = self.chat_messages('CRITICAL')
+
+        benchmark.benchmark_throughput(chat_service, corpus, repeat=1)
+        benchmark.benchmark_end_to_end(corpus, requests=2)
+
+        self.assertEqual(self.chat_messages('CRITICAL'), before)
+        # Restored afterwards
+        self.assertNotIsInstance(collectors.CHAT_MESSAGES_BY_RISK['CRITICAL'], collectors.NullMetric)
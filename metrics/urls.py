@@ -0,0 +1,12 @@
+"""
+URL configuration for metrics endpoints.
+"""
+from django.urls import path
+from . import views
+
+app_name = 'metrics'
+
+urlpatterns = [
+    path('', views.prometheus_metrics, name='prometheus'),
+    path('requests/', views.request_metrics_view, name='requests'),
+]
@@ -0,0 +1,44 @@
+"""
+Local metrics endpoints.
+"""
+import os
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.views.decorators.http import require_GET
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+
+from .registry import request_metrics
+
+
+def _is_local(request):
+    """Staff users, or requests from INTERNAL_IPS."""
+    return request.user.is_staff or request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS
+
+
+@require_GET
+def request_metrics_view(request):
+    """Per-view query/latency histograms aggregated by this process."""
+    if not _is_local(request):
+        return HttpResponseForbidden()
+    
+    return JsonResponse({
+        'pid': os.getpid(),
+        'budgets': settings.QUERY_BUDGETS,
+        'views': request_metrics.snapshot(),
+    })
+
+
+@require_GET
+def prometheus_metrics(request):
+    """Prometheus text exposition; aggregates all processes in multiprocess mode."""
+    if not _is_local(request):
+        return HttpResponseForbidden()
+    
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -5,3 +5,6 @@ class PatientConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'patient'
     verbose_name = 'Panel de Paciente'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,111 @@
+"""
+Services for patient module.
+Caches the dashboard wellness indicator per patient.
+"""
+import time as clock
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from lia_project.cache import shared_timeout
+
+
+class WellnessService:
+    """
+    Computes the GREEN/YELLOW/RED wellness traffic light and caches it.
+    
+    Entries are invalidated when an EmotionLog, SymptomReport or Alert of
+    the patient is written (see patient.signals) and expire at local
+    midnight, when the 3-day severe-symptom window moves.
+    
+    Invalidation only reaches other workers through a shared CACHES backend
+    (Redis or DatabaseCache); with a per-process cache the timeout is capped
+    at LOCAL_CACHE_MAX_SECONDS, see lia_project.cache. A process-local layer
+    in front of the shared cache, kept for LOCAL_CACHE_MAX_SECONDS, saves the
+    shared-cache round trip (a SELECT with DatabaseCache) on reloads.
+    """
+    
+    CACHE_KEY = 'wellness_status:{patient_id}'
+    SEVERE_SYMPTOM_DAYS = 3
+    
+    def __init__(self):
+        # Process-local layer in front of the shared cache: {patient_id: (expires_at, status)}
+        self._local = {}
+    
+    def get_status(self, patient):
+        """Cached wellness status; zero queries while the local copy is fresh."""
+        now = clock.monotonic()
+        entry = self._local.get(patient.pk)
+        if entry and entry[0] > now:
+            return entry[1]
+        
+        key = self.CACHE_KEY.format(patient_id=patient.pk)
+        status = cache.get(key)
+        if status is None:
+            status = self.compute_status(patient)
+            cache.set(key, status, shared_timeout(self._timeout()))
+        
+        if len(self._local) > settings.WELLNESS_LOCAL_CACHE_SIZE:
+            self._local.clear()
+        self._local[patient.pk] = (now + settings.LOCAL_CACHE_MAX_SECONDS, status)
+        return status
+    
+    def compute_status(self, patient):
+        """
+        Calculate overall wellness status: GREEN, YELLOW, or RED.
+        """
+        from clinical.models import PatientAlertCounter
+        from clinical.services import symptom_rollup_service
+        from psychosocial.models import EmotionLog
+        
+        # Get most recent emotion log
+        recent_emotion = EmotionLog.objects.filter(
+            patient=patient
+        ).order_by('-timestamp').first()
+        
+        # Get recent severe symptoms
+        severe_symptoms = symptom_rollup_service.days_window_stats(
+            patient, days=self.SEVERE_SYMPTOM_DAYS
+        )['severe_count']
+        
+        # Get unresolved HIGH/CRITICAL alerts from the maintained counters
+        counts = PatientAlertCounter.objects.filter(
+            patient=patient
+        ).values_list('critical_count', 'high_count').first()
+        active_alerts = sum(counts) if counts else 0
+        
+        # Determine status
+        if active_alerts > 0 or severe_symptoms > 0:
+            return 'RED'
+        elif recent_emotion and recent_emotion.needs_attention:
+            return 'YELLOW'
+        elif recent_emotion and recent_emotion.overall_wellbeing >= 6:
+            return 'GREEN'
+        else:
+            return 'YELLOW'
+    
+    def invalidate(self, patient_id):
+        """
+        Drop the cached status once the current transaction commits.
+        Other processes drop their local copy within LOCAL_CACHE_MAX_SECONDS.
+        """
+        key = self.CACHE_KEY.format(patient_id=patient_id)
+        
+        def forget():
+            self._local.pop(patient_id, None)
+            cache.delete(key)
+        
+        transaction.on_commit(forget)
+    
+    def _timeout(self):
+        """Seconds until the next local midnight, capped by WELLNESS_CACHE_SECONDS."""
+        now = timezone.localtime()
+        midnight = timezone.make_aware(datetime.combine(now.date() + timedelta(days=1), time.min))
+        return max(1, min(settings.WELLNESS_CACHE_SECONDS, int((midnight - now).total_seconds())))
+
+
+# Singleton instance
+wellness_service = WellnessService()
@@ -0,0 +1,23 @@
+"""
+Signal handlers for patient module.
+Invalidate the cached wellness status when its inputs change.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from clinical.models import Alert, SymptomReport
+from psychosocial.models import EmotionLog
+from .services import wellness_service
+
+
+@receiver(post_save, sender=EmotionLog)
+@receiver(post_save, sender=SymptomReport)
+@receiver(post_save, sender=Alert)
+@receiver(post_delete, sender=EmotionLog)
+@receiver(post_delete, sender=SymptomReport)
+@receiver(post_delete, sender=Alert)
+def invalidate_wellness_status(sender, instance, raw=False, **kwargs):
+    """Alert creation, coalescing and resolution all go through save()."""
+    if raw:
+        return
+    wellness_service.invalidate(instance.patient_id)
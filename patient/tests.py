@@ -0,0 +1,89 @@
+"""
+Tests for the patient module: the cached wellness status.
+"""
+import time as clock
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from clinical.services import alert_service
+from psychosocial.models import EmotionLog
+from users.models import CustomUser
+
+from .services import WellnessService, wellness_service
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class WellnessStatusCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        wellness_service._local.clear()
+        self.patient = CustomUser.objects.create_user('paciente', password='x', role='PATIENT')
+        self.doctor = CustomUser.objects.create_user('medico', password='x', role='DOCTOR')
+
+    def log_emotion(self, mood, anxiety, energy):
+        with self.captureOnCommitCallbacks(execute=True):
+            return EmotionLog.objects.create(
+                patient=self.patient, mood_score=mood, anxiety_score=anxiety,
+                energy_score=energy, pain_emotional_impact=1,
+            )
+
+    def test_status_is_cached_after_the_first_lookup(self):
+        self.log_emotion(8, 2, 8)
+        self.assertEqual(wellness_service.get_status(self.patient), 'GREEN')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(wellness_service.get_status(self.patient), 'GREEN')
+
+        # Past the process-local layer, the shared cache answers
+        wellness_service._local.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(wellness_service.get_status(self.patient), 'GREEN')
+        self.assertEqual([q['sql'] for q in queries if 'lia_cache' not in q['sql']], [])
+
+    def test_local_copy_expires_after_local_cache_max_seconds(self):
+        self.log_emotion(8, 2, 8)
+        other_worker = WellnessService()
+        self.assertEqual(other_worker.get_status(self.patient), 'GREEN')
+        self.log_emotion(2, 9, 2)
+
+        # Within the window the other worker still serves its local copy
+        self.assertEqual(other_worker.get_status(self.patient), 'GREEN')
+        with mock.patch('patient.services.clock.monotonic', return_value=clock.monotonic() + 6):
+            self.assertEqual(other_worker.get_status(self.patient), 'YELLOW')
+
+    @override_settings(LOCAL_CACHE_MAX_SECONDS=0)
+    def test_new_emotion_log_invalidates_for_every_worker(self):
+        self.log_emotion(8, 2, 8)
+        other_worker = WellnessService()
+        self.assertEqual(other_worker.get_status(self.patient), 'GREEN')
+
+        self.log_emotion(2, 9, 2)
+
+        self.assertEqual(other_worker.get_status(self.patient), 'YELLOW')
+
+    def test_alert_creation_and_resolution_invalidate(self):
+        self.log_emotion(8, 2, 8)
+        self.assertEqual(wellness_service.get_status(self.patient), 'GREEN')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            alert, _ = alert_service.record_alert(
+                self.patient, 'EMOTION_CRISIS', 'CRITICAL', 'Crisis', 'Contactar'
+            )
+        self.assertEqual(wellness_service.get_status(self.patient), 'RED')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            alert_service.resolve_alert(alert, self.doctor, 'Contactada')
+        self.assertEqual(wellness_service.get_status(self.patient), 'GREEN')
+
+    @override_settings(CACHES=LOCMEM, LOCAL_CACHE_MAX_SECONDS=5, WELLNESS_CACHE_SECONDS=3600)
+    def test_process_local_backend_caps_the_entry_lifetime(self):
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            wellness_service.get_status(self.patient)
+
+        self.assertLessEqual(cache_set.call_args.args[2], 5)
@@ -3,12 +3,13 @@ Views for patient dashboard.
 """
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from datetime import date, timedelta
+from datetime import date
 
 from users.decorators import patient_only
-from clinical.models import SymptomReport, Alert
+from clinical.models import SymptomReport
 from psychosocial.models import EmotionLog, Recommendation, CheckIn
 from chatbot.models import ChatInteraction
+from .services import wellness_service
 
 
 @login_required
@@ -40,7 +41,7 @@ def dashboard(request):
     ).order_by('-timestamp')[:3]
     
     # Wellness indicator (traffic light)
-    wellness_status = _calculate_wellness_status(patient)
+    wellness_status = wellness_service.get_status(patient)
     
     # Check if today's check-in is done
     today_checkin = CheckIn.objects.filter(
@@ -63,36 +64,3 @@ def dashboard(request):
     
     return render(request, 'patient/dashboard.html', context)
 
-
-def _calculate_wellness_status(patient):
-    """
-    Calculate overall wellness status: GREEN, YELLOW, or RED.
-    """
-    # Get most recent emotion log
-    recent_emotion = EmotionLog.objects.filter(
-        patient=patient
-    ).order_by('-timestamp').first()
-    
-    # Get recent severe symptoms
-    severe_symptoms = SymptomReport.objects.filter(
-        patient=patient,
-        intensity__gte=8,
-        timestamp__gte=date.today() - timedelta(days=3)
-    ).count()
-    
-    # Get unresolved alerts
-    active_alerts = Alert.objects.filter(
-        patient=patient,
-        is_resolved=False,
-        severity__in=['HIGH', 'CRITICAL']
-    ).count()
-    
-    # Determine status
-    if active_alerts > 0 or severe_symptoms > 0:
-        return 'RED'
-    elif recent_emotion and recent_emotion.needs_attention:
-        return 'YELLOW'
-    elif recent_emotion and recent_emotion.overall_wellbeing >= 6:
-        return 'GREEN'
-    else:
-        return 'YELLOW'
@@ -3,8 +3,6 @@ Views for psychologist dashboard.
 """
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.db.models import Avg
-from datetime import date, timedelta
 
 from users.decorators import psychologist_only
 from users.models import CustomUser
@@ -21,38 +19,29 @@ def dashboard(request):
     psychologist = request.user
     
     # Get assigned patients
-    assigned_patients = CustomUser.objects.filter(
+    assigned_patients = list(CustomUser.objects.filter(
         profile__assigned_psychologist=psychologist,
         role='PATIENT'
+    ))
+    
+    # Consent and metrics for the whole caseload in a constant number of queries
+    access = consent_service.can_access_many(assigned_patients, psychologist, 'emotional')
+    summaries = emotion_service.analyze_trends(
+        [p for p in assigned_patients if access[p.pk]],
+        days=7
     )
     
     # Prepare patient data with metrics
     patient_data = []
     for patient in assigned_patients:
-        # Check consent
-        can_access = consent_service.can_access_data(patient, psychologist, 'emotional')
-        
-        if can_access:
-            # Get recent averages
-            recent_logs = EmotionLog.objects.filter(
-                patient=patient,
-                timestamp__gte=date.today() - timedelta(days=7)
-            )
-            
-            avg_scores = recent_logs.aggregate(
-                avg_mood=Avg('mood_score'),
-                avg_anxiety=Avg('anxiety_score'),
-                avg_energy=Avg('energy_score')
-            )
-            
-            trend = emotion_service.analyze_trend(patient, days=7)
-            
+        if access[patient.pk]:
+            summary = summaries[patient.pk]
             patient_data.append({
                 'patient': patient,
-                'avg_mood': avg_scores['avg_mood'] or 0,
-                'avg_anxiety': avg_scores['avg_anxiety'] or 0,
-                'avg_energy': avg_scores['avg_energy'] or 0,
-                'trend': trend,
+                'avg_mood': summary['avg_mood'] or 0,
+                'avg_anxiety': summary['avg_anxiety'] or 0,
+                'avg_energy': summary['avg_energy'] or 0,
+                'trend': summary['trend'],
                 'can_access': True
             })
         else:
@@ -62,7 +51,7 @@ def dashboard(request):
             })
     
     # Statistics
-    total_patients = assigned_patients.count()
+    total_patients = len(assigned_patients)
     patients_with_access = sum(1 for p in patient_data if p.get('can_access'))
     patients_declining = sum(1 for p in patient_data if p.get('trend') == 'DECLINING')
     
@@ -100,7 +89,7 @@ def patient_emotional_detail(request, patient_id):
         return redirect('psychologist:dashboard')
     
     # Get emotion logs for charts
-    emotion_logs = EmotionLog.objects.filter(
+    emotion_logs = EmotionLog.objects.visible_to(psychologist).filter(
         patient=patient
     ).order_by('-timestamp')[:30]
     
@@ -3,7 +3,7 @@ Admin configuration for psychosocial app.
 """
 from django.contrib import admin
 from simple_history.admin import SimpleHistoryAdmin
-from .models import EmotionLog, CheckIn, Recommendation, ConsentRecord
+from .models import EmotionLog, EmotionDailyRollup, CheckIn, Recommendation, ConsentRecord
 
 
 @admin.register(EmotionLog)
@@ -20,6 +20,15 @@ class EmotionLogAdmin(SimpleHistoryAdmin):
     needs_attention.boolean = True
 
 
+@admin.register(EmotionDailyRollup)
+class EmotionDailyRollupAdmin(admin.ModelAdmin):
+    """Admin for daily emotion rollups (derived data)."""
+    
+    list_display = ('patient', 'day', 'log_count', 'min_mood', 'max_mood', 'min_wellbeing', 'max_wellbeing')
+    list_filter = ('day',)
+    search_fields = ('patient__username',)
+
+
 @admin.register(CheckIn)
 class CheckInAdmin(admin.ModelAdmin):
     """Admin for check-ins."""
@@ -5,3 +5,6 @@ class PsychosocialConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'psychosocial'
     verbose_name = 'Módulo Psicosocial'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,22 @@
+"""
+Recompute daily emotion rollups from EmotionLog.
+
+Usage:
+    python manage.py rebuild_emotion_rollups
+    python manage.py rebuild_emotion_rollups --patient 42 --patient 43
+"""
+from django.core.management.base import BaseCommand
+
+from psychosocial.services import emotion_rollup_service
+
+
+class Command(BaseCommand):
+    help = 'Rebuild EmotionDailyRollup rows from raw EmotionLog data.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patient', type=int, action='append', dest='patients',
+                            help='Only rebuild this patient id (repeatable).')
+
+    def handle(self, *args, **options):
+        rows = emotion_rollup_service.rebuild(patient_ids=options['patients'])
+        self.stdout.write(self.style.SUCCESS(f'{rows} daily emotion rollups rebuilt.'))
@@ -0,0 +1,86 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, F, FloatField, Max, Min, Sum
+from django.db.models.functions import Cast, Coalesce, TruncDate
+from django.utils import timezone
+
+
+def populate_rollups(apps, schema_editor):
+    EmotionLog = apps.get_model('psychosocial', 'EmotionLog')
+    EmotionDailyRollup = apps.get_model('psychosocial', 'EmotionDailyRollup')
+    wellbeing = Cast(F('mood_score') + F('energy_score') + 11 - F('anxiety_score'), FloatField()) / 3
+    rows = (
+        EmotionLog.objects.order_by()
+        .annotate(day=TruncDate('timestamp', tzinfo=timezone.get_current_timezone()))
+        .values('patient_id', 'day')
+        .annotate(
+            log_count=Count('id'),
+            sum_mood=Sum('mood_score'),
+            sum_anxiety=Sum('anxiety_score'),
+            sum_energy=Sum('energy_score'),
+            pain_count=Count('pain_emotional_impact'),
+            sum_pain_impact=Coalesce(Sum('pain_emotional_impact'), 0),
+            min_mood=Min('mood_score'),
+            max_mood=Max('mood_score'),
+            min_anxiety=Min('anxiety_score'),
+            max_anxiety=Max('anxiety_score'),
+            min_energy=Min('energy_score'),
+            max_energy=Max('energy_score'),
+            min_pain_impact=Min('pain_emotional_impact'),
+            max_pain_impact=Max('pain_emotional_impact'),
+            min_wellbeing=Min(wellbeing),
+            max_wellbeing=Max(wellbeing),
+        )
+    )
+    EmotionDailyRollup.objects.bulk_create(
+        [EmotionDailyRollup(**row) for row in rows.iterator(chunk_size=2000)],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('psychosocial', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmotionDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Día')),
+                ('log_count', models.IntegerField(default=0, verbose_name='Registros')),
+                ('sum_mood', models.IntegerField(default=0, verbose_name='Suma ánimo')),
+                ('sum_anxiety', models.IntegerField(default=0, verbose_name='Suma ansiedad')),
+                ('sum_energy', models.IntegerField(default=0, verbose_name='Suma energía')),
+                ('pain_count', models.IntegerField(default=0, verbose_name='Registros con dolor')),
+                ('sum_pain_impact', models.IntegerField(default=0, verbose_name='Suma impacto del dolor')),
+                ('min_mood', models.IntegerField(null=True, verbose_name='Ánimo mínimo')),
+                ('max_mood', models.IntegerField(null=True, verbose_name='Ánimo máximo')),
+                ('min_anxiety', models.IntegerField(null=True, verbose_name='Ansiedad mínima')),
+                ('max_anxiety', models.IntegerField(null=True, verbose_name='Ansiedad máxima')),
+                ('min_energy', models.IntegerField(null=True, verbose_name='Energía mínima')),
+                ('max_energy', models.IntegerField(null=True, verbose_name='Energía máxima')),
+                ('min_pain_impact', models.IntegerField(null=True, verbose_name='Impacto del dolor mínimo')),
+                ('max_pain_impact', models.IntegerField(null=True, verbose_name='Impacto del dolor máximo')),
+                ('min_wellbeing', models.FloatField(null=True, verbose_name='Bienestar mínimo')),
+                ('max_wellbeing', models.FloatField(null=True, verbose_name='Bienestar máximo')),
+                ('patient', models.ForeignKey(limit_choices_to={'role': 'PATIENT'}, on_delete=django.db.models.deletion.CASCADE, related_name='emotion_rollups', to=settings.AUTH_USER_MODEL, verbose_name='Paciente')),
+            ],
+            options={
+                'verbose_name': 'Resumen Emocional Diario',
+                'verbose_name_plural': 'Resúmenes Emocionales Diarios',
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='emotiondailyrollup',
+            constraint=models.UniqueConstraint(fields=('patient', 'day'), name='unique_emotion_rollup_per_day'),
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
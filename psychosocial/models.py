@@ -7,6 +7,53 @@ from django.conf import settings
 # from simple_history.models import HistoricalRecords  # Temporarily disabled
 
 
+class ConsentQuerySet(models.QuerySet):
+    """
+    Base QuerySet for patient data guarded by ConsentRecord.
+    visible_to() pushes the consent check into the query as a join,
+    so lists can be filtered and paginated in SQL.
+    """
+    # Consent field that grants access, by (requester role, data type)
+    CONSENT_FIELDS = {
+        ('DOCTOR', 'clinical'): 'can_share_with_doctor',
+        ('DOCTOR', 'chat'): 'can_share_chat_with_doctor',
+        ('PSYCHOLOGIST', 'emotional'): 'can_share_with_psychologist',
+    }
+    
+    # Profile field linking a patient to the requester's role
+    ASSIGNMENT_FIELDS = {
+        'DOCTOR': 'assigned_doctor',
+        'PSYCHOLOGIST': 'assigned_psychologist',
+    }
+    
+    # Overridden per model
+    patient_field = 'patient'
+    default_data_type = 'clinical'
+    
+    def visible_to(self, requester, data_type=None):
+        """
+        Rows the requester may read: their own, plus those of patients
+        assigned to them whose consent covers the requester's role for
+        data_type. The consent rules are those of
+        ConsentService.can_access_data, which leaves assignment to the views.
+        """
+        if not requester.is_authenticated:
+            return self.none()
+        
+        visible = models.Q(**{self.patient_field: requester})
+        consent_field = self.CONSENT_FIELDS.get((requester.role, data_type or self.default_data_type))
+        if consent_field:
+            visible |= models.Q(**{
+                f'{self.patient_field}__consent_record__{consent_field}': True,
+                f'{self.patient_field}__profile__{self.ASSIGNMENT_FIELDS[requester.role]}': requester,
+            })
+        return self.filter(visible)
+
+
+class EmotionLogQuerySet(ConsentQuerySet):
+    default_data_type = 'emotional'
+
+
 class EmotionLog(models.Model):
     """
     Daily/weekly emotion tracking.
@@ -56,6 +103,8 @@ class EmotionLog(models.Model):
     # Audit trail
     # history = HistoricalRecords()
     
+    objects = EmotionLogQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Registro Emocional'
         verbose_name_plural = 'Registros Emocionales'
@@ -86,6 +135,76 @@ class EmotionLog(models.Model):
         )
 
 
+class EmotionDailyRollup(models.Model):
+    """
+    Per-patient, per-day aggregate of EmotionLog rows.
+    Maintained on every EmotionLog write (see psychosocial.signals);
+    rebuild with `python manage.py rebuild_emotion_rollups`.
+    """
+    patient = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='emotion_rollups',
+        limit_choices_to={'role': 'PATIENT'},
+        verbose_name='Paciente'
+    )
+    
+    day = models.DateField(
+        verbose_name='Día'
+    )
+    
+    log_count = models.IntegerField(default=0, verbose_name='Registros')
+    
+    sum_mood = models.IntegerField(default=0, verbose_name='Suma ánimo')
+    sum_anxiety = models.IntegerField(default=0, verbose_name='Suma ansiedad')
+    sum_energy = models.IntegerField(default=0, verbose_name='Suma energía')
+    
+    # pain_emotional_impact is optional, so it has its own count
+    pain_count = models.IntegerField(default=0, verbose_name='Registros con dolor')
+    sum_pain_impact = models.IntegerField(default=0, verbose_name='Suma impacto del dolor')
+    
+    min_mood = models.IntegerField(null=True, verbose_name='Ánimo mínimo')
+    max_mood = models.IntegerField(null=True, verbose_name='Ánimo máximo')
+    min_anxiety = models.IntegerField(null=True, verbose_name='Ansiedad mínima')
+    max_anxiety = models.IntegerField(null=True, verbose_name='Ansiedad máxima')
+    min_energy = models.IntegerField(null=True, verbose_name='Energía mínima')
+    max_energy = models.IntegerField(null=True, verbose_name='Energía máxima')
+    min_pain_impact = models.IntegerField(null=True, verbose_name='Impacto del dolor mínimo')
+    max_pain_impact = models.IntegerField(null=True, verbose_name='Impacto del dolor máximo')
+    min_wellbeing = models.FloatField(null=True, verbose_name='Bienestar mínimo')
+    max_wellbeing = models.FloatField(null=True, verbose_name='Bienestar máximo')
+    
+    class Meta:
+        verbose_name = 'Resumen Emocional Diario'
+        verbose_name_plural = 'Resúmenes Emocionales Diarios'
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['patient', 'day'], name='unique_emotion_rollup_per_day'),
+        ]
+    
+    def __str__(self):
+        return f"{self.patient.username} - {self.day} ({self.log_count})"
+    
+    @property
+    def avg_mood(self):
+        return self.sum_mood / self.log_count if self.log_count else None
+    
+    @property
+    def avg_anxiety(self):
+        return self.sum_anxiety / self.log_count if self.log_count else None
+    
+    @property
+    def avg_energy(self):
+        return self.sum_energy / self.log_count if self.log_count else None
+    
+    @property
+    def avg_wellbeing(self):
+        """Same formula as EmotionLog.overall_wellbeing, averaged over the day."""
+        if not self.log_count:
+            return None
+        return (self.sum_mood + self.sum_energy + 11 * self.log_count - self.sum_anxiety) / (3 * self.log_count)
+
+
 class CheckIn(models.Model):
     """
     Tracks completion of emotional check-ins.
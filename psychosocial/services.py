@@ -3,10 +3,18 @@ Services for psychosocial module.
 Handles emotion analysis and recommendation generation.
 """
 import logging
+import time
 from datetime import date, timedelta
-from django.db.models import Avg
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, FloatField, Max, Min, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Greatest, Least, TruncDate
+from django.utils import timezone
 
-from .models import EmotionLog, CheckIn, Recommendation, ConsentRecord
+from lia_project.cache import shared_timeout
+
+from .models import EmotionLog, EmotionDailyRollup, CheckIn, Recommendation, ConsentRecord, ConsentQuerySet
 
 logger = logging.getLogger('psychosocial')
 
@@ -17,54 +25,52 @@ class EmotionService:
     def analyze_trend(self, patient, days=7):
         """
         Analyze emotion trend over specified days.
-        Returns: IMPROVING, STABLE, or DECLINING
-        """
-        logs = EmotionLog.objects.filter(
-            patient=patient,
-            timestamp__gte=date.today() - timedelta(days=days)
-        ).order_by('timestamp')
-        
-        if logs.count() < 2:
-            return 'INSUFFICIENT_DATA'
+        Returns: IMPROVING, STABLE, DECLINING or INSUFFICIENT_DATA
         
-        # Get first and last wellbeing scores
-        first_score = logs.first().overall_wellbeing
-        last_score = logs.last().overall_wellbeing
+        Single-patient call of analyze_trends, so patient pages and the
+        psychologist dashboard label the same data the same way.
+        """
+        return self.analyze_trends([patient], days=days)[patient.pk]['trend']
+    
+    def analyze_trends(self, patients, days=7, alpha=0.3):
+        """
+        Vectorized trend analysis for many patients in one query.
         
-        # Calculate trend
-        difference = last_score - first_score
+        Returns {patient_id: {'count', 'first', 'last', 'mean', 'slope',
+        'ewma', 'volatility', 'trend', 'avg_mood', 'avg_anxiety',
+        'avg_energy'}} where slope is wellbeing points per day; see
+        psychosocial.trends for the trend thresholds.
+        """
+        from .trends import trend_report
         
-        if difference > 1:
-            return 'IMPROVING'
-        elif difference < -1:
-            return 'DECLINING'
-        else:
-            return 'STABLE'
+        return trend_report([getattr(p, 'pk', p) for p in patients], days=days, alpha=alpha)
     
     def get_average_scores(self, patient, days=30):
         """Get average emotional scores over period."""
-        logs = EmotionLog.objects.filter(
-            patient=patient,
-            timestamp__gte=date.today() - timedelta(days=days)
+        totals = emotion_rollup_service.window(patient, days).aggregate(
+            log_count=Sum('log_count'),
+            sum_mood=Sum('sum_mood'),
+            sum_anxiety=Sum('sum_anxiety'),
+            sum_energy=Sum('sum_energy')
         )
         
-        averages = logs.aggregate(
-            avg_mood=Avg('mood_score'),
-            avg_anxiety=Avg('anxiety_score'),
-            avg_energy=Avg('energy_score')
-        )
+        log_count = totals['log_count']
+        if not log_count:
+            return {'avg_mood': None, 'avg_anxiety': None, 'avg_energy': None}
         
-        return averages
+        return {
+            'avg_mood': totals['sum_mood'] / log_count,
+            'avg_anxiety': totals['sum_anxiety'] / log_count,
+            'avg_energy': totals['sum_energy'] / log_count,
+        }
     
     def check_emotional_alert(self, emotion_log):
         """Check if emotion log requires alert."""
         if emotion_log.needs_attention:
             from clinical.services import alert_service
             
-            # Create emotional crisis alert
-            from clinical.models import Alert
-            
-            alert = Alert.objects.create(
+            # Create (or coalesce) emotional crisis alert
+            alert, _ = alert_service.record_alert(
                 patient=emotion_log.patient,
                 alert_type='EMOTION_CRISIS',
                 severity='MEDIUM' if emotion_log.mood_score <= 3 else 'LOW',
@@ -72,13 +78,131 @@ class EmotionService:
                 suggested_action="Contactar al paciente para seguimiento psicológico."
             )
             
-            logger.warning(f"Emotional alert created for {emotion_log.patient.username}")
+            logger.warning("Emotional alert created for %s", emotion_log.patient.username)
             
             return alert
         
         return None
 
 
+class EmotionRollupService:
+    """Maintains EmotionDailyRollup rows from EmotionLog writes."""
+    
+    SCORE_FIELDS = {
+        'mood': 'mood_score',
+        'anxiety': 'anxiety_score',
+        'energy': 'energy_score',
+    }
+    
+    def record_log(self, emotion_log):
+        """Fold a newly created EmotionLog into its day's rollup."""
+        day = timezone.localdate(emotion_log.timestamp)
+        wellbeing = emotion_log.overall_wellbeing
+        pain = emotion_log.pain_emotional_impact
+        
+        changes = {
+            'log_count': F('log_count') + 1,
+            'min_wellbeing': Least(Coalesce('min_wellbeing', Value(wellbeing)), Value(wellbeing)),
+            'max_wellbeing': Greatest(Coalesce('max_wellbeing', Value(wellbeing)), Value(wellbeing)),
+        }
+        for name, field in self.SCORE_FIELDS.items():
+            value = getattr(emotion_log, field)
+            changes[f'sum_{name}'] = F(f'sum_{name}') + value
+            changes[f'min_{name}'] = Least(Coalesce(f'min_{name}', Value(value)), Value(value))
+            changes[f'max_{name}'] = Greatest(Coalesce(f'max_{name}', Value(value)), Value(value))
+        if pain is not None:
+            changes['pain_count'] = F('pain_count') + 1
+            changes['sum_pain_impact'] = F('sum_pain_impact') + pain
+            changes['min_pain_impact'] = Least(Coalesce('min_pain_impact', Value(pain)), Value(pain))
+            changes['max_pain_impact'] = Greatest(Coalesce('max_pain_impact', Value(pain)), Value(pain))
+        
+        rollups = EmotionDailyRollup.objects.filter(patient_id=emotion_log.patient_id, day=day)
+        if rollups.update(**changes):
+            return
+        
+        try:
+            with transaction.atomic():
+                EmotionDailyRollup.objects.create(
+                    patient_id=emotion_log.patient_id,
+                    day=day,
+                    log_count=1,
+                    sum_mood=emotion_log.mood_score,
+                    sum_anxiety=emotion_log.anxiety_score,
+                    sum_energy=emotion_log.energy_score,
+                    pain_count=0 if pain is None else 1,
+                    sum_pain_impact=pain or 0,
+                    min_mood=emotion_log.mood_score,
+                    max_mood=emotion_log.mood_score,
+                    min_anxiety=emotion_log.anxiety_score,
+                    max_anxiety=emotion_log.anxiety_score,
+                    min_energy=emotion_log.energy_score,
+                    max_energy=emotion_log.energy_score,
+                    min_pain_impact=pain,
+                    max_pain_impact=pain,
+                    min_wellbeing=wellbeing,
+                    max_wellbeing=wellbeing
+                )
+        except IntegrityError:
+            # Created concurrently; fold into that row instead
+            rollups.update(**changes)
+    
+    def recompute_day(self, patient_id, day):
+        """Rebuild one patient-day from raw logs (after edits or deletes)."""
+        self.rebuild(patient_ids=[patient_id], days=[day])
+    
+    def rebuild(self, patient_ids=None, days=None):
+        """
+        Recompute rollups from EmotionLog, optionally limited to some
+        patients and/or days. Returns the number of rollup rows written.
+        """
+        logs = EmotionLog.objects.order_by()
+        rollups = EmotionDailyRollup.objects.all()
+        if patient_ids is not None:
+            logs = logs.filter(patient_id__in=patient_ids)
+            rollups = rollups.filter(patient_id__in=patient_ids)
+        
+        logs = logs.annotate(day=TruncDate('timestamp', tzinfo=timezone.get_current_timezone()))
+        if days is not None:
+            logs = logs.filter(day__in=days)
+            rollups = rollups.filter(day__in=days)
+        
+        wellbeing = Cast(F('mood_score') + F('energy_score') + 11 - F('anxiety_score'), FloatField()) / 3
+        rows = logs.values('patient_id', 'day').annotate(
+            log_count=Count('id'),
+            sum_mood=Sum('mood_score'),
+            sum_anxiety=Sum('anxiety_score'),
+            sum_energy=Sum('energy_score'),
+            pain_count=Count('pain_emotional_impact'),
+            sum_pain_impact=Coalesce(Sum('pain_emotional_impact'), 0),
+            min_mood=Min('mood_score'),
+            max_mood=Max('mood_score'),
+            min_anxiety=Min('anxiety_score'),
+            max_anxiety=Max('anxiety_score'),
+            min_energy=Min('energy_score'),
+            max_energy=Max('energy_score'),
+            min_pain_impact=Min('pain_emotional_impact'),
+            max_pain_impact=Max('pain_emotional_impact'),
+            min_wellbeing=Min(wellbeing),
+            max_wellbeing=Max(wellbeing),
+        )
+        
+        with transaction.atomic():
+            rollups.delete()
+            created = EmotionDailyRollup.objects.bulk_create(
+                [EmotionDailyRollup(**row) for row in rows.iterator(chunk_size=2000)],
+                batch_size=1000
+            )
+        
+        return len(created)
+    
+    def window(self, patient, days):
+        """Rollup rows covering the same window as the raw-log queries."""
+        return EmotionDailyRollup.objects.filter(
+            patient=patient,
+            day__gte=date.today() - timedelta(days=days)
+        )
+
+
 class RecommendationService:
     """Service for generating personalized recommendations."""
     
@@ -148,7 +272,7 @@ class RecommendationService:
             is_ai_generated=True
         )
         
-        logger.info(f"AI recommendation generated for {patient.username}")
+        logger.info("AI recommendation generated for %s", patient.username)
         
         return recommendation
     
@@ -174,6 +298,22 @@ class RecommendationService:
 class ConsentService:
     """Service for managing patient consent."""
     
+    # Consent field that grants access, by (requester role, data type)
+    CONSENT_FIELDS = ConsentQuerySet.CONSENT_FIELDS
+    
+    # Flags cached per patient; a patient without a record caches as {}
+    FLAG_FIELDS = (
+        'can_share_with_doctor',
+        'can_share_chat_with_doctor',
+        'can_share_with_psychologist',
+        'can_use_for_research',
+    )
+    CACHE_KEY = 'consent:{patient_id}'
+    
+    def __init__(self):
+        # Process-local layer in front of the shared cache: {patient_id: (expires_at, flags)}
+        self._local = {}
+    
     def get_or_create_consent(self, patient):
         """Get or create consent record for patient."""
         consent, created = ConsentRecord.objects.get_or_create(
@@ -181,7 +321,7 @@ class ConsentService:
         )
         
         if created:
-            logger.info(f"Consent record created for {patient.username}")
+            logger.info("Consent record created for %s", patient.username)
         
         return consent
     
@@ -198,32 +338,100 @@ class ConsentService:
         if patient == requester:
             return True
         
-        # Get consent
-        try:
-            consent = ConsentRecord.objects.get(patient=patient)
-        except ConsentRecord.DoesNotExist:
-            # No consent record = default to False for safety
+        consent_field = self.CONSENT_FIELDS.get((requester.role, data_type))
+        if consent_field is None:
             return False
         
-        # Check based on data type and requester role
-        if requester.role == 'DOCTOR':
-            if data_type == 'clinical':
-                return consent.can_share_with_doctor
-            elif data_type == 'chat':
-                return consent.can_share_chat_with_doctor
-            else:
-                return False
+        # No consent record = default to False for safety
+        flags = self.get_consent_flags(patient.pk)
+        return bool(flags and flags[consent_field])
+    
+    def can_access_many(self, patients, requester, data_type='clinical'):
+        """
+        Bulk version of can_access_data.
+        Returns {patient_id: bool}; at most one ConsentRecord query for uncached patients.
+        """
+        patient_ids = [getattr(p, 'pk', p) for p in patients]
+        access = {patient_id: patient_id == requester.pk for patient_id in patient_ids}
+        
+        consent_field = self.CONSENT_FIELDS.get((requester.role, data_type))
+        if consent_field is None:
+            return access
+        
+        for patient_id, flags in self.get_many_consent_flags(patient_ids).items():
+            if flags and flags[consent_field]:
+                access[patient_id] = True
         
-        elif requester.role == 'PSYCHOLOGIST':
-            if data_type == 'emotional':
-                return consent.can_share_with_psychologist
+        return access
+    
+    def get_consent_flags(self, patient_id):
+        """
+        Consent booleans for a patient as {field: bool},
+        or None if the patient has no ConsentRecord.
+        """
+        return self.get_many_consent_flags([patient_id])[patient_id]
+    
+    def get_many_consent_flags(self, patient_ids):
+        """
+        Consent booleans for many patients: process-local cache first,
+        then the shared cache, then one query for whatever is left.
+        Returns {patient_id: flags or None}.
+        """
+        now = time.monotonic()
+        found = {}
+        missing = []
+        for patient_id in set(patient_ids):
+            entry = self._local.get(patient_id)
+            if entry and entry[0] > now:
+                found[patient_id] = entry[1]
             else:
-                return False
+                missing.append(patient_id)
+        
+        if missing:
+            keys = {self.CACHE_KEY.format(patient_id=patient_id): patient_id for patient_id in missing}
+            shared = {keys[key]: flags for key, flags in cache.get_many(list(keys)).items()}
+            
+            uncached = [patient_id for patient_id in missing if patient_id not in shared]
+            if uncached:
+                loaded = {patient_id: {} for patient_id in uncached}
+                rows = ConsentRecord.objects.filter(
+                    patient_id__in=uncached
+                ).values_list('patient_id', *self.FLAG_FIELDS)
+                for patient_id, *values in rows:
+                    loaded[patient_id] = dict(zip(self.FLAG_FIELDS, values))
+                cache.set_many(
+                    {self.CACHE_KEY.format(patient_id=patient_id): flags for patient_id, flags in loaded.items()},
+                    shared_timeout(settings.CONSENT_CACHE_SECONDS)
+                )
+                shared.update(loaded)
+            
+            if len(self._local) > settings.CONSENT_LOCAL_CACHE_SIZE:
+                self._local.clear()
+            expires_at = now + settings.CONSENT_LOCAL_CACHE_SECONDS
+            for patient_id, flags in shared.items():
+                self._local[patient_id] = (expires_at, flags)
+            found.update(shared)
+        
+        return {patient_id: found[patient_id] or None for patient_id in patient_ids}
+    
+    def invalidate(self, patient_id):
+        """
+        Forget cached consent for a patient, now and again after commit.
+        Other processes drop their local copy within CONSENT_LOCAL_CACHE_SECONDS;
+        this relies on the shared cache (CACHES) reaching every worker.
+        """
+        key = self.CACHE_KEY.format(patient_id=patient_id)
+        
+        def forget():
+            self._local.pop(patient_id, None)
+            cache.delete(key)
         
-        return False
+        forget()
+        transaction.on_commit(forget)
 
 
 # Singleton instances
 emotion_service = EmotionService()
+emotion_rollup_service = EmotionRollupService()
 recommendation_service = RecommendationService()
 consent_service = ConsentService()
@@ -0,0 +1,34 @@
+"""
+Signal handlers for psychosocial module.
+Keep derived tables and caches in sync with EmotionLog and ConsentRecord writes.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import EmotionLog, ConsentRecord
+from .services import emotion_rollup_service, consent_service
+
+
+@receiver(post_save, sender=EmotionLog)
+def update_emotion_rollup(sender, instance, created, raw=False, **kwargs):
+    """Fold new logs into their daily rollup; recompute the day on edits."""
+    if raw:
+        return
+    if created:
+        emotion_rollup_service.record_log(instance)
+    else:
+        emotion_rollup_service.recompute_day(instance.patient_id, timezone.localdate(instance.timestamp))
+
+
+@receiver(post_delete, sender=EmotionLog)
+def remove_from_emotion_rollup(sender, instance, **kwargs):
+    """Recompute the day a deleted log belonged to."""
+    emotion_rollup_service.recompute_day(instance.patient_id, timezone.localdate(instance.timestamp))
+
+
+@receiver(post_save, sender=ConsentRecord)
+@receiver(post_delete, sender=ConsentRecord)
+def invalidate_consent_cache(sender, instance, **kwargs):
+    """Drop cached consent flags so the change applies to the next check."""
+    consent_service.invalidate(instance.patient_id)
@@ -0,0 +1,316 @@
+"""
+Tests for the psychosocial module: consent caching, consent-aware
+querysets, emotion trends and the daily emotion rollups.
+"""
+from datetime import datetime, time, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from chatbot.models import ChatInteraction
+from clinical.models import SymptomReport
+from lia_project.cache import shared_timeout
+from users.models import CustomUser, Profile
+
+from .models import ConsentRecord, EmotionDailyRollup, EmotionLog
+from .services import ConsentService, consent_service, emotion_rollup_service, emotion_service
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class ConsentCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        consent_service._local.clear()
+        self.patient = CustomUser.objects.create_user('paciente', password='x', role='PATIENT')
+        self.doctor = CustomUser.objects.create_user('medico', password='x', role='DOCTOR')
+        self.consent = ConsentRecord.objects.create(patient=self.patient, can_share_with_doctor=True)
+
+    def test_flags_are_cached_after_the_first_lookup(self):
+        self.assertTrue(consent_service.can_access_data(self.patient, self.doctor))
+
+        with self.assertNumQueries(0):
+            self.assertTrue(consent_service.can_access_data(self.patient, self.doctor))
+
+        # Past the process-local layer, the shared cache answers
+        consent_service._local.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(consent_service.can_access_data(self.patient, self.doctor))
+        self.assertFalse([q for q in queries if ConsentRecord._meta.db_table in q['sql']])
+
+    def test_revocation_applies_to_the_next_check(self):
+        self.assertTrue(consent_service.can_access_data(self.patient, self.doctor))
+
+        self.consent.can_share_with_doctor = False
+        self.consent.save()
+
+        self.assertFalse(consent_service.can_access_data(self.patient, self.doctor))
+
+    @override_settings(CONSENT_LOCAL_CACHE_SECONDS=0)
+    def test_revocation_reaches_other_workers_through_the_shared_cache(self):
+        other_worker = ConsentService()
+        self.assertTrue(other_worker.can_access_data(self.patient, self.doctor))
+
+        # The signal runs in this worker only
+        self.consent.can_share_with_doctor = False
+        self.consent.save()
+
+        self.assertFalse(other_worker.can_access_data(self.patient, self.doctor))
+
+    def test_deleting_the_record_denies_access(self):
+        self.assertTrue(consent_service.can_access_data(self.patient, self.doctor))
+
+        self.consent.delete()
+
+        self.assertIsNone(consent_service.get_consent_flags(self.patient.pk))
+        self.assertFalse(consent_service.can_access_data(self.patient, self.doctor))
+
+    def test_bulk_lookup_reads_consent_once_for_uncached_patients(self):
+        others = [
+            CustomUser.objects.create_user(f'paciente{i}', password='x', role='PATIENT')
+            for i in range(3)
+        ]
+        patients = [self.patient] + others
+
+        with CaptureQueriesContext(connection) as queries:
+            access = consent_service.can_access_many(patients, self.doctor)
+
+        consent_queries = [q for q in queries if ConsentRecord._meta.db_table in q['sql']]
+        self.assertEqual(len(consent_queries), 1)
+        self.assertEqual(access, {self.patient.pk: True, **{p.pk: False for p in others}})
+
+    @override_settings(CACHES=LOCMEM, LOCAL_CACHE_MAX_SECONDS=5)
+    def test_process_local_backend_caps_the_timeout(self):
+        self.assertEqual(shared_timeout(300), 5)
+
+    def test_shared_backend_keeps_the_timeout(self):
+        self.assertEqual(shared_timeout(300), 300)
+
+
+class VisibleToTests(TestCase):
+
+    # (requester role, data type, queryset, consent field that grants access)
+    CASES = [
+        ('DOCTOR', 'clinical', SymptomReport.objects, 'can_share_with_doctor'),
+        ('DOCTOR', 'chat', ChatInteraction.objects, 'can_share_chat_with_doctor'),
+        ('PSYCHOLOGIST', 'emotional', EmotionLog.objects, 'can_share_with_psychologist'),
+    ]
+    CONSENT_FIELDS = ['can_share_with_doctor', 'can_share_chat_with_doctor', 'can_share_with_psychologist']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = {
+            'DOCTOR': CustomUser.objects.create_user('medico', password='x', role='DOCTOR'),
+            'PSYCHOLOGIST': CustomUser.objects.create_user('psicologa', password='x', role='PSYCHOLOGIST'),
+        }
+        other_doctor = CustomUser.objects.create_user('otro_medico', password='x', role='DOCTOR')
+        other_psychologist = CustomUser.objects.create_user('otra_psicologa', password='x', role='PSYCHOLOGIST')
+
+        cls.patients = {}
+        for name, assigned, consent in [
+            # Assigned, consenting to one field at a time
+            *[(field, True, {field}) for field in cls.CONSENT_FIELDS],
+            ('assigned_without_record', True, None),
+            ('unassigned_full_consent', False, set(cls.CONSENT_FIELDS)),
+        ]:
+            patient = CustomUser.objects.create_user(name, password='x', role='PATIENT')
+            if assigned:
+                Profile.objects.create(user=patient, assigned_doctor=cls.staff['DOCTOR'],
+                                       assigned_psychologist=cls.staff['PSYCHOLOGIST'])
+            else:
+                Profile.objects.create(user=patient, assigned_doctor=other_doctor,
+                                       assigned_psychologist=other_psychologist)
+            if consent is not None:
+                ConsentRecord.objects.create(patient=patient, **{field: field in consent for field in cls.CONSENT_FIELDS})
+            SymptomReport.objects.create(patient=patient, symptom_type='PAIN', intensity=5)
+            ChatInteraction.objects.create(user=patient, message_text='hola', bot_response='ok')
+            EmotionLog.objects.create(patient=patient, mood_score=5, anxiety_score=5,
+                                      energy_score=5, pain_emotional_impact=5)
+            cls.patients[name] = patient
+
+    def visible_patients(self, queryset, requester, data_type):
+        rows = queryset.visible_to(requester, data_type)
+        field = 'user__username' if queryset.model is ChatInteraction else 'patient__username'
+        return set(rows.values_list(field, flat=True))
+
+    def test_each_role_sees_assigned_patients_that_consented_to_the_data_type(self):
+        for role, data_type, queryset, consent_field in self.CASES:
+            with self.subTest(role=role, data_type=data_type):
+                self.assertEqual(self.visible_patients(queryset, self.staff[role], data_type), {consent_field})
+
+    def test_other_roles_and_data_types_see_nothing(self):
+        for role, data_type, queryset, _ in self.CASES:
+            for other_role, requester in self.staff.items():
+                if other_role != role:
+                    with self.subTest(role=other_role, data_type=data_type):
+                        self.assertEqual(self.visible_patients(queryset, requester, data_type), set())
+
+    def test_default_data_type_follows_the_model(self):
+        for role, data_type, queryset, consent_field in self.CASES:
+            with self.subTest(model=queryset.model.__name__):
+                self.assertEqual(self.visible_patients(queryset, self.staff[role], None), {consent_field})
+
+    def test_patient_sees_only_their_own_rows(self):
+        patient = self.patients['unassigned_full_consent']
+        for _, data_type, queryset, _ in self.CASES:
+            with self.subTest(data_type=data_type):
+                self.assertEqual(self.visible_patients(queryset, patient, data_type), {patient.username})
+
+    def test_patient_without_consent_record_is_hidden_even_when_assigned(self):
+        for role, data_type, queryset, _ in self.CASES:
+            with self.subTest(role=role, data_type=data_type):
+                self.assertNotIn('assigned_without_record',
+                                 self.visible_patients(queryset, self.staff[role], data_type))
+                self.assertFalse(consent_service.can_access_data(
+                    self.patients['assigned_without_record'], self.staff[role], data_type
+                ))
+
+    def test_unassigned_patient_is_hidden_despite_consent(self):
+        for role, data_type, queryset, _ in self.CASES:
+            with self.subTest(role=role, data_type=data_type):
+                self.assertNotIn('unassigned_full_consent',
+                                 self.visible_patients(queryset, self.staff[role], data_type))
+
+    def test_anonymous_user_sees_nothing(self):
+        self.assertFalse(EmotionLog.objects.visible_to(AnonymousUser()).exists())
+
+
+class EmotionTrendTests(TestCase):
+
+    def setUp(self):
+        self.patient = CustomUser.objects.create_user('paciente', password='x', role='PATIENT')
+
+    def log(self, mood, anxiety, energy):
+        return EmotionLog.objects.create(
+            patient=self.patient, mood_score=mood, anxiety_score=anxiety,
+            energy_score=energy, pain_emotional_impact=1,
+        )
+
+    def assertTrend(self, expected):
+        self.assertEqual(emotion_service.analyze_trend(self.patient), expected)
+        report = emotion_service.analyze_trends([self.patient])[self.patient.pk]
+        self.assertEqual(report['trend'], expected)
+
+    def test_single_log_is_insufficient(self):
+        self.log(5, 5, 5)
+        self.assertTrend('INSUFFICIENT_DATA')
+
+    def test_rise_of_more_than_one_point_is_improving(self):
+        self.log(3, 7, 3)
+        self.log(8, 2, 8)
+        self.assertTrend('IMPROVING')
+
+    def test_drop_of_more_than_one_point_is_declining(self):
+        self.log(8, 2, 8)
+        self.log(3, 7, 3)
+        self.assertTrend('DECLINING')
+
+    def test_rise_of_exactly_one_point_is_stable_on_every_path(self):
+        # Wellbeing 4/3 -> 7/3: float subtraction gives 1.0000000000000002
+        self.log(1, 9, 1)
+        self.log(3, 9, 2)
+        self.assertTrend('STABLE')
+
+    def test_caseload_report_has_score_averages(self):
+        other = CustomUser.objects.create_user('otro', password='x', role='PATIENT')
+        self.log(3, 7, 3)
+        self.log(8, 2, 8)
+
+        report = emotion_service.analyze_trends([self.patient, other])
+
+        self.assertEqual(
+            (report[self.patient.pk]['avg_mood'], report[self.patient.pk]['avg_anxiety'],
+             report[self.patient.pk]['avg_energy'], report[self.patient.pk]['count']),
+            (5.5, 4.5, 5.5, 2)
+        )
+        self.assertEqual(report[other.pk]['trend'], 'INSUFFICIENT_DATA')
+        self.assertIsNone(report[other.pk]['avg_mood'])
+
+
+class EmotionRollupTests(TestCase):
+
+    def setUp(self):
+        self.patient = CustomUser.objects.create_user('paciente', password='x', role='PATIENT')
+        self.today = timezone.localdate()
+
+    def log(self, mood, anxiety, energy, pain=None, days_ago=0, hour=12):
+        at = timezone.make_aware(datetime.combine(self.today - timedelta(days=days_ago), time(hour)))
+        with mock.patch('django.utils.timezone.now', return_value=at):
+            return EmotionLog.objects.create(
+                patient=self.patient, mood_score=mood, anxiety_score=anxiety,
+                energy_score=energy, pain_emotional_impact=pain,
+            )
+
+    def rollups(self):
+        return sorted(
+            EmotionDailyRollup.objects.values_list(
+                'patient_id', 'day', 'log_count', 'sum_mood', 'sum_anxiety', 'sum_energy',
+                'pain_count', 'sum_pain_impact', 'min_mood', 'max_mood', 'min_anxiety',
+                'max_anxiety', 'min_energy', 'max_energy', 'min_pain_impact',
+                'max_pain_impact', 'min_wellbeing', 'max_wellbeing',
+            )
+        )
+
+    def assertMatchesRebuild(self):
+        incremental = self.rollups()
+        emotion_rollup_service.rebuild()
+        self.assertEqual(incremental, self.rollups())
+
+    def test_new_logs_fold_into_their_day(self):
+        self.log(4, 6, 5, pain=3, hour=8)
+        self.log(8, 2, 7, hour=20)
+        self.log(6, 5, 5, pain=7, days_ago=1)
+
+        today = EmotionDailyRollup.objects.get(day=self.today)
+        self.assertEqual((today.log_count, today.sum_mood, today.min_mood, today.max_mood), (2, 12, 4, 8))
+        self.assertEqual((today.pain_count, today.sum_pain_impact, today.max_pain_impact), (1, 3, 3))
+        self.assertEqual(EmotionDailyRollup.objects.count(), 2)
+        self.assertMatchesRebuild()
+
+    def test_editing_a_log_recomputes_its_day(self):
+        log = self.log(4, 6, 5)
+        self.log(5, 5, 5)
+
+        log.mood_score = 9
+        log.save()
+
+        self.assertEqual(EmotionDailyRollup.objects.get().max_mood, 9)
+        self.assertMatchesRebuild()
+
+    def test_deleting_the_last_log_of_a_day_drops_the_rollup(self):
+        self.log(5, 5, 5)
+        old = self.log(3, 8, 2, days_ago=2)
+
+        old.delete()
+
+        self.assertEqual(list(EmotionDailyRollup.objects.values_list('day', flat=True)), [self.today])
+        self.assertMatchesRebuild()
+
+    def test_averages_from_rollups_match_raw_logs(self):
+        logs = [self.log(3, 7, 4), self.log(8, 2, 9, days_ago=3), self.log(6, 4, 6, days_ago=40)]
+        recent = logs[:2]
+
+        averages = emotion_service.get_average_scores(self.patient, days=30)
+
+        self.assertEqual(averages, {
+            'avg_mood': sum(log.mood_score for log in recent) / 2,
+            'avg_anxiety': sum(log.anxiety_score for log in recent) / 2,
+            'avg_energy': sum(log.energy_score for log in recent) / 2,
+        })
+
+    def test_rebuild_can_be_limited_to_some_patients(self):
+        other = CustomUser.objects.create_user('otra', password='x', role='PATIENT')
+        self.log(5, 5, 5)
+        EmotionLog.objects.create(patient=other, mood_score=5, anxiety_score=5, energy_score=5)
+        EmotionDailyRollup.objects.update(log_count=99)
+
+        emotion_rollup_service.rebuild(patient_ids=[self.patient.pk])
+
+        self.assertEqual(EmotionDailyRollup.objects.get(patient=self.patient).log_count, 1)
+        self.assertEqual(EmotionDailyRollup.objects.get(patient=other).log_count, 99)
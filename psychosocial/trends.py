@@ -0,0 +1,156 @@
+"""
+Vectorized emotion trend engine.
+Computes per-patient wellbeing statistics for many patients at once with NumPy.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+
+from .models import EmotionLog
+
+SECONDS_PER_DAY = 86400.0
+
+# A trend needs at least this many logs and a last - first wellbeing change
+# beyond TREND_THRESHOLD points to be IMPROVING or DECLINING
+MIN_TREND_LOGS = 2
+TREND_THRESHOLD = 1
+
+
+def classify_trends(counts, differences):
+    """Trend labels for arrays of log counts and wellbeing differences (last - first)."""
+    counts = np.asarray(counts)
+    differences = np.asarray(differences, dtype=float)
+    return np.where(
+        counts < MIN_TREND_LOGS, 'INSUFFICIENT_DATA',
+        np.where(differences > TREND_THRESHOLD, 'IMPROVING',
+                 np.where(differences < -TREND_THRESHOLD, 'DECLINING', 'STABLE'))
+    )
+
+
+def load_series(patient_ids, days):
+    """
+    Fetch (patient_id, timestamp, mood, anxiety, energy) for the window
+    as NumPy arrays sorted by patient and time.
+    Timestamps are returned as days since the earliest fetched log.
+    """
+    start = date.today() - timedelta(days=days)
+    rows = list(
+        EmotionLog.objects.filter(
+            patient_id__in=patient_ids,
+            timestamp__gte=start
+        )
+        .order_by('patient_id', 'timestamp', 'id')
+        .values_list('patient_id', 'timestamp', 'mood_score', 'anxiety_score', 'energy_score')
+    )
+    if not rows:
+        empty = np.empty(0)
+        return np.empty(0, dtype=np.int64), empty, empty, empty, empty
+
+    patient_col, timestamp_col, mood, anxiety, energy = zip(*rows)
+    origin = timestamp_col[0].timestamp()
+    elapsed = np.fromiter((ts.timestamp() for ts in timestamp_col), dtype=float, count=len(rows))
+
+    return (
+        np.asarray(patient_col, dtype=np.int64),
+        (elapsed - origin) / SECONDS_PER_DAY,
+        np.asarray(mood, dtype=float),
+        np.asarray(anxiety, dtype=float),
+        np.asarray(energy, dtype=float),
+    )
+
+
+def compute_trends(patient_ids, timestamps, mood, anxiety, energy, alpha=0.3):
+    """
+    Per-patient wellbeing statistics over pre-sorted arrays.
+
+    Returns a dict of arrays aligned with the unique patient ids:
+        patient_id, count, first, last, mean, slope (points/day),
+        ewma, volatility (std dev), trend (label),
+        avg_mood, avg_anxiety, avg_energy
+    """
+    # EmotionLog.overall_wellbeing times 3: exact integers, so the trend
+    # difference does not pick up float rounding at the threshold
+    wellbeing_sum = mood + energy + (11 - anxiety)
+    wellbeing = wellbeing_sum / 3
+
+    unique_ids, starts, counts = np.unique(patient_ids, return_index=True, return_counts=True)
+    group = np.repeat(np.arange(len(unique_ids)), counts)
+    ends = starts + counts - 1
+    n = counts.astype(float)
+
+    def group_sum(values):
+        return np.bincount(group, weights=values, minlength=len(unique_ids))
+
+    first = wellbeing[starts] if len(starts) else np.empty(0)
+    last = wellbeing[ends] if len(ends) else np.empty(0)
+    mean = group_sum(wellbeing) / np.maximum(n, 1)
+    difference = (wellbeing_sum[ends] - wellbeing_sum[starts]) / 3 if len(starts) else np.empty(0)
+
+    # Least-squares slope of wellbeing against time, per patient
+    sum_x = group_sum(timestamps)
+    sum_xx = group_sum(timestamps * timestamps)
+    sum_xy = group_sum(timestamps * wellbeing)
+    sum_y = group_sum(wellbeing)
+    denominator = n * sum_xx - sum_x * sum_x
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(np.abs(denominator) > 1e-12, (n * sum_xy - sum_x * sum_y) / denominator, 0.0)
+
+    # EWMA of the final observation: weight (1 - alpha)^(age within patient)
+    position = np.arange(len(wellbeing)) - np.repeat(starts, counts)
+    age = np.repeat(counts, counts) - 1 - position
+    weights = (1 - alpha) ** age
+    ewma = group_sum(weights * wellbeing) / np.maximum(group_sum(weights), 1e-12)
+
+    variance = group_sum(wellbeing * wellbeing) / np.maximum(n, 1) - mean * mean
+    volatility = np.sqrt(np.clip(variance, 0, None))
+
+    trend = classify_trends(counts, difference)
+
+    return {
+        'patient_id': unique_ids,
+        'count': counts,
+        'first': first,
+        'last': last,
+        'mean': mean,
+        'slope': slope,
+        'ewma': ewma,
+        'volatility': volatility,
+        'trend': trend,
+        'avg_mood': group_sum(mood) / np.maximum(n, 1),
+        'avg_anxiety': group_sum(anxiety) / np.maximum(n, 1),
+        'avg_energy': group_sum(energy) / np.maximum(n, 1),
+    }
+
+
+def trend_report(patient_ids, days=7, alpha=0.3):
+    """
+    Load and compute trends for many patients in one query.
+    Returns {patient_id: {...}}; patients without logs get INSUFFICIENT_DATA.
+    """
+    patient_ids = list(patient_ids)
+    stats = compute_trends(*load_series(patient_ids, days), alpha=alpha)
+
+    report = {
+        patient_id: {
+            'count': 0, 'first': None, 'last': None, 'mean': None,
+            'slope': None, 'ewma': None, 'volatility': None,
+            'trend': 'INSUFFICIENT_DATA',
+            'avg_mood': None, 'avg_anxiety': None, 'avg_energy': None,
+        }
+        for patient_id in patient_ids
+    }
+    for i, patient_id in enumerate(stats['patient_id'].tolist()):
+        report[patient_id] = {
+            'count': int(stats['count'][i]),
+            'first': float(stats['first'][i]),
+            'last': float(stats['last'][i]),
+            'mean': float(stats['mean'][i]),
+            'slope': float(stats['slope'][i]),
+            'ewma': float(stats['ewma'][i]),
+            'volatility': float(stats['volatility'][i]),
+            'trend': str(stats['trend'][i]),
+            'avg_mood': float(stats['avg_mood'][i]),
+            'avg_anxiety': float(stats['avg_anxiety'][i]),
+            'avg_energy': float(stats['avg_energy'][i]),
+        }
+    return report
@@ -11,6 +11,7 @@ from .models import EmotionLog, CheckIn, Recommendation, ConsentRecord
 from .forms import EmotionCheckInForm, RecommendationForm, ConsentForm
 from .services import emotion_service, recommendation_service, consent_service
 from users.decorators import patient_only, psychologist_only
+from metrics import collectors
 
 
 @login_required
@@ -30,10 +31,13 @@ def emotion_checkin(request):
                 scheduled_date=date.today(),
                 checkin_type='DAILY'
             )
+            first_completion = not checkin.completed
             checkin.completed = True
             checkin.completion_date = timezone.now()
             checkin.related_emotion_log = emotion_log
             checkin.save()
+            if first_completion:
+                collectors.CHECKINS_COMPLETED.labels(checkin.checkin_type).inc()
             
             # Check if alert needed
             emotion_service.check_emotional_alert(emotion_log)
@@ -141,7 +145,7 @@ def patient_emotions(request, patient_id):
         messages.warning(request, 'El/La paciente no ha dado consentimiento para acceder a sus datos emocionales.')
         return redirect('psychologist:dashboard')
     
-    logs = EmotionLog.objects.filter(
+    logs = EmotionLog.objects.visible_to(request.user).filter(
         patient=patient
     ).order_by('-timestamp')[:30]
     
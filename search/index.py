@@ -0,0 +1,129 @@
+"""
+Database full-text indexes over chat transcripts and symptom descriptions.
+
+- PostgreSQL: GIN index on a Spanish to_tsvector() expression.
+- SQLite: FTS5 external-content table (accent/case folding) kept in sync
+  by triggers, so every insert, update and delete is indexed, bulk writes included.
+- Other backends: no index; searches fall back to icontains.
+"""
+import re
+
+# name -> indexed table and text columns
+INDEXES = {
+    'chat': {
+        'table': 'chatbot_chatinteraction',
+        'columns': ('message_text', 'bot_response'),
+    },
+    'symptom': {
+        'table': 'clinical_symptomreport',
+        'columns': ('description',),
+    },
+}
+
+TEXT_SEARCH_CONFIG = 'spanish'
+FTS5_TOKENIZER = 'unicode61 remove_diacritics 2'
+
+_WORD = re.compile(r'\w+')
+
+
+def _fts_table(spec):
+    return f"{spec['table']}_fts"
+
+
+def _gin_index(spec):
+    return f"{spec['table']}_search_gin"
+
+
+def _tsvector(spec, qualified=False):
+    """to_tsvector() expression; must stay identical to the indexed one."""
+    prefix = f'"{spec["table"]}".' if qualified else ''
+    document = " || ' ' || ".join(f"coalesce({prefix}\"{column}\", '')" for column in spec['columns'])
+    return f"to_tsvector('{TEXT_SEARCH_CONFIG}', {document})"
+
+
+def _sqlite_statements(spec):
+    table = spec['table']
+    fts = _fts_table(spec)
+    columns = ', '.join(spec['columns'])
+    new_values = ', '.join(f'new.{column}' for column in spec['columns'])
+    old_values = ', '.join(f'old.{column}' for column in spec['columns'])
+    delete_old = (
+        f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+    )
+    insert_new = f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{columns}, content='{table}', content_rowid='id', tokenize='{FTS5_TOKENIZER}')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {columns} ON {table} "
+        f"BEGIN {delete_old} {insert_new} END",
+    ]
+
+
+def install(connection):
+    """Create missing indexes/triggers and (re)populate them. Idempotent."""
+    with connection.cursor() as cursor:
+        for spec in INDEXES.values():
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {_gin_index(spec)} '
+                    f'ON {spec["table"]} USING GIN ({_tsvector(spec)})'
+                )
+            elif connection.vendor == 'sqlite':
+                for statement in _sqlite_statements(spec):
+                    cursor.execute(statement)
+                cursor.execute(f"INSERT INTO {_fts_table(spec)}({_fts_table(spec)}) VALUES ('rebuild')")
+
+
+def uninstall(connection):
+    with connection.cursor() as cursor:
+        for spec in INDEXES.values():
+            if connection.vendor == 'postgresql':
+                cursor.execute(f'DROP INDEX IF EXISTS {_gin_index(spec)}')
+            elif connection.vendor == 'sqlite':
+                fts = _fts_table(spec)
+                for suffix in ('ai', 'ad', 'au'):
+                    cursor.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+                cursor.execute(f'DROP TABLE IF EXISTS {fts}')
+
+
+def is_installed(connection, name):
+    """Whether the named index exists on this connection."""
+    spec = INDEXES[name]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT 1 FROM pg_indexes WHERE indexname = %s', [_gin_index(spec)])
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = %s",
+                [f'{_fts_table(spec)}_ai']
+            )
+        else:
+            return False
+        return cursor.fetchone() is not None
+
+
+def search_words(text):
+    """Words of a query; punctuation is dropped, as the index tokenizers do."""
+    return _WORD.findall(text)
+
+
+def match_sql(connection, name, text):
+    """
+    WHERE fragment and params matching rows of the named index against text.
+    Every word must match; on SQLite words also match as prefixes
+    ('dolor' finds 'dolores'), on PostgreSQL through Spanish stemming.
+    Returns None if text has no searchable words.
+    """
+    spec = INDEXES[name]
+    words = search_words(text)
+    if not words:
+        return None
+    
+    if connection.vendor == 'postgresql':
+        return f"{_tsvector(spec, qualified=True)} @@ plainto_tsquery('{TEXT_SEARCH_CONFIG}', %s)", [' '.join(words)]
+    
+    fts = _fts_table(spec)
+    query = ' '.join(f'"{word}"*' for word in words)
+    return f'"{spec["table"]}"."id" IN (SELECT rowid FROM {fts} WHERE {fts} MATCH %s)', [query]
@@ -0,0 +1,37 @@
+"""
+Recreate and repopulate the full-text search indexes.
+
+Usage:
+    python manage.py rebuild_search_index
+    python manage.py rebuild_search_index --drop
+"""
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from search import index
+
+
+class Command(BaseCommand):
+    help = 'Install missing full-text indexes/triggers and repopulate them from the source tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Database alias (default: "default").')
+        parser.add_argument('--drop', action='store_true',
+                            help='Drop the indexes first (e.g. after a table was rebuilt by a migration).')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if options['drop']:
+            index.uninstall(connection)
+        index.install(connection)
+
+        installed = [name for name in index.INDEXES if index.is_installed(connection, name)]
+        if installed:
+            self.stdout.write(self.style.SUCCESS(
+                f"Full-text indexes ready on {connection.vendor}: {', '.join(installed)}."
+            ))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'No full-text index support for {connection.vendor}; searches use icontains.'
+            ))
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+def install_indexes(apps, schema_editor):
+    from search import index
+    index.install(schema_editor.connection)
+
+
+def uninstall_indexes(apps, schema_editor):
+    from search import index
+    index.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('chatbot', '0002_chatoutboxentry'),
+        ('clinical', '0006_symptomrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_indexes, uninstall_indexes),
+    ]
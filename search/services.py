@@ -0,0 +1,67 @@
+"""
+Services for search module.
+Full-text search over chat transcripts and symptom descriptions.
+"""
+import logging
+
+from django.db import connections, router
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+from . import index
+
+logger = logging.getLogger('clinical')
+
+
+class SearchService:
+    """Runs full-text queries against the database index, or icontains without one."""
+    
+    def __init__(self):
+        # (db alias, index name) -> bool
+        self._installed = {}
+    
+    def search(self, queryset, name, text):
+        """Filter queryset (ChatInteraction or SymptomReport) to rows matching text."""
+        alias = router.db_for_read(queryset.model)
+        connection = connections[alias]
+        
+        if not self._index_available(alias, name):
+            return self._fallback(queryset, name, text)
+        
+        match = index.match_sql(connection, name, text)
+        if match is None:
+            return queryset.none()
+        sql, params = match
+        return queryset.alias(
+            search_match=RawSQL(sql, params, output_field=BooleanField())
+        ).filter(search_match=True)
+    
+    def search_chats(self, queryset, text):
+        return self.search(queryset, 'chat', text)
+    
+    def search_symptoms(self, queryset, text):
+        return self.search(queryset, 'symptom', text)
+    
+    def _index_available(self, alias, name):
+        key = (alias, name)
+        if key not in self._installed:
+            self._installed[key] = index.is_installed(connections[alias], name)
+            if not self._installed[key]:
+                logger.warning("Full-text index '%s' missing on '%s'; using icontains", name, alias)
+        return self._installed[key]
+    
+    def _fallback(self, queryset, name, text):
+        """Unindexed search: every word must appear in some column."""
+        words = index.search_words(text)
+        if not words:
+            return queryset.none()
+        for word in words:
+            condition = Q()
+            for column in index.INDEXES[name]['columns']:
+                condition |= Q(**{f'{column}__icontains': word})
+            queryset = queryset.filter(condition)
+        return queryset
+
+
+# Singleton instance
+search_service = SearchService()
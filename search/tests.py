@@ -0,0 +1,91 @@
+"""
+Tests for the search module: full-text matching through the database index
+and the icontains fallback.
+"""
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+
+from chatbot.models import ChatInteraction
+from clinical.models import SymptomReport
+from users.models import CustomUser
+
+from . import index
+from .services import SearchService, search_service
+
+
+class FullTextSearchTests(TestCase):
+
+    def setUp(self):
+        self.patient = CustomUser.objects.create_user('paciente', password='x', role='PATIENT')
+        self.chats = {
+            text: ChatInteraction.objects.create(user=self.patient, message_text=text, bot_response='Te escucho.')
+            for text in ('Tengo dolores de cabeza', 'Me duele la espalda', 'Dolor de cabeza y náuseas')
+        }
+
+    def search(self, text, service=search_service):
+        results = service.search_chats(ChatInteraction.objects.all(), text)
+        return set(results.values_list('message_text', flat=True))
+
+    def test_index_is_installed_by_the_migration(self):
+        self.assertTrue(all(index.is_installed(connection, name) for name in index.INDEXES))
+
+    def test_words_match_as_prefixes(self):
+        self.assertEqual(self.search('dolor'), {'Tengo dolores de cabeza', 'Dolor de cabeza y náuseas'})
+
+    def test_case_and_accents_are_folded(self):
+        self.assertEqual(self.search('NAUSEAS'), {'Dolor de cabeza y náuseas'})
+
+    def test_every_word_is_required(self):
+        self.assertEqual(self.search('dolor cabeza'), {'Tengo dolores de cabeza', 'Dolor de cabeza y náuseas'})
+        self.assertEqual(self.search('dolores espalda'), set())
+
+    def test_bot_response_is_searched_too(self):
+        self.assertEqual(len(self.search('escucho')), 3)
+
+    def test_punctuation_only_matches_nothing(self):
+        for text in ('', '   ', '?!', '"*"', '--'):
+            with self.subTest(text=text):
+                self.assertIsNone(index.match_sql(connection, 'chat', text))
+                self.assertEqual(self.search(text), set())
+
+    def test_fts_syntax_in_the_query_is_treated_as_words(self):
+        self.assertEqual(self.search('espalda OR "cabeza'), set())
+        self.assertEqual(self.search('espalda, ¿duele?'), {'Me duele la espalda'})
+
+    def test_updates_and_deletes_keep_the_index_in_sync(self):
+        chat = self.chats['Me duele la espalda']
+        chat.message_text = 'Hoy me siento mareada'
+        chat.save()
+        self.assertEqual(self.search('espalda'), set())
+        self.assertEqual(self.search('mareada'), {'Hoy me siento mareada'})
+
+        ChatInteraction.objects.filter(pk=chat.pk).update(message_text='Sin molestias')
+        self.assertEqual(self.search('mareada'), set())
+        self.assertEqual(self.search('molestias'), {'Sin molestias'})
+
+        ChatInteraction.objects.filter(message_text__startswith='Dolor').delete()
+        self.assertEqual(self.search('dolor'), {'Tengo dolores de cabeza'})
+
+    def test_bulk_created_rows_are_indexed(self):
+        ChatInteraction.objects.bulk_create([
+            ChatInteraction(user=self.patient, message_text='Insomnio otra vez', bot_response='ok')
+        ])
+        self.assertEqual(self.search('insomnio'), {'Insomnio otra vez'})
+
+    def test_symptom_descriptions_are_searched(self):
+        SymptomReport.objects.create(patient=self.patient, symptom_type='PAIN', intensity=7,
+                                     description='Dolor punzante en la rodilla')
+        results = search_service.search_symptoms(SymptomReport.objects.all(), 'rodilla')
+        self.assertEqual(list(results.values_list('description', flat=True)), ['Dolor punzante en la rodilla'])
+
+    def test_icontains_fallback_without_the_index(self):
+        with mock.patch.object(index, 'is_installed', return_value=False):
+            service = SearchService()
+            self.assertEqual(self.search('cabeza', service), {'Tengo dolores de cabeza', 'Dolor de cabeza y náuseas'})
+            self.assertEqual(self.search('DOLOR cabeza', service), {'Tengo dolores de cabeza', 'Dolor de cabeza y náuseas'})
+            self.assertEqual(self.search('dolores espalda', service), set())
+            self.assertEqual(self.search('escucho', service), set(self.chats))
+            self.assertEqual(self.search('?!', service), set())
+            self.assertEqual(self.search('espalda, ¿duele?', service), {'Me duele la espalda'})
@@ -71,26 +71,25 @@ def patient_consent_required(consent_field):
                 messages.error(request, 'ID de paciente no proporcionado.')
                 return redirect('users:dashboard_redirect')
             
-            # Check consent
-            from psychosocial.models import ConsentRecord
-            try:
-                consent = ConsentRecord.objects.get(patient_id=patient_id)
-                
-                # Check specific consent field
-                if not getattr(consent, consent_field, False):
-                    messages.warning(
-                        request,
-                        'El/La paciente no ha dado consentimiento para acceder a esta información.'
-                    )
-                    return redirect('users:dashboard_redirect')
-                    
-            except ConsentRecord.DoesNotExist:
+            # Check consent (cached per patient, see ConsentService)
+            from psychosocial.services import consent_service
+            flags = consent_service.get_consent_flags(int(patient_id))
+            
+            if flags is None:
                 messages.warning(
                     request,
                     'No se ha registrado el consentimiento del/la paciente.'
                 )
                 return redirect('users:dashboard_redirect')
             
+            # Check specific consent field
+            if not flags.get(consent_field, False):
+                messages.warning(
+                    request,
+                    'El/La paciente no ha dado consentimiento para acceder a esta información.'
+                )
+                return redirect('users:dashboard_redirect')
+            
             return view_func(request, *args, **kwargs)
         return wrapper
     return decorator
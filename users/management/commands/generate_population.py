@@ -0,0 +1,446 @@
+"""
+Generate a synthetic patient population for load and scale testing.
+
+Patients, their care team assignments, consent records and months of
+EmotionLog, CheckIn, SymptomReport, ChatInteraction and Alert history are
+written with bulk_create in large batches. The same --seed always produces
+the same dataset.
+
+bulk_create skips save() and signals, so the derived tables (emotion and
+symptom rollups, alert counters, full-text index) are rebuilt at the end.
+
+Usage:
+    python manage.py generate_population --patients 200
+    python manage.py generate_population --patients 2000 --days 180 --seed 7
+    python manage.py generate_population --patients 50 --doctors 2 --psychologists 1 --prefix demo
+"""
+import math
+import random
+import time as clock
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from chatbot.benchmark import build_corpus
+from chatbot.models import ChatInteraction
+from chatbot.normalization import normalize
+from chatbot.services import chat_service, lexicon_store
+from clinical.models import Alert, SymptomReport
+from clinical.services import alert_service, symptom_rollup_service
+from psychosocial.models import CheckIn, ConsentRecord, EmotionLog
+from psychosocial.services import emotion_rollup_service
+from search import index
+from users.models import CustomUser, Profile
+
+FIRST_NAMES = [
+    'María', 'Ana', 'Lucía', 'Carmen', 'Laura', 'Sofía', 'Valentina', 'Isabel', 'Paula', 'Camila',
+    'Daniela', 'Gabriela', 'Andrea', 'Natalia', 'Patricia', 'Rosa', 'Elena', 'Marta', 'Julia', 'Claudia',
+]
+LAST_NAMES = [
+    'García', 'Rodríguez', 'Martínez', 'López', 'González', 'Pérez', 'Sánchez', 'Ramírez', 'Torres',
+    'Flores', 'Rivera', 'Gómez', 'Díaz', 'Reyes', 'Morales', 'Jiménez', 'Castro', 'Vargas', 'Ortiz', 'Ruiz',
+]
+
+# (symptom_type, weight, descriptions)
+SYMPTOMS = [
+    ('PAIN', 30, ['Dolor en la zona de la cirugía', 'Dolor de cabeza persistente', 'Dolor en las articulaciones']),
+    ('FATIGUE', 25, ['Cansancio durante todo el día', 'Sin energía para levantarme']),
+    ('NAUSEA', 15, ['Náuseas después de comer', 'Náuseas por la mañana']),
+    ('INSOMNIA', 10, ['No pude dormir en toda la noche', 'Me despierto varias veces']),
+    ('APPETITE_LOSS', 8, ['No tengo hambre', 'Me cuesta terminar la comida']),
+    ('VOMITING', 5, ['Vomité después de la sesión', 'Vómito dos veces hoy']),
+    ('FEVER', 4, ['Fiebre de 38 grados', 'Escalofríos y algo de fiebre']),
+    ('OTHER', 3, ['Hormigueo en las manos', 'Piel muy seca']),
+]
+PAIN_LOCATIONS = ['Cabeza', 'Espalda', 'Abdomen', 'Pecho', 'Brazo', 'Piernas', 'Articulaciones']
+
+# Chemotherapy cycle: symptoms and low mood cluster in the days after each session
+CYCLE_DAYS = 21
+CYCLE_HARD_DAYS = 5
+
+
+@contextmanager
+def historical_timestamps(*models):
+    """Let bulk_create keep explicit values in auto_now_add fields."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def poisson(rng, lam):
+    """Knuth's method; rates here are small."""
+    threshold = math.exp(-lam)
+    count = 0
+    product = rng.random()
+    while product > threshold:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+def clamp(value, low=1, high=10):
+    return max(low, min(high, int(round(value))))
+
+
+class Command(BaseCommand):
+    help = 'Bulk-generate a reproducible synthetic patient population with months of history.'
+
+    # Patients whose history is generated and written per round (bounds memory)
+    PATIENTS_PER_ROUND = 200
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=100,
+                            help='Patients to create (default: 100).')
+        parser.add_argument('--days', type=int, default=90,
+                            help='Days of history per patient, ending yesterday (default: 90).')
+        parser.add_argument('--doctors', type=int, default=None,
+                            help='Doctors to create (default: one per 50 patients).')
+        parser.add_argument('--psychologists', type=int, default=None,
+                            help='Psychologists to create (default: one per 80 patients).')
+        parser.add_argument('--seed', type=int, default=42,
+                            help='Random seed (default: 42).')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows per bulk_create (default: 5000).')
+        parser.add_argument('--prefix', default='synthetic',
+                            help='Username prefix for generated users (default: "synthetic").')
+        parser.add_argument('--password', default='synthetic',
+                            help='Password shared by all generated users (default: "synthetic").')
+
+    def handle(self, *args, **options):
+        patients = options['patients']
+        days = options['days']
+        doctors = options['doctors'] if options['doctors'] is not None else max(1, patients // 50)
+        psychologists = (options['psychologists'] if options['psychologists'] is not None
+                         else max(1, patients // 80))
+        self.batch_size = options['batch_size']
+        prefix = options['prefix']
+
+        if patients < 1 or days < 1 or doctors < 1 or psychologists < 0 or self.batch_size < 1:
+            raise CommandError('--patients, --days, --doctors and --batch-size must be positive.')
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError(
+                f'{connection.vendor} does not return primary keys from bulk inserts '
+                '(use PostgreSQL or SQLite 3.35+).'
+            )
+        if CustomUser.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f'Users with prefix "{prefix}_" already exist; pick another --prefix.')
+
+        self.rng = random.Random(options['seed'])
+        # Bot responses are picked with the global random module
+        random.seed(options['seed'])
+
+        self.today = timezone.localdate()
+        self.now = timezone.now()
+        self.coalesce_window = timedelta(minutes=settings.ALERT_COALESCE_WINDOW_MINUTES)
+        self.lexicon = lexicon_store.reload()
+        self.doctor_of = {}
+        self.corpus = [item['text'] for item in build_corpus(5000, options['seed'])]
+        self.counts = dict.fromkeys(
+            ['users', 'profiles', 'consents', 'emotion_logs', 'checkins', 'symptoms', 'chats', 'alerts'], 0
+        )
+        started = clock.monotonic()
+
+        # Per-row triggers would dominate the load; the index is rebuilt in one pass afterwards
+        search_installed = any(index.is_installed(connection, name) for name in index.INDEXES)
+        if search_installed:
+            index.uninstall(connection)
+
+        try:
+            password = make_password(options['password'])
+            doctor_users = self._create_staff(prefix, 'DOCTOR', doctors, password)
+            psychologist_users = self._create_staff(prefix, 'PSYCHOLOGIST', psychologists, password)
+
+            for first in range(0, patients, self.PATIENTS_PER_ROUND):
+                size = min(self.PATIENTS_PER_ROUND, patients - first)
+                with transaction.atomic():
+                    patient_users = self._create_patients(prefix, first, size, password,
+                                                          doctor_users, psychologist_users)
+                    self._create_history(patient_users, days)
+                self.stdout.write(f'  {first + size}/{patients} patients generated')
+
+            self.stdout.write('Rebuilding derived tables...')
+            emotion_rollup_service.rebuild()
+            symptom_rollup_service.rebuild()
+            alert_service.rebuild_counters()
+        finally:
+            # Also after a failed or interrupted run, so later writes keep the index in sync
+            if search_installed:
+                index.install(connection)
+
+        summary = ', '.join(f'{count} {name}' for name, count in self.counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {summary} in {clock.monotonic() - started:.1f}s (seed {options["seed"]}).'
+        ))
+
+    def _bulk_create(self, model, objs, counter):
+        model.objects.bulk_create(objs, batch_size=self.batch_size)
+        self.counts[counter] += len(objs)
+        return objs
+
+    def _moment(self, day, hour_low, hour_high):
+        """Random aware datetime on a local day between two hours."""
+        seconds = self.rng.randrange(hour_low * 3600, hour_high * 3600)
+        return timezone.make_aware(datetime.combine(day, time()) + timedelta(seconds=seconds))
+
+    def _user(self, username, role, password, first_name, last_name):
+        return CustomUser(
+            username=username,
+            email=f'{username}@example.com',
+            first_name=first_name,
+            last_name=last_name,
+            role=role,
+            password=password,
+            is_verified=True,
+        )
+
+    def _create_staff(self, prefix, role, count, password):
+        users = self._bulk_create(CustomUser, [
+            self._user(f'{prefix}_{role.lower()}_{i:04d}', role, password,
+                       self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES))
+            for i in range(count)
+        ], 'users')
+        self._bulk_create(Profile, [Profile(user_id=user.pk) for user in users], 'profiles')
+        return users
+
+    def _create_patients(self, prefix, first, size, password, doctors, psychologists):
+        patients = self._bulk_create(CustomUser, [
+            self._user(f'{prefix}_patient_{i:07d}', 'PATIENT', password,
+                       self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES))
+            for i in range(first, first + size)
+        ], 'users')
+
+        # Uneven caseloads: the first team members carry more patients
+        doctor_weights = [1 / math.sqrt(rank + 1) for rank in range(len(doctors))]
+        psychologist_weights = [1 / math.sqrt(rank + 1) for rank in range(len(psychologists))]
+
+        profiles = []
+        consents = []
+        for patient in patients:
+            doctor = self.rng.choices(doctors, weights=doctor_weights)[0]
+            psychologist = (self.rng.choices(psychologists, weights=psychologist_weights)[0]
+                            if psychologists and self.rng.random() < 0.9 else None)
+            self.doctor_of[patient.pk] = doctor.pk
+            profiles.append(Profile(
+                user_id=patient.pk,
+                birth_date=self.today - timedelta(days=self.rng.randint(25 * 365, 80 * 365)),
+                medical_record_number=f'HC-{patient.pk:08d}',
+                assigned_doctor_id=doctor.pk,
+                assigned_psychologist_id=psychologist.pk if psychologist else None,
+            ))
+            # A few patients never completed the consent form
+            if self.rng.random() < 0.95:
+                consents.append(ConsentRecord(
+                    patient_id=patient.pk,
+                    can_share_with_doctor=self.rng.random() < 0.95,
+                    can_share_chat_with_doctor=self.rng.random() < 0.6,
+                    can_share_with_psychologist=self.rng.random() < 0.85,
+                    can_use_for_research=self.rng.random() < 0.4,
+                ))
+
+        self._bulk_create(Profile, profiles, 'profiles')
+        self._bulk_create(ConsentRecord, consents, 'consents')
+        return patients
+
+    def _create_history(self, patients, days):
+        emotion_logs, checkins, symptoms, chats = [], [], [], []
+        events = {patient.pk: [] for patient in patients}
+
+        for patient in patients:
+            self._patient_history(patient, days, emotion_logs, checkins, symptoms, chats, events[patient.pk])
+
+        with historical_timestamps(EmotionLog, ChatInteraction, SymptomReport, Alert):
+            self._bulk_create(EmotionLog, emotion_logs, 'emotion_logs')
+            for checkin in checkins:
+                if checkin.related_emotion_log is not None:
+                    checkin.related_emotion_log_id = checkin.related_emotion_log.pk
+
+            self._bulk_create(CheckIn, checkins, 'checkins')
+
+            # Score chats with the real pipeline so flags match what the app would store
+            results = chat_service.process_messages(
+                [chat.message_text for chat in chats], users=[chat.user for chat in chats], lexicon=self.lexicon
+            )
+            for chat, result in zip(chats, results):
+                chat.bot_response = result['response']
+                chat.sentiment_flag = result['sentiment']
+                chat.risk_keywords_detected = result['risk_keywords']
+                chat.lexicon_version = result['lexicon_version']
+                if result['risk_level'] in ('CRITICAL', 'HIGH'):
+                    events[chat.user_id].append((
+                        chat.timestamp, 'CHAT_RISK', result['risk_level'],
+                        f"Riesgo {result['risk_level']} detectado en conversación con Lia",
+                        result['suggested_action'] or 'Revisar conversación y contactar al paciente',
+                        None, chat
+                    ))
+                if 'dolor' in normalize(chat.message_text).folded:
+                    symptoms.append(self._symptom_from_chat(chat))
+            self._bulk_create(ChatInteraction, chats, 'chats')
+
+            for symptom in symptoms:
+                if symptom.related_chat is not None:
+                    symptom.related_chat_id = symptom.related_chat.pk
+            self._bulk_create(SymptomReport, symptoms, 'symptoms')
+            for symptom in symptoms:
+                if symptom.intensity >= 8:
+                    label = dict(SymptomReport.SYMPTOM_TYPE_CHOICES)[symptom.symptom_type]
+                    events[symptom.patient_id].append((
+                        symptom.timestamp, 'SYMPTOM_SEVERE', 'CRITICAL' if symptom.intensity >= 9 else 'HIGH',
+                        f'Síntoma severo reportado: {label} con intensidad {symptom.intensity}/10',
+                        f'Evaluar al paciente inmediatamente. Síntoma: {label}',
+                        symptom, None
+                    ))
+
+            alerts = []
+            for patient in patients:
+                alerts.extend(self._alerts_for(patient, events[patient.pk]))
+            self._bulk_create(Alert, alerts, 'alerts')
+
+    def _patient_history(self, patient, days, emotion_logs, checkins, symptoms, chats, events):
+        rng = self.rng
+        # Staggered enrolment: everyone has at least a third of the window
+        start = self.today - timedelta(days=rng.randint(max(1, days // 3), days))
+        adherence = rng.betavariate(4, 2)
+        baseline = rng.gauss(6, 1.5)
+        chattiness = rng.lognormvariate(0, 0.6)
+        symptom_rate = rng.uniform(0.05, 0.4)
+        cycle_offset = rng.randrange(CYCLE_DAYS)
+        drift = 0.0
+
+        day = start
+        while day < self.today:
+            hard_day = ((day - start).days + cycle_offset) % CYCLE_DAYS < CYCLE_HARD_DAYS
+            drift = 0.7 * drift + rng.gauss(0, 1.0)
+            mood = clamp(baseline + drift - (2 if hard_day else 0))
+
+            log = None
+            if rng.random() < adherence:
+                log = EmotionLog(
+                    patient_id=patient.pk,
+                    mood_score=mood,
+                    anxiety_score=clamp(11 - mood + rng.gauss(0, 1.5)),
+                    energy_score=clamp(mood + rng.gauss(0, 1.5) - (2 if hard_day else 0)),
+                    pain_emotional_impact=clamp(rng.gauss(6, 2)) if hard_day and rng.random() < 0.6 else None,
+                    timestamp=self._moment(day, 18, 23),
+                )
+                emotion_logs.append(log)
+                if log.mood_score <= 3 or log.anxiety_score >= 8 or log.energy_score <= 2:
+                    events.append((
+                        log.timestamp, 'EMOTION_CRISIS', 'MEDIUM' if log.mood_score <= 3 else 'LOW',
+                        f'Estado emocional preocupante detectado. Ánimo: {log.mood_score}/10, '
+                        f'Ansiedad: {log.anxiety_score}/10',
+                        'Contactar al paciente para seguimiento psicológico.',
+                        None, None
+                    ))
+
+            checkins.append(CheckIn(
+                patient_id=patient.pk,
+                checkin_type='DAILY',
+                scheduled_date=day,
+                completed=log is not None,
+                completion_date=log.timestamp if log else None,
+                related_emotion_log=log,
+            ))
+
+            for _ in range(poisson(rng, symptom_rate * (3 if hard_day else 1))):
+                symptom_type, _, descriptions = rng.choices(SYMPTOMS, weights=[s[1] for s in SYMPTOMS])[0]
+                symptoms.append(SymptomReport(
+                    patient_id=patient.pk,
+                    symptom_type=symptom_type,
+                    intensity=clamp(rng.gauss(6 if hard_day else 4, 2)),
+                    description=rng.choice(descriptions),
+                    location=rng.choice(PAIN_LOCATIONS) if symptom_type == 'PAIN' else '',
+                    reported_via='VOICE' if rng.random() < 0.05 else 'FORM',
+                    timestamp=self._moment(day, 6, 23),
+                ))
+
+            for _ in range(poisson(rng, chattiness * (1.5 if hard_day else 1))):
+                chats.append(ChatInteraction(
+                    user=patient,
+                    message_text=rng.choice(self.corpus),
+                    timestamp=self._moment(day, 7, 24),
+                ))
+
+            day += timedelta(days=1)
+
+    def _symptom_from_chat(self, chat):
+        """Mirror SymptomService.create_symptom_from_chat for pain mentioned in chat."""
+        text = normalize(chat.message_text)
+        symptom_type = 'PAIN'
+        if 'cansada' in text.folded or 'fatigada' in text.folded:
+            symptom_type = 'FATIGUE'
+        elif 'nausea' in text.folded:
+            symptom_type = 'NAUSEA'
+        return SymptomReport(
+            patient_id=chat.user_id,
+            symptom_type=symptom_type,
+            intensity=text.first_number(1, 10) or 5,
+            description=chat.message_text,
+            reported_via='CHAT',
+            related_chat=chat,
+            timestamp=chat.timestamp + timedelta(seconds=self.rng.randint(1, 30)),
+        )
+
+    def _alerts_for(self, patient, events):
+        """
+        Replay a patient's alert-worthy events in time order, coalescing
+        repeats like AlertService.record_alert and resolving most alerts
+        some hours after they were raised.
+        """
+        doctor_id = self.doctor_of[patient.pk]
+        open_alerts = {}
+        alerts = []
+        for timestamp, alert_type, severity, message, action, symptom, chat in sorted(events, key=lambda e: e[0]):
+            alert = open_alerts.get(alert_type)
+            if (alert is not None
+                    and (alert.resolved_at is None or timestamp < alert.resolved_at)
+                    and timestamp - alert.last_seen_at <= self.coalesce_window):
+                incoming_rank = Alert.SEVERITY_RANK[severity]
+                existing_rank = alert.severity_rank
+                if incoming_rank > existing_rank:
+                    alert.severity = severity
+                    alert.severity_rank = incoming_rank
+                alert.occurrence_count += 1
+                alert.last_seen_at = timestamp
+                # A milder occurrence must not replace the text and links of a graver one
+                if incoming_rank >= existing_rank:
+                    alert.message = message
+                    alert.suggested_action = action
+                    alert.related_symptom_id = symptom.pk if symptom else alert.related_symptom_id
+                    alert.related_chat_id = chat.pk if chat else alert.related_chat_id
+                continue
+
+            resolved_at = timestamp + timedelta(hours=self.rng.expovariate(1 / 18))
+            is_resolved = resolved_at < self.now
+            alert = Alert(
+                patient_id=patient.pk,
+                alert_type=alert_type,
+                severity=severity,
+                severity_rank=Alert.SEVERITY_RANK[severity],
+                message=message,
+                suggested_action=action,
+                created_at=timestamp,
+                last_seen_at=timestamp,
+                related_symptom_id=symptom.pk if symptom else None,
+                related_chat_id=chat.pk if chat else None,
+                email_sent=severity in ('HIGH', 'CRITICAL'),
+                is_resolved=is_resolved,
+                resolved_at=resolved_at if is_resolved else None,
+                resolved_by_id=doctor_id if is_resolved else None,
+                resolution_notes='Paciente contactada.' if is_resolved else '',
+            )
+            open_alerts[alert_type] = alert
+            alerts.append(alert)
+        return alerts